@@ -1,5 +1,8 @@
+from typing import Optional
 from fastapi import APIRouter
 from app.services.github_client import github_client
+from app.services.token_manager import token_manager
+from app.services.rate_limiter import rate_limiter
 
 github_router = APIRouter()
 
@@ -9,32 +12,57 @@ DUMMY_COMMENT = "This is a dummy comment"
 
 
 @github_router.get("/get-repo-details")
-async def get_repo_details(repo_name: str):
-    repo = await github_client.get_repo(repo_name)
-    return {"repo_details": repo.raw_data}
+async def get_repo_details(repo_name: str, installation_id: Optional[int] = None):
+    repo = await github_client.get_repo(repo_name, installation_id)
+    return {"repo_details": repo}
 
 
 @github_router.get("/get-pr-details")
-async def get_pr_details(repo_name: str, pr_number: int):
-    pr = await github_client.get_pr_details(repo_name, pr_number)
-    return {"pr_details": pr.raw_data}
+async def get_pr_details(
+    repo_name: str, pr_number: int, installation_id: Optional[int] = None
+):
+    pr = await github_client.get_pr_details(repo_name, pr_number, installation_id)
+    return {"pr_details": pr}
 
 
 @github_router.get("/get-pr-diff")
-async def get_pr_diff(repo_name: str, pr_number: int):
-    diff = await github_client.get_pr_diff(repo_name, pr_number)
-    return {"pr_diff": diff}
+async def get_pr_diff(
+    repo_name: str, pr_number: int, installation_id: Optional[int] = None
+):
+    diff = await github_client.get_pr_diff(repo_name, pr_number, installation_id)
+    return {"pr_diff": diff.text, "truncated": diff.truncated}
 
 
 @github_router.get("/update-pr-description")
-async def update_pr_description(repo_name: str, pr_number: int):
+async def update_pr_description(
+    repo_name: str, pr_number: int, installation_id: Optional[int] = None
+):
     response = await github_client.update_pr_description(
-        repo_name, pr_number, DUMMY_SUMMARY
+        repo_name, pr_number, DUMMY_SUMMARY, installation_id
     )
     return {"update_response": response}
 
 
 @github_router.get("/add-pr-comment")
-async def add_pr_comment(repo_name: str, pr_number: int):
-    response = await github_client.add_pr_comment(repo_name, pr_number, DUMMY_COMMENT)
+async def add_pr_comment(
+    repo_name: str, pr_number: int, installation_id: Optional[int] = None
+):
+    response = await github_client.add_pr_comment(
+        repo_name, pr_number, DUMMY_COMMENT, installation_id
+    )
     return {"comment_response": response}
+
+
+@github_router.get("/token-stats")
+async def get_token_stats():
+    return {"token_stats": token_manager.stats()}
+
+
+@github_router.get("/rate-limits")
+async def get_rate_limits():
+    return {"rate_limits": rate_limiter.stats("github")}
+
+
+@github_router.get("/cache-stats")
+async def get_cache_stats():
+    return {"cache_stats": await github_client.cache.stats()}
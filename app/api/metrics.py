@@ -0,0 +1,66 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.services.github_client import github_client
+from app.services.job_queue import job_queue
+from app.services.metrics import metrics, peak_rss_bytes
+from app.services.openai_client import openai_client
+from app.services.rate_limiter import rate_limiter
+from app.services.token_manager import token_manager
+
+metrics_router = APIRouter()
+
+
+def _caches() -> dict:
+    # The caches themselves, whose counters are read without touching the stores
+    return {
+        "llm": openai_client.cache,
+        "github_http": github_client.cache,
+        "installation_token": token_manager,
+    }
+
+
+# Set when scraped; the SQLite job store is queried off the event loop
+job_queue_depth = metrics.gauge(
+    "prbuddy_job_queue_depth",
+    "Jobs waiting for a worker.",
+)
+# Read from the services' own counters at scrape time, nothing on the hot path
+metrics.gauge(
+    "prbuddy_rate_limit_remaining",
+    "Tokens left in each rate-limit bucket (GitHub requests, OpenAI requests and tokens).",
+    ("bucket",),
+    collect=lambda: {
+        (key,): bucket["tokens"]
+        for key, bucket in rate_limiter.stats()["buckets"].items()
+    },
+)
+metrics.counter(
+    "prbuddy_rate_limit_throttled_total",
+    "Requests the upstream rate limited.",
+    collect=lambda: {(): rate_limiter.throttled},
+)
+metrics.counter(
+    "prbuddy_cache_hits_total",
+    "Cache hits by cache.",
+    ("cache",),
+    collect=lambda: {(name,): cache.hits for name, cache in _caches().items()},
+)
+metrics.counter(
+    "prbuddy_cache_misses_total",
+    "Cache misses by cache.",
+    ("cache",),
+    collect=lambda: {(name,): cache.misses for name, cache in _caches().items()},
+)
+metrics.gauge(
+    "prbuddy_process_peak_rss_bytes",
+    "Peak resident memory of this process.",
+    collect=lambda: {(): peak_rss_bytes()},
+)
+
+
+@metrics_router.get("", response_class=PlainTextResponse)
+async def get_metrics():
+    job_queue_depth.set(await job_queue.depth())
+    return PlainTextResponse(
+        metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -1,11 +1,32 @@
 from fastapi import APIRouter
 from app.services.openai_client import openai_client
+from app.services.rate_limiter import rate_limiter
 
 openapi_router = APIRouter()
 
 
 @openapi_router.get("/generate-text")
-def generate_text():
+async def generate_text():
     prompt = "What is the meaning of life?"
-    response = openai_client.generate_text(prompt)
+    response = await openai_client.generate_text(prompt)
     return {"response": response}
+
+
+@openapi_router.get("/usage")
+async def get_usage():
+    return {"usage": openai_client.usage_stats()}
+
+
+@openapi_router.get("/cache-stats")
+async def get_cache_stats():
+    return {"cache_stats": await openai_client.cache.stats()}
+
+
+@openapi_router.get("/rate-limits")
+async def get_rate_limits():
+    return {"rate_limits": rate_limiter.stats("openai")}
+
+
+@openapi_router.get("/routes")
+async def get_routes():
+    return {"routes": openai_client.router.stats()}
@@ -1,21 +1,30 @@
-import logging
 import json
+from typing import Optional
 from fastapi import APIRouter, Request, HTTPException
-from app.services.webhook import webhook
+from fastapi.responses import JSONResponse
+from app.services.webhook import webhook, SUPPORTED_PR_ACTIONS
+from app.services.job_queue import job_queue, JobType, QueueFullError
+from app.services.job_scheduler import JobSchedule
+from app.services.delivery_dedup import delivery_dedup
+from app.services.pipeline import PullRequestContext
+from app.core.config import config
+from app.core.log import get_logger
 
 webhook_router = APIRouter()
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(name)s - [Router] - %(message)s",
-)
-logger = logging.getLogger("Router")
+logger = get_logger("Router")
 
 
 @webhook_router.post("")
 async def handle_webhook(request: Request):
-    """Handles incoming GitHub PR webhooks."""
+    """Verifies and queues incoming GitHub PR webhooks, acknowledging with 202.
+
+    Redeliveries and repeats of work already accepted for the same head commit
+    are acknowledged with 200 and not queued again.
+    """
+    delivery_id = request.headers.get("X-GitHub-Delivery")
+    ctx = None
+    delivery_claimed = work_claimed = False
     try:
         payload_raw = await request.body()
         signature = request.headers.get("X-Hub-Signature-256")
@@ -24,15 +33,105 @@ async def handle_webhook(request: Request):
             logger.warning("Invalid webhook signature received.")
             raise HTTPException(status_code=403, detail="Invalid signature")
 
+        # Malformed payloads are rejected before anything is claimed, so a
+        # corrected redelivery is not mistaken for a duplicate
         payload = json.loads(payload_raw)
-        response = await webhook.handle_pr_event(payload)
-        return response
+        ctx = PullRequestContext.from_payload(payload)
+        if not ctx.is_valid:
+            logger.error("Missing required fields in payload.")
+            raise HTTPException(status_code=400, detail="Invalid payload structure")
+
+        if not await delivery_dedup.claim_delivery(delivery_id):
+            return {"message": "Duplicate delivery"}
+        delivery_claimed = True
+
+        pr_action = ctx.action
+        if pr_action not in SUPPORTED_PR_ACTIONS:
+            logger.info("Ignored PR action: %s", pr_action)
+            return {"message": f"Ignored PR action: {pr_action}"}
+
+        if not await delivery_dedup.claim_work(
+            ctx.repo_full_name, ctx.pr_number, ctx.head_sha, pr_action
+        ):
+            return {"message": "Already processed"}
+        work_claimed = True
+
+        # One review per PR: newer pushes supersede pending and in-flight work
+        coalesce_key = f"{ctx.repo_full_name}#{ctx.pr_number}"
+        previous = await job_queue.latest(coalesce_key)
+        if previous is not None and previous.version != ctx.head_sha:
+            # The superseded push is never reviewed, so this one covers its commits
+            if previous.payload.get("before") and payload.get("before"):
+                payload["before"] = previous.payload["before"]
+        job = await job_queue.enqueue(
+            JobType.PULL_REQUEST,
+            payload,
+            coalesce_key=coalesce_key,
+            version=ctx.head_sha,
+            delay=config.SYNC_DEBOUNCE_SECONDS if pr_action == "synchronize" else 0,
+            schedule=JobSchedule.from_pr_payload(payload),
+        )
+        return JSONResponse(
+            status_code=202,
+            content={"message": "Webhook accepted", "job_id": job.id},
+        )
     except json.JSONDecodeError as e:
-        logger.error(f"JSON decoding error: {str(e)}")
+        logger.error("JSON decoding error: %s", e)
         raise HTTPException(status_code=400, detail="Invalid JSON payload")
+    except QueueFullError as e:
+        logger.error("Rejecting webhook: %s", e)
+        # Let a redelivery through once the queue has room again
+        await _release_claims(delivery_id, delivery_claimed, ctx, work_claimed)
+        raise HTTPException(status_code=503, detail="Job queue is full")
     except HTTPException as e:
-        logger.error(f"HTTP Exception in webhook handler: {str(e.detail)}")
+        logger.error("HTTP Exception in webhook handler: %s", e.detail)
         raise e
     except Exception as e:
-        logger.exception(f"Unexpected error in webhook handler: {str(e)}")
+        logger.exception("Unexpected error in webhook handler: %s", e)
+        await _release_claims(delivery_id, delivery_claimed, ctx, work_claimed)
         raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
+async def _release_claims(
+    delivery_id: Optional[str],
+    delivery_claimed: bool,
+    ctx: Optional[PullRequestContext],
+    work_claimed: bool,
+):
+    """Forget the dedup claims this request made, so a redelivery can retry."""
+    if delivery_claimed:
+        await delivery_dedup.release_delivery(delivery_id)
+    if work_claimed:
+        await delivery_dedup.release_work(
+            ctx.repo_full_name, ctx.pr_number, ctx.head_sha, ctx.action
+        )
+
+
+@webhook_router.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    """Returns the status of a queued webhook job."""
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
+@webhook_router.post("/jobs/{job_id}/retry")
+async def retry_job(job_id: str):
+    """Queues a failed or dead-lettered job again (SQLite job store only)."""
+    job = await job_queue.retry(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="No retryable job found")
+    return job.to_dict()
+
+
+@webhook_router.get("/dead-letters")
+async def get_dead_letters(limit: int = 100):
+    """Returns the jobs that failed on every attempt."""
+    return {"jobs": [job.to_dict() for job in await job_queue.dead_letters(limit)]}
+
+
+@webhook_router.get("/dedup-stats")
+async def get_dedup_stats():
+    """Returns how many duplicate deliveries and PR events were skipped."""
+    return {"dedup_stats": await delivery_dedup.stats()}
@@ -17,5 +17,231 @@ class Config(BaseSettings):
 
     GH_PAT: str = os.getenv("GH_PAT", "")
 
+    GH_API_URL: str = os.getenv("GH_API_URL", "https://api.github.com")
+    OPENAI_BASE_URL: str = os.getenv("OPENAI_BASE_URL", "")
+
+    # Logging: LOG_FORMAT is "json" (one object per line) or "text". Messages
+    # and fields are cut to LOG_MAX_FIELD_CHARS. Prompts and generated text are
+    # only logged for LOG_PAYLOAD_SAMPLE_RATE (0 to 1) of deliveries
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO").upper()
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "json")
+    LOG_MAX_FIELD_CHARS: int = int(os.getenv("LOG_MAX_FIELD_CHARS", "2000"))
+    LOG_PAYLOAD_SAMPLE_RATE: float = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0"))
+
+    # Shared HTTP connection pools
+    HTTP_MAX_CONNECTIONS: int = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = int(
+        os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20")
+    )
+    HTTP_KEEPALIVE_EXPIRY_SECONDS: float = float(
+        os.getenv("HTTP_KEEPALIVE_EXPIRY_SECONDS", "60")
+    )
+    HTTP_TIMEOUT_SECONDS: float = float(os.getenv("HTTP_TIMEOUT_SECONDS", "30"))
+    HTTP2_ENABLED: bool = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+
+    # Seconds before expiry at which cached GitHub credentials are refreshed
+    GH_JWT_REFRESH_MARGIN_SECONDS: int = int(
+        os.getenv("GH_JWT_REFRESH_MARGIN_SECONDS", "60")
+    )
+    GH_TOKEN_REFRESH_MARGIN_SECONDS: int = int(
+        os.getenv("GH_TOKEN_REFRESH_MARGIN_SECONDS", "300")
+    )
+    # The background refresher renews installation tokens this much earlier
+    # still, so requests never wait for a mint
+    GH_TOKEN_REFRESH_AHEAD_SECONDS: int = int(
+        os.getenv("GH_TOKEN_REFRESH_AHEAD_SECONDS", "300")
+    )
+
+    # Outbound rate limiting: requests wait for quota instead of failing, and
+    # throttled ones are retried with jittered exponential backoff
+    RATE_LIMIT_MAX_RETRIES: int = int(os.getenv("RATE_LIMIT_MAX_RETRIES", "5"))
+    RATE_LIMIT_BACKOFF_BASE_SECONDS: float = float(
+        os.getenv("RATE_LIMIT_BACKOFF_BASE_SECONDS", "1")
+    )
+    RATE_LIMIT_BACKOFF_MAX_SECONDS: float = float(
+        os.getenv("RATE_LIMIT_BACKOFF_MAX_SECONDS", "60")
+    )
+    # GitHub quotas per installation; GitHub caps content-creating requests
+    # separately from the hourly REST limit
+    GH_RATE_LIMIT_PER_HOUR: int = int(os.getenv("GH_RATE_LIMIT_PER_HOUR", "5000"))
+    GH_WRITES_PER_MINUTE: int = int(os.getenv("GH_WRITES_PER_MINUTE", "80"))
+    GH_WRITE_BURST: int = int(os.getenv("GH_WRITE_BURST", "20"))
+    # OpenAI quotas per model
+    OPENAI_REQUESTS_PER_MINUTE: int = int(
+        os.getenv("OPENAI_REQUESTS_PER_MINUTE", "500")
+    )
+    OPENAI_TOKENS_PER_MINUTE: int = int(os.getenv("OPENAI_TOKENS_PER_MINUTE", "30000"))
+
+    # Webhook redelivery dedup: "memory", or "sqlite" to share it between
+    # uvicorn workers; GitHub allows redelivering for three days
+    DEDUP_BACKEND: str = os.getenv("DEDUP_BACKEND", "memory")
+    DEDUP_MAX_ENTRIES: int = int(os.getenv("DEDUP_MAX_ENTRIES", "100000"))
+    DEDUP_TTL_SECONDS: int = int(os.getenv("DEDUP_TTL_SECONDS", str(3 * 24 * 60 * 60)))
+
+    # Background job queue
+    WORKER_CONCURRENCY: int = int(os.getenv("WORKER_CONCURRENCY", "4"))
+    JOB_QUEUE_MAXSIZE: int = int(os.getenv("JOB_QUEUE_MAXSIZE", "1000"))
+    JOB_HISTORY_SIZE: int = int(os.getenv("JOB_HISTORY_SIZE", "1000"))
+    JOB_SHUTDOWN_TIMEOUT_SECONDS: float = float(
+        os.getenv("JOB_SHUTDOWN_TIMEOUT_SECONDS", "30")
+    )
+    # Job store: "memory", or "sqlite" to keep jobs in SQLITE_PATH, where they
+    # survive restarts and are claimed by workers in any process (app/serve.py)
+    JOB_STORE_BACKEND: str = os.getenv("JOB_STORE_BACKEND", "memory")
+    # A job whose worker stops renewing its lease for this long is run again
+    JOB_LEASE_SECONDS: float = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+    # Runs per job before it is dead-lettered; retries back off exponentially
+    JOB_MAX_ATTEMPTS: int = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+    JOB_RETRY_BACKOFF_SECONDS: float = float(
+        os.getenv("JOB_RETRY_BACKOFF_SECONDS", "10")
+    )
+    JOB_POLL_INTERVAL_SECONDS: float = float(
+        os.getenv("JOB_POLL_INTERVAL_SECONDS", "0.5")
+    )
+    # Job scheduling: "fair" runs the next job of the installation, then repo,
+    # with the fewest running jobs, smallest PR first; "fifo" keeps arrival order
+    SCHEDULER_POLICY: str = os.getenv("SCHEDULER_POLICY", "fair")
+    # Extra cost, in changed lines, of reviewing a push over a new PR
+    SCHEDULER_SYNCHRONIZE_PENALTY_LINES: int = int(
+        os.getenv("SCHEDULER_SYNCHRONIZE_PENALTY_LINES", "1000")
+    )
+    # Cost credit per second waited, so large PRs still get their turn
+    SCHEDULER_AGING_LINES_PER_SECOND: float = float(
+        os.getenv("SCHEDULER_AGING_LINES_PER_SECOND", "20")
+    )
+    # Running jobs allowed per repo (0 = no cap), with per-repo overrides as
+    # "owner/repo=2,owner/other=1"
+    REPO_MAX_CONCURRENCY: int = int(os.getenv("REPO_MAX_CONCURRENCY", "0"))
+    REPO_CONCURRENCY_LIMITS: str = os.getenv("REPO_CONCURRENCY_LIMITS", "")
+    # Processes started by `python -m app.serve`; each worker process runs
+    # WORKER_CONCURRENCY jobs at a time
+    WEB_PROCESSES: int = int(os.getenv("WEB_PROCESSES", "1"))
+    WORKER_PROCESSES: int = int(os.getenv("WORKER_PROCESSES", str(os.cpu_count() or 1)))
+    # Worker processes serve /metrics and the stats endpoints on their own port
+    # (0 disables); `app.serve` numbers them up from its --port + 1
+    WORKER_METRICS_HOST: str = os.getenv("WORKER_METRICS_HOST", "0.0.0.0")
+    WORKER_METRICS_PORT: int = int(os.getenv("WORKER_METRICS_PORT", "0"))
+    # Quiet window after a `synchronize` push before its review starts; newer
+    # pushes to the same PR within the window replace the pending review
+    SYNC_DEBOUNCE_SECONDS: float = float(os.getenv("SYNC_DEBOUNCE_SECONDS", "10"))
+
+    # LLM generation
+    OPENAI_MODEL: str = os.getenv("OPENAI_MODEL", "gpt-4o")
+    # "separate" sends one prompt per artifact, "combined" one structured request,
+    # "chunked" a map-reduce review (the only mode INCREMENTAL_REVIEW can resume)
+    GENERATION_MODE: str = os.getenv("GENERATION_MODE", "separate")
+    # "json_schema" (structured outputs) or "json_object" (JSON mode)
+    OPENAI_STRUCTURED_OUTPUT: str = os.getenv("OPENAI_STRUCTURED_OUTPUT", "json_schema")
+    # Output token limits for free-text and structured (JSON) responses
+    OPENAI_MAX_TOKENS: int = int(os.getenv("OPENAI_MAX_TOKENS", "1024"))
+    OPENAI_STRUCTURED_MAX_TOKENS: int = int(
+        os.getenv("OPENAI_STRUCTURED_MAX_TOKENS", "4096")
+    )
+
+    # Model routing: prompts up to ROUTE_SMALL_MAX_INPUT_TOKENS go to the small
+    # model (leave OPENAI_SMALL_MODEL empty to always use OPENAI_MODEL)
+    OPENAI_SMALL_MODEL: str = os.getenv("OPENAI_SMALL_MODEL", "gpt-4o-mini")
+    ROUTE_SMALL_MAX_INPUT_TOKENS: int = int(
+        os.getenv("ROUTE_SMALL_MAX_INPUT_TOKENS", "3000")
+    )
+    # A small diff still gets the full multi-section review, so the output
+    # limit matches OPENAI_MAX_TOKENS; the saving comes from the cheaper model
+    ROUTE_SMALL_MAX_TOKENS: int = int(os.getenv("ROUTE_SMALL_MAX_TOKENS", "1024"))
+    ROUTE_SMALL_STRUCTURED_MAX_TOKENS: int = int(
+        os.getenv("ROUTE_SMALL_STRUCTURED_MAX_TOKENS", "2048")
+    )
+    ROUTE_SMALL_TIMEOUT_SECONDS: float = float(
+        os.getenv("ROUTE_SMALL_TIMEOUT_SECONDS", "30")
+    )
+    ROUTE_LARGE_TIMEOUT_SECONDS: float = float(
+        os.getenv("ROUTE_LARGE_TIMEOUT_SECONDS", "90")
+    )
+    ROUTE_LATENCY_WINDOW: int = int(os.getenv("ROUTE_LATENCY_WINDOW", "200"))
+    # Hedged requests: a duplicate is sent once a call outlives the route's
+    # HEDGE_PERCENTILE latency (after HEDGE_MIN_SAMPLES calls); first answer wins
+    HEDGE_ENABLED: bool = os.getenv("HEDGE_ENABLED", "false").lower() == "true"
+    HEDGE_PERCENTILE: float = float(os.getenv("HEDGE_PERCENTILE", "0.95"))
+    HEDGE_MIN_SAMPLES: int = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+
+    # Diffs are parsed while they download. Reading stops after DIFF_MAX_BYTES
+    # (later files are left out) and files whose own diff is larger than
+    # DIFF_MAX_FILE_BYTES keep only their line counts; 0 disables either cap
+    DIFF_MAX_BYTES: int = int(os.getenv("DIFF_MAX_BYTES", str(4 * 1024 * 1024)))
+    DIFF_MAX_FILE_BYTES: int = int(os.getenv("DIFF_MAX_FILE_BYTES", str(256 * 1024)))
+
+    # Diff reduction before prompting: generated, vendored and binary files are
+    # reduced to a note, whitespace-only hunks dropped and context trimmed to
+    # DIFF_CONTEXT_LINES (-1 keeps it as is)
+    DIFF_FILTER_ENABLED: bool = (
+        os.getenv("DIFF_FILTER_ENABLED", "true").lower() == "true"
+    )
+    # Extra comma-separated globs to omit, on top of lockfiles and bundles
+    DIFF_EXCLUDE_PATTERNS: str = os.getenv("DIFF_EXCLUDE_PATTERNS", "")
+    DIFF_CONTEXT_LINES: int = int(os.getenv("DIFF_CONTEXT_LINES", "2"))
+    # Honor linguist-generated / linguist-vendored from the repo's .gitattributes
+    DIFF_FILTER_GITATTRIBUTES: bool = (
+        os.getenv("DIFF_FILTER_GITATTRIBUTES", "true").lower() == "true"
+    )
+
+    # Diff chunking: diffs above DIRECT_REVIEW_MAX_TOKENS are reviewed map-reduce
+    # style in batches of CHUNK_MAX_TOKENS, up to DIFF_TOKEN_BUDGET in total
+    DIRECT_REVIEW_MAX_TOKENS: int = int(os.getenv("DIRECT_REVIEW_MAX_TOKENS", "12000"))
+    CHUNK_MAX_TOKENS: int = int(os.getenv("CHUNK_MAX_TOKENS", "8000"))
+    DIFF_TOKEN_BUDGET: int = int(os.getenv("DIFF_TOKEN_BUDGET", "100000"))
+    CHUNK_CONCURRENCY: int = int(os.getenv("CHUNK_CONCURRENCY", "4"))
+
+    # Incremental re-review on `synchronize`: per-file findings are remembered
+    # and only files touched since the last reviewed commit are re-analyzed.
+    # Only chunked reviews record them; see GENERATION_MODE
+    INCREMENTAL_REVIEW: bool = os.getenv("INCREMENTAL_REVIEW", "true").lower() == "true"
+    # "memory", or "sqlite" to share the notes between worker processes
+    REVIEW_STATE_BACKEND: str = os.getenv("REVIEW_STATE_BACKEND", "memory")
+    REVIEW_STATE_MAX_PRS: int = int(os.getenv("REVIEW_STATE_MAX_PRS", "10000"))
+
+    # SQLite file shared by every store configured with the "sqlite" backend
+    SQLITE_PATH: str = os.getenv("SQLITE_PATH", "prbuddy.sqlite3")
+
+    # Content-addressed LLM result cache: "memory", "sqlite" or "none"
+    LLM_CACHE_BACKEND: str = os.getenv("LLM_CACHE_BACKEND", "memory")
+    LLM_CACHE_MAX_ENTRIES: int = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1000"))
+    LLM_CACHE_TTL_SECONDS: int = int(
+        os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 60 * 60))
+    )
+
+    # Inline suggestions are posted as one PR review; larger sets are split
+    # into several reviews of at most this many comments
+    REVIEW_MAX_COMMENTS: int = int(os.getenv("REVIEW_MAX_COMMENTS", "50"))
+    # Suggestions on lines outside the diff are moved to a diff line at most
+    # this far away (as a plain comment), or dropped
+    INLINE_SNAP_MAX_LINES: int = int(os.getenv("INLINE_SNAP_MAX_LINES", "3"))
+
+    # Conditional-GET cache of GitHub reads: "memory", "sqlite" or "none"
+    GH_CACHE_BACKEND: str = os.getenv("GH_CACHE_BACKEND", "memory")
+    GH_CACHE_MAX_ENTRIES: int = int(os.getenv("GH_CACHE_MAX_ENTRIES", "1000"))
+    GH_CACHE_TTL_SECONDS: int = int(
+        os.getenv("GH_CACHE_TTL_SECONDS", str(24 * 60 * 60))
+    )
+
+    # What was last published per PR (content hashes, review comment IDs), used
+    # to edit the bot's comment in place and skip unchanged writes
+    PUBLISHED_STATE_BACKEND: str = os.getenv("PUBLISHED_STATE_BACKEND", "memory")
+    PUBLISHED_STATE_MAX_ENTRIES: int = int(
+        os.getenv("PUBLISHED_STATE_MAX_ENTRIES", "20000")
+    )
+    # Stream the review (separate mode) into the PR comment as sections finish;
+    # edits are at least STREAM_UPDATE_INTERVAL_SECONDS apart
+    STREAM_REVIEW: bool = os.getenv("STREAM_REVIEW", "true").lower() == "true"
+    STREAM_UPDATE_INTERVAL_SECONDS: float = float(
+        os.getenv("STREAM_UPDATE_INTERVAL_SECONDS", "3")
+    )
+
+    # Review pipeline
+    PIPELINE_STAGE_TIMEOUT_SECONDS: float = float(
+        os.getenv("PIPELINE_STAGE_TIMEOUT_SECONDS", "120")
+    )
+    PIPELINE_DEADLINE_SECONDS: float = float(
+        os.getenv("PIPELINE_DEADLINE_SECONDS", "300")
+    )
+
 
 config = Config()
@@ -0,0 +1,167 @@
+import json
+import logging
+import random
+import time
+import uuid
+import zlib
+from contextvars import ContextVar, Token
+from typing import Optional
+from app.core.config import config
+
+# The delivery (or request) a log line belongs to; asyncio tasks and
+# `to_thread` calls inherit it from whoever started them
+_trace_id: ContextVar[Optional[str]] = ContextVar("trace_id", default=None)
+
+# Attributes every LogRecord has; anything else was passed with `extra=`
+_RECORD_ATTRIBUTES = set(logging.makeLogRecord({}).__dict__) | {
+    "message",
+    "asctime",
+    "trace_id",
+    # uvicorn's ANSI-colored copy of the message
+    "color_message",
+}
+_configured = False
+
+
+def get_trace_id() -> Optional[str]:
+    return _trace_id.get()
+
+
+def set_trace_id(trace_id: Optional[str]) -> Token:
+    return _trace_id.set(trace_id)
+
+
+def reset_trace_id(token: Token):
+    _trace_id.reset(token)
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex
+
+
+def truncate(value, limit: int = config.LOG_MAX_FIELD_CHARS):
+    """Cut long strings down to `limit` characters, noting how much was cut."""
+    if isinstance(value, str) and limit and len(value) > limit:
+        return f"{value[:limit]}… [{len(value) - limit} more chars]"
+    return value
+
+
+def payload_sampled(rate: float = config.LOG_PAYLOAD_SAMPLE_RATE) -> bool:
+    """Whether verbose content is logged for the current trace.
+
+    The choice is a hash of the trace ID, so a sampled delivery logs all of
+    its prompts and completions, not a random subset of them.
+    """
+    if rate <= 0:
+        return False
+    if rate >= 1:
+        return True
+    trace_id = _trace_id.get()
+    if trace_id is None:
+        return random.random() < rate
+    return zlib.crc32(trace_id.encode()) % 10000 < rate * 10000
+
+
+def log_payload(logger: logging.Logger, message: str, *args, **fields):
+    """Log prompts or generated text as fields, for sampled traces only."""
+    if logger.isEnabledFor(logging.INFO) and payload_sampled():
+        logger.info(message, *args, extra=fields)
+
+
+def _truncate_args(record: logging.LogRecord):
+    """Cut long arguments before they are interpolated into the message."""
+    if record.args and isinstance(record.args, tuple):
+        record.args = tuple(truncate(arg) for arg in record.args)
+
+
+def _fields(record: logging.LogRecord) -> dict:
+    """Whatever was passed with `extra=`; objects are logged as cut-down text."""
+    fields = {}
+    for key, value in record.__dict__.items():
+        if key in _RECORD_ATTRIBUTES:
+            continue
+        if not isinstance(value, (int, float, bool, type(None), list, dict)):
+            value = truncate(str(value))
+        fields[key] = value
+    return fields
+
+
+class TraceFilter(logging.Filter):
+    """Stamps each record with the current trace ID."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = _trace_id.get() or "-"
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, trace ID, message, fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        _truncate_args(record)
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created))
+            + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": truncate(record.getMessage()),
+        }
+        trace_id = getattr(record, "trace_id", "-")
+        if trace_id != "-":
+            entry["trace_id"] = trace_id
+        entry.update(_fields(record))
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """The human-readable line format, with the trace ID and any fields."""
+
+    def __init__(self):
+        super().__init__(
+            "%(asctime)s - %(levelname)s - %(name)s - [%(trace_id)s] - %(message)s"
+        )
+
+    def format(self, record: logging.LogRecord) -> str:
+        _truncate_args(record)
+        return super().format(record)
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        record.message = truncate(record.message)
+        line = super().formatMessage(record)
+        fields = _fields(record)
+        if fields:
+            line += " " + " ".join(f"{key}={value!r}" for key, value in fields.items())
+        return line
+
+
+def configure_logging():
+    """Install the root handler once; a no-op if logging is already set up.
+
+    uvicorn's server and access logs are sent through the same handler.
+    """
+    global _configured
+    if _configured:
+        return
+    _configured = True
+    root = logging.getLogger()
+    if root.handlers:
+        return
+    handler = logging.StreamHandler()
+    handler.addFilter(TraceFilter())
+    handler.setFormatter(
+        TextFormatter() if config.LOG_FORMAT == "text" else JSONFormatter()
+    )
+    root.addHandler(handler)
+    root.setLevel(config.LOG_LEVEL)
+    # uvicorn installs its own text handlers before importing the app
+    for name in ("uvicorn", "uvicorn.access"):
+        server_logger = logging.getLogger(name)
+        server_logger.handlers = []
+        server_logger.propagate = True
+
+
+def get_logger(name: str) -> logging.Logger:
+    configure_logging()
+    return logging.getLogger(name)
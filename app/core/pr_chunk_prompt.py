@@ -0,0 +1,44 @@
+from app.core.pr_combined_prompt import (
+    PR_SUMMARY_FORMAT,
+    PR_REVIEW_FORMAT,
+    PR_INLINE_FIX_FORMAT,
+)
+
+# Map step: one request per batch of files from a large PR
+PR_CHUNK_SYSTEM_PROMPT = f"""
+You are a senior software engineer reviewing one part of a large pull request (PR).
+The user message contains the diff of some of the PR's files. Other files are reviewed separately, so only comment on what you can see.
+Return a single JSON object with two fields:
+
+1. "files": One entry per file in the diff, with:
+- "file_path": The file path.
+- "summary": One to three sentences describing what changed in the file.
+- "findings": A list of concise review findings (bugs, security, performance, code quality, missing tests). Use an empty list if there are none.
+
+2. "inline_suggestions": An array of direct inline code suggestions formatted for GitHub's Suggestions API, where each item has:
+{PR_INLINE_FIX_FORMAT}"""
+
+PR_CHUNK_USER_PROMPT = """
+PR Diff (partial):
+{pr_diff}
+"""
+
+# Reduce step: merge the per-file notes into the final summary and review
+PR_REDUCE_SYSTEM_PROMPT = f"""
+You are an expert software engineer writing the final summary and review of a large pull request (PR).
+The PR was reviewed in parts; the user message contains the per-file notes from those partial reviews.
+Combine them into a single JSON object with two fields:
+
+1. "summary": A precise and concise markdown summary of the whole PR, in the following structured format:
+{PR_SUMMARY_FORMAT}
+2. "review": A detailed, structured markdown code review of the whole PR, in the following format:
+{PR_REVIEW_FORMAT}
+If some files were not reviewed, mention them under **General Overview**."""
+
+PR_REDUCE_USER_PROMPT = """
+Per-file notes:
+{file_notes}
+
+Files not reviewed (token budget exceeded):
+{omitted_files}
+"""
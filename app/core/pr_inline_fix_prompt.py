@@ -9,7 +9,7 @@ PR Diff:
 ### Output Format:
 Return an array of suggestions, where each suggestion is a dictionary with:
 - "file_path": The file where the issue is located.
-- "line": The exact line number where the issue occurs.
+- "line": The line number shown in the left margin of the diff line where the issue occurs. Only numbered lines (added or unchanged lines of the new file) can be commented on.
 - "suggestion": The corrected code using the following GitHub suggestion format:
   ```suggestion
   # AI-Suggested Fix
@@ -0,0 +1,46 @@
+from typing import List
+from pydantic import BaseModel, ConfigDict
+
+
+class InlineSuggestion(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    file_path: str
+    line: int
+    suggestion: str
+
+
+class CombinedReview(BaseModel):
+    """Structured output of the combined generation mode."""
+
+    model_config = ConfigDict(extra="forbid")
+
+    summary: str
+    review: str
+    inline_suggestions: List[InlineSuggestion]
+
+
+class FileNotes(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    file_path: str
+    summary: str
+    findings: List[str]
+
+
+class ChunkReview(BaseModel):
+    """Structured output of the map step of a chunked review."""
+
+    model_config = ConfigDict(extra="forbid")
+
+    files: List[FileNotes]
+    inline_suggestions: List[InlineSuggestion]
+
+
+class ReducedReview(BaseModel):
+    """Structured output of the reduce step of a chunked review."""
+
+    model_config = ConfigDict(extra="forbid")
+
+    summary: str
+    review: str
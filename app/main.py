@@ -1,13 +1,64 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from app.api.health import health_router
+from app.api.metrics import metrics_router
 from app.api.github import github_router
 from app.api.openapi import openapi_router
 from app.api.webhook import webhook_router
+from app.core.log import new_trace_id, reset_trace_id, set_trace_id
+from app.services.job_queue import job_queue
+from app.services.http_client import github_http
+from app.services.openai_client import openai_client
+from app.services.token_manager import token_manager
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Startup does no network I/O and does not wait for the OpenAI SDK.
+
+    The SDK is loaded in a thread once the server is up, so neither startup nor
+    the first review blocks the event loop on importing it.
+    """
+    github_http.start()
+    await token_manager.start()
+    await job_queue.start()
+    openai_warmup = asyncio.ensure_future(openai_client.warm_up())
+    yield
+    await asyncio.gather(openai_warmup, return_exceptions=True)
+    await job_queue.stop()
+    await token_manager.stop()
+    await openai_client.aclose()
+    await github_http.aclose()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.middleware("http")
+async def trace_request(request: Request, call_next):
+    """Tag the request's log lines, and the job it queues, with a trace ID.
+
+    GitHub's delivery ID is used when present, so a trace can be matched to
+    the delivery in the app's settings.
+    """
+    trace_id = (
+        request.headers.get("X-GitHub-Delivery")
+        or request.headers.get("X-Request-ID")
+        or new_trace_id()
+    )
+    token = set_trace_id(trace_id)
+    try:
+        response = await call_next(request)
+    finally:
+        reset_trace_id(token)
+    response.headers["X-Trace-ID"] = trace_id
+    return response
 
-app = FastAPI()
 
 # Register Routers
 app.include_router(health_router, prefix="/health", tags=["Health"])
+app.include_router(metrics_router, prefix="/metrics", tags=["Metrics"])
 app.include_router(github_router, prefix="/github", tags=["GitHub"])
 app.include_router(openapi_router, prefix="/openai", tags=["OpenAI"])
 app.include_router(webhook_router, prefix="/webhook", tags=["Webhook"])
@@ -0,0 +1,145 @@
+"""Production entry point: web processes and job worker processes.
+
+    python -m app.serve --web 2 --workers 4 --port 8000
+
+The web processes (uvicorn) verify webhooks and persist them to the SQLite job
+store; the worker processes (`app.worker`) claim and run the jobs, so reviews
+use every core and survive restarts. Worker n serves its metrics and stats
+endpoints on --metrics-port + n. SIGTERM or SIGINT drains everything: the
+web processes finish their requests and the workers their running jobs.
+Children that exit unexpectedly are restarted.
+"""
+
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+from typing import Optional
+from app.core.config import config
+from app.core.log import get_logger
+
+logger = get_logger("Supervisor")
+
+# State that must be shared by all processes for webhooks to be handled once
+SHARED_BACKENDS = (
+    "JOB_STORE_BACKEND",
+    "DEDUP_BACKEND",
+    "PUBLISHED_STATE_BACKEND",
+    "REVIEW_STATE_BACKEND",
+)
+
+
+class Child:
+    """A supervised `python -m <module>` process."""
+
+    def __init__(self, name: str, args: list, env: dict):
+        self.name = name
+        self.args = args
+        self.env = env
+        self.process: Optional[subprocess.Popen] = None
+
+    def start(self):
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", *self.args], env=self.env
+        )
+        logger.info("Started %s (pid %s)", self.name, self.process.pid)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--web", type=int, default=config.WEB_PROCESSES)
+    parser.add_argument("--workers", type=int, default=config.WORKER_PROCESSES)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=config.WORKER_METRICS_PORT or None,
+        help="port of the first worker's /metrics and stats endpoints; worker n "
+        "uses this plus n (default: --port + 1, 0 disables)",
+    )
+    args = parser.parse_args(argv)
+    if args.metrics_port is None:
+        args.metrics_port = args.port + 1
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    env = dict(os.environ)
+    for name in SHARED_BACKENDS:
+        env.setdefault(name, "sqlite")
+    if env["JOB_STORE_BACKEND"] != "sqlite":
+        sys.exit("app.serve needs JOB_STORE_BACKEND=sqlite")
+
+    # Web processes only enqueue; the job store hands the work to the workers
+    children = [
+        Child(
+            "web",
+            [
+                "uvicorn",
+                "app.main:app",
+                "--host",
+                args.host,
+                "--port",
+                str(args.port),
+                "--workers",
+                str(max(1, args.web)),
+            ],
+            {**env, "WORKER_CONCURRENCY": "0"},
+        )
+    ]
+    # Workers serve no webhooks, so each one exposes its metrics on its own port
+    children += [
+        Child(
+            f"worker-{n}",
+            ["app.worker"],
+            {
+                **env,
+                "WORKER_METRICS_HOST": args.host,
+                "WORKER_METRICS_PORT": str(
+                    args.metrics_port + n if args.metrics_port else 0
+                ),
+            },
+        )
+        for n in range(max(1, args.workers))
+    ]
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for child in children:
+        child.start()
+    while not stopping:
+        for child in children:
+            code = child.process.poll()
+            if code is not None and not stopping:
+                logger.error("%s exited with code %s, restarting", child.name, code)
+                child.start()
+        time.sleep(1)
+
+    logger.info("Draining web and worker processes")
+    for child in children:
+        if child.process.poll() is None:
+            child.process.send_signal(signal.SIGTERM)
+    deadline = time.monotonic() + config.JOB_SHUTDOWN_TIMEOUT_SECONDS + 10
+    for child in children:
+        try:
+            child.process.wait(timeout=max(0.0, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            logger.error("%s did not stop in time, killing it", child.name)
+            child.process.kill()
+            child.process.wait()
+    logger.info("All processes stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+import hashlib
+import re
+from typing import Optional, Tuple
+
+MARKER_RE = re.compile(r"<!-- prbuddy:(\w+) sha256=([0-9a-f]+) -->")
+
+
+class ContentKind:
+    """What a marked body holds; each PR has at most one of each."""
+
+    DESCRIPTION = "description"
+    REVIEW = "review"
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+
+def add_marker(kind: str, text: str) -> Tuple[str, str]:
+    """Append the hidden marker that identifies bot content; returns (body, hash)."""
+    digest = content_hash(text)
+    return f"{text}\n\n<!-- prbuddy:{kind} sha256={digest} -->", digest
+
+
+def find_marker(kind: str, body: Optional[str]) -> Optional[str]:
+    """The content hash in a body carrying the marker for `kind`, if any."""
+    for found_kind, digest in MARKER_RE.findall(body or ""):
+        if found_kind == kind:
+            return digest
+    return None
@@ -0,0 +1,204 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+from app.core.config import config
+from app.core.log import get_logger
+
+logger = get_logger("CacheStore")
+
+
+class MemoryStore:
+    """In-process LRU key/value store with per-entry TTL.
+
+    The methods are coroutines only to match `SQLiteStore`; they never block.
+    """
+
+    def __init__(self, max_entries: int, ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def _expires_at(self, ttl: Optional[float]) -> Optional[float]:
+        ttl = self.ttl if ttl is None else ttl
+        return time.time() + ttl if ttl else None
+
+    async def get(self, key: str) -> Optional[Any]:
+        return self._get(key)
+
+    def _get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        self._set(key, value, ttl)
+
+    def _set(self, key: str, value: Any, ttl: Optional[float] = None):
+        self._entries[key] = (value, self._expires_at(ttl))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        """Store the value only if the key is absent; True if it was stored."""
+        if self._get(key) is not None:
+            return False
+        self._set(key, value, ttl)
+        return True
+
+    async def delete(self, key: str):
+        self._entries.pop(key, None)
+
+    async def size(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteStore:
+    """On-disk key/value store with TTL and LRU size eviction.
+
+    Survives restarts and can be shared by several processes on one host.
+    Values must be JSON-serializable. Queries run in a thread, off the event
+    loop.
+    """
+
+    # Check the size limit every N writes rather than on each one
+    PRUNE_EVERY = 100
+
+    def __init__(
+        self,
+        path: str,
+        table: str,
+        max_entries: int,
+        ttl: Optional[float] = None,
+    ):
+        self.path = path
+        self.table = table
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, timeout=30, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "expires_at REAL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            f"CREATE INDEX IF NOT EXISTS {table}_accessed ON {table} (accessed_at)"
+        )
+
+    def _expires_at(self, ttl: Optional[float]) -> Optional[float]:
+        ttl = self.ttl if ttl is None else ttl
+        return time.time() + ttl if ttl else None
+
+    async def get(self, key: str) -> Optional[Any]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        await asyncio.to_thread(self._set, key, value, ttl)
+
+    async def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        """Store the value only if the key is absent; atomic across processes."""
+        return await asyncio.to_thread(self._add, key, value, ttl)
+
+    async def delete(self, key: str):
+        await asyncio.to_thread(self._delete, key)
+
+    async def size(self) -> int:
+        return await asyncio.to_thread(self._size)
+
+    # The blocking side of the methods above; they run in a thread
+
+    def _get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] is not None and row[1] <= now:
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                return None
+            self._conn.execute(
+                f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+        return json.loads(row[0])
+
+    def _set(self, key: str, value: Any, ttl: Optional[float] = None):
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), self._expires_at(ttl), time.time()),
+            )
+            self._maybe_prune()
+
+    def _add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    f"DELETE FROM {self.table} WHERE key = ? AND expires_at <= ?",
+                    (key, now),
+                )
+                cursor = self._conn.execute(
+                    f"INSERT OR IGNORE INTO {self.table} VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value), self._expires_at(ttl), now),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            added = cursor.rowcount == 1
+            if added:
+                self._maybe_prune()
+        return added
+
+    def _delete(self, key: str):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def _size(self) -> int:
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[
+                0
+            ]
+
+    def _maybe_prune(self):
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY:
+            return
+        self._conn.execute(
+            f"DELETE FROM {self.table} WHERE expires_at <= ?", (time.time(),)
+        )
+        self._conn.execute(
+            f"DELETE FROM {self.table} WHERE key IN (SELECT key FROM {self.table} "
+            "ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+
+def create_store(
+    backend: str, table: str, max_entries: int, ttl: Optional[float] = None
+):
+    """Build the configured store backend, or None when caching is disabled."""
+    if backend == "sqlite":
+        logger.info("Using SQLite store '%s' at %s", table, config.SQLITE_PATH)
+        return SQLiteStore(config.SQLITE_PATH, table, max_entries, ttl)
+    if backend == "memory":
+        return MemoryStore(max_entries, ttl)
+    return None
@@ -0,0 +1,86 @@
+import time
+from typing import Optional
+from app.core.config import config
+from app.core.log import get_logger
+from app.services.cache_store import create_store
+
+logger = get_logger("DeliveryDedup")
+
+
+class DeliveryDeduplicator:
+    """Remembers webhook deliveries and PR work that has already been accepted.
+
+    Claims go through the store's atomic `add`, so with the SQLite backend a
+    delivery is accepted by exactly one of several uvicorn workers.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.duplicate_deliveries = 0
+        self.duplicate_work = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.store is not None
+
+    @staticmethod
+    def work_key(
+        repo_full_name: str, pr_number: int, head_sha: Optional[str], action: str
+    ) -> str:
+        return f"work:{repo_full_name}#{pr_number}@{head_sha}:{action}"
+
+    async def claim_delivery(self, delivery_id: Optional[str]) -> bool:
+        """False if this `X-GitHub-Delivery` was already accepted."""
+        if not self.enabled or not delivery_id:
+            return True
+        if await self.store.add(f"delivery:{delivery_id}", time.time()):
+            return True
+        self.duplicate_deliveries += 1
+        logger.info("Duplicate delivery %s", delivery_id)
+        return False
+
+    async def release_delivery(self, delivery_id: Optional[str]):
+        """Forget a delivery that could not be queued; redeliveries keep its ID."""
+        if self.enabled and delivery_id:
+            await self.store.delete(f"delivery:{delivery_id}")
+
+    async def claim_work(
+        self, repo_full_name: str, pr_number: int, head_sha: Optional[str], action: str
+    ) -> bool:
+        """False if the same action on the same head commit was already accepted."""
+        if not self.enabled or not head_sha:
+            return True
+        key = self.work_key(repo_full_name, pr_number, head_sha, action)
+        if await self.store.add(key, time.time()):
+            return True
+        self.duplicate_work += 1
+        logger.info("Duplicate work %s", key)
+        return False
+
+    async def release_work(
+        self, repo_full_name: str, pr_number: int, head_sha: Optional[str], action: str
+    ):
+        """Forget a claim whose job failed, so a redelivery can retry it."""
+        if self.enabled and head_sha:
+            await self.store.delete(
+                self.work_key(repo_full_name, pr_number, head_sha, action)
+            )
+
+    async def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "duplicate_deliveries": self.duplicate_deliveries,
+            "duplicate_work": self.duplicate_work,
+            "entries": await self.store.size() if self.enabled else 0,
+        }
+
+
+# Instantiate the deduplicator
+delivery_dedup = DeliveryDeduplicator(
+    create_store(
+        config.DEDUP_BACKEND,
+        "webhook_deliveries",
+        config.DEDUP_MAX_ENTRIES,
+        config.DEDUP_TTL_SECONDS,
+    )
+)
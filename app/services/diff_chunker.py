@@ -0,0 +1,209 @@
+import posixpath
+from fnmatch import fnmatch
+from typing import List
+from app.core.config import config
+from app.services.diff_parser import FileDiff
+from app.services.tokens import count_tokens
+
+
+class FilePriority:
+    """Review importance of a file; lower values are reviewed first and dropped last."""
+
+    SOURCE = 0
+    CONFIG = 1
+    TEST = 2
+    GENERATED = 3
+    LOCKFILE = 4
+
+
+LOCKFILES = {
+    "package-lock.json",
+    "npm-shrinkwrap.json",
+    "yarn.lock",
+    "pnpm-lock.yaml",
+    "poetry.lock",
+    "Pipfile.lock",
+    "uv.lock",
+    "Cargo.lock",
+    "go.sum",
+    "composer.lock",
+    "Gemfile.lock",
+    "packages.lock.json",
+}
+GENERATED_PATTERNS = [
+    "*.min.js",
+    "*.min.css",
+    "*.map",
+    "*.snap",
+    "*_pb2.py",
+    "*_pb2_grpc.py",
+    "*.pb.go",
+    "*.generated.*",
+    "dist/*",
+    "build/*",
+    "vendor/*",
+    "node_modules/*",
+    "*/dist/*",
+    "*/build/*",
+    "*/vendor/*",
+    "*/node_modules/*",
+]
+TEST_PATTERNS = [
+    "test_*",
+    "*_test.*",
+    "*.test.*",
+    "*.spec.*",
+    "tests/*",
+    "test/*",
+    "*/tests/*",
+    "*/test/*",
+    "*/__tests__/*",
+]
+CONFIG_PATTERNS = [
+    "*.md",
+    "*.rst",
+    "*.txt",
+    "*.json",
+    "*.yml",
+    "*.yaml",
+    "*.toml",
+    "*.ini",
+    "*.cfg",
+]
+
+
+def rank_file(path: str) -> int:
+    """Classify a file path into a FilePriority."""
+    name = posixpath.basename(path)
+    if name in LOCKFILES:
+        return FilePriority.LOCKFILE
+    if any(fnmatch(path, pattern) for pattern in GENERATED_PATTERNS):
+        return FilePriority.GENERATED
+    if any(fnmatch(path, p) or fnmatch(name, p) for p in TEST_PATTERNS):
+        return FilePriority.TEST
+    if any(fnmatch(name, pattern) for pattern in CONFIG_PATTERNS):
+        return FilePriority.CONFIG
+    return FilePriority.SOURCE
+
+
+class DiffUnit:
+    """A whole file diff, or a group of its hunks, small enough for one batch."""
+
+    def __init__(self, path: str, text: str, priority: int):
+        self.path = path
+        self.text = text
+        self.priority = priority
+        self.tokens = count_tokens(text)
+
+
+class DiffBatch:
+    """Units packed together into one LLM request."""
+
+    def __init__(self):
+        self.units: List[DiffUnit] = []
+        self.tokens = 0
+
+    def add(self, unit: DiffUnit):
+        self.units.append(unit)
+        self.tokens += unit.tokens
+
+    @property
+    def text(self) -> str:
+        return "\n".join(unit.text for unit in self.units)
+
+
+class ChunkPlan:
+    """Batches to review plus the files left out by the token budget."""
+
+    def __init__(self):
+        self.batches: List[DiffBatch] = []
+        self.dropped: List[str] = []
+        self.total_tokens = 0
+        self.packed_tokens = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "batches": len(self.batches),
+            "total_tokens": self.total_tokens,
+            "packed_tokens": self.packed_tokens,
+            "dropped_files": self.dropped,
+        }
+
+
+class DiffChunker:
+    """Packs per-file and per-hunk diff units into context-sized batches."""
+
+    def __init__(
+        self,
+        chunk_max_tokens: int = config.CHUNK_MAX_TOKENS,
+        token_budget: int = config.DIFF_TOKEN_BUDGET,
+    ):
+        self.chunk_max_tokens = chunk_max_tokens
+        self.token_budget = token_budget
+
+    def split_file(self, file: FileDiff) -> List[DiffUnit]:
+        """Split a file into units of at most `chunk_max_tokens`, on hunk boundaries."""
+        priority = rank_file(file.path or "")
+        whole = DiffUnit(file.path, file.text, priority)
+        if whole.tokens <= self.chunk_max_tokens or not file.hunks:
+            return [whole]
+
+        units = []
+        group: List[str] = []
+        header_tokens = count_tokens(file.header)
+        group_tokens = header_tokens
+        for hunk in file.hunks:
+            hunk_text = self._truncate(hunk.text)
+            hunk_tokens = count_tokens(hunk_text)
+            if group and group_tokens + hunk_tokens > self.chunk_max_tokens:
+                units.append(
+                    DiffUnit(file.path, "\n".join([file.header, *group]), priority)
+                )
+                group = []
+                group_tokens = header_tokens
+            group.append(hunk_text)
+            group_tokens += hunk_tokens
+        if group:
+            units.append(
+                DiffUnit(file.path, "\n".join([file.header, *group]), priority)
+            )
+        return units
+
+    def _truncate(self, text: str) -> str:
+        """Cut a single oversized hunk down to the chunk size."""
+        tokens = count_tokens(text)
+        if tokens <= self.chunk_max_tokens:
+            return text
+        lines = text.splitlines()
+        keep = max(1, len(lines) * self.chunk_max_tokens // tokens - 1)
+        return "\n".join([*lines[:keep], "... (hunk truncated)"])
+
+    def plan(self, files: List[FileDiff]) -> ChunkPlan:
+        """Pack units into batches, most important files first.
+
+        Units that no longer fit in the total token budget are dropped, so
+        lockfiles, generated code and tests are the first to go.
+        """
+        plan = ChunkPlan()
+        units = [unit for file in files for unit in self.split_file(file)]
+        plan.total_tokens = sum(unit.tokens for unit in units)
+
+        for unit in sorted(units, key=lambda u: u.priority):
+            if plan.packed_tokens + unit.tokens > self.token_budget:
+                if unit.path not in plan.dropped:
+                    plan.dropped.append(unit.path)
+                continue
+            batch = next(
+                (
+                    b
+                    for b in plan.batches
+                    if b.tokens + unit.tokens <= self.chunk_max_tokens
+                ),
+                None,
+            )
+            if batch is None:
+                batch = DiffBatch()
+                plan.batches.append(batch)
+            batch.add(unit)
+            plan.packed_tokens += unit.tokens
+        return plan
@@ -0,0 +1,275 @@
+import posixpath
+from fnmatch import fnmatch
+from typing import Dict, List, Optional, Tuple
+from app.core.config import config
+from app.services.diff_chunker import LOCKFILES
+from app.services.diff_index import DiffIndex
+from app.services.diff_parser import HUNK_HEADER_RE, FileDiff, Hunk, ParsedDiff
+from app.services.tokens import count_tokens
+
+# Files whose diff is machine-written; the model only sees that they changed
+DEFAULT_EXCLUDE_PATTERNS = [
+    *sorted(LOCKFILES),
+    "*.min.js",
+    "*.min.css",
+    "*.map",
+    "*.snap",
+    "*_pb2.py",
+    "*_pb2_grpc.py",
+    "*.pb.go",
+    "node_modules/**",
+    "vendor/**",
+]
+GITATTRIBUTES_EXCLUDE = ("linguist-generated", "linguist-vendored")
+
+
+def _glob_match(pattern: str, path: str) -> bool:
+    """gitignore-style matching: patterns without a slash match at any depth."""
+    pattern = pattern.rstrip("/")
+    if "/" not in pattern:
+        return fnmatch(posixpath.basename(path), pattern) or fnmatch(
+            path, f"*/{pattern}/*"
+        )
+    return fnmatch(path, pattern.lstrip("/"))
+
+
+def _copy_file(file: FileDiff, header_lines: List[str]) -> FileDiff:
+    """A hunkless copy of `file` with a new header."""
+    copy = FileDiff(header_lines)
+    for name in FileDiff.__slots__:
+        if name not in ("header_lines", "hunks"):
+            setattr(copy, name, getattr(file, name))
+    return copy
+
+
+def _measure(files: List[FileDiff]) -> Tuple[int, int]:
+    """(bytes, tokens) of the rendered files, counted one file at a time."""
+    size = tokens = 0
+    for file in files:
+        text = file.text
+        size += len(text.encode()) + 1
+        tokens += count_tokens(text)
+    return max(size - 1, 0), tokens
+
+
+def restrict_to(diff: ParsedDiff, reference: ParsedDiff) -> ParsedDiff:
+    """Keep only the files and hunks of `diff` that `reference` also changes.
+
+    A compare diff spanning a merge of the base branch also contains the
+    merged changes; intersecting it with the PR's diff leaves the PR's own.
+    Both diffs must end at the same commit, so their new-file lines line up.
+    """
+    index = DiffIndex(reference.files)
+    paths = {file.path for file in reference.files}
+    files = []
+    for file in diff.files:
+        if file.path not in paths:
+            continue
+        if file.is_deleted or not file.hunks:
+            files.append(file)
+            continue
+        hunks = []
+        for hunk in file.hunks:
+            start = max(hunk.new_start, 1)
+            end = max(hunk.new_start + hunk.new_count - 1, start)
+            if index.overlaps(file.path, start, end):
+                hunks.append(hunk)
+        if not hunks:
+            continue
+        restricted = _copy_file(file, file.header_lines)
+        restricted.hunks = hunks
+        files.append(restricted)
+    return ParsedDiff(files, diff.bytes, diff.truncated)
+
+
+def parse_gitattributes(text: str) -> List[Tuple[str, bool]]:
+    """(pattern, excluded) rules for `linguist-generated` / `linguist-vendored`.
+
+    `-attr` and `attr=false` clear the flag, so later lines can re-include paths.
+    """
+    rules = []
+    for line in text.splitlines():
+        parts = line.split()
+        if not parts or parts[0].startswith("#"):
+            continue
+        pattern, attributes = parts[0], parts[1:]
+        for attribute in attributes:
+            name, _, value = attribute.lstrip("-!").partition("=")
+            if name not in GITATTRIBUTES_EXCLUDE:
+                continue
+            excluded = not attribute.startswith(("-", "!")) and value != "false"
+            rules.append((pattern, excluded))
+    return rules
+
+
+class FilterReport:
+    """What the filter removed from one diff."""
+
+    def __init__(self):
+        self.omitted_files: Dict[str, str] = {}
+        self.hunks_dropped = 0
+        self.bytes_before = 0
+        self.bytes_after = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "omitted_files": self.omitted_files,
+            "hunks_dropped": self.hunks_dropped,
+            "bytes_removed": self.bytes_before - self.bytes_after,
+            "tokens_removed": self.tokens_before - self.tokens_after,
+            "bytes_before": self.bytes_before,
+            "tokens_before": self.tokens_before,
+        }
+
+
+class DiffFilter:
+    """Shrinks a diff before it is sent to the model.
+
+    Generated, vendored, binary and oversized files are reduced to a note,
+    whitespace-only hunks are dropped, and context around changes is cut down
+    to `context_lines` (hunk headers are rewritten to keep line numbers valid).
+    """
+
+    def __init__(
+        self,
+        exclude_patterns: Optional[List[str]] = None,
+        context_lines: int = config.DIFF_CONTEXT_LINES,
+    ):
+        if exclude_patterns is None:
+            exclude_patterns = DEFAULT_EXCLUDE_PATTERNS + [
+                p.strip() for p in config.DIFF_EXCLUDE_PATTERNS.split(",") if p.strip()
+            ]
+        self.exclude_patterns = exclude_patterns
+        self.context_lines = context_lines
+
+    def omit_reason(self, file: FileDiff, attributes: list) -> Optional[str]:
+        if file.is_binary:
+            return "binary file"
+        if file.too_large:
+            return "diff too large"
+        path = file.path or ""
+        excluded = None
+        # Later .gitattributes lines take precedence
+        for pattern, flag in attributes:
+            if _glob_match(pattern, path):
+                excluded = flag
+        if excluded:
+            return "generated or vendored file (.gitattributes)"
+        if excluded is None and any(
+            _glob_match(p, path) for p in self.exclude_patterns
+        ):
+            return "generated or vendored file"
+        return None
+
+    def apply(
+        self, diff: ParsedDiff, gitattributes: Optional[str] = None
+    ) -> Tuple[ParsedDiff, FilterReport]:
+        report = FilterReport()
+        report.bytes_before, report.tokens_before = _measure(diff.files)
+        attributes = parse_gitattributes(gitattributes) if gitattributes else []
+
+        files = []
+        for file in diff.files:
+            header = [
+                line for line in file.header_lines if not line.startswith("index ")
+            ]
+            reason = self.omit_reason(file, attributes)
+            if reason:
+                report.omitted_files[file.path] = reason
+                if file.is_binary:
+                    note = f"# {reason} omitted"
+                else:
+                    note = f"# {reason} omitted (+{file.additions} -{file.deletions} lines)"
+                files.append(_copy_file(file, [header[0], note]))
+                continue
+
+            hunks = []
+            for hunk in file.hunks:
+                for lines in self.collapse(hunk):
+                    if self.is_whitespace_only(lines):
+                        report.hunks_dropped += 1
+                    else:
+                        hunks.append(Hunk.from_lines(lines))
+            if file.hunks and not hunks:
+                report.omitted_files[file.path] = "whitespace-only changes"
+                files.append(
+                    _copy_file(file, [header[0], "# whitespace-only changes omitted"])
+                )
+                continue
+            filtered = _copy_file(file, header)
+            filtered.hunks = hunks
+            files.append(filtered)
+
+        report.bytes_after, report.tokens_after = _measure(files)
+        return ParsedDiff(files, diff.bytes, diff.truncated), report
+
+    def collapse(self, hunk: Hunk) -> List[List[str]]:
+        """Split a hunk so each change keeps at most `context_lines` of context.
+
+        Returns the resulting hunks as lists of lines, header first.
+        """
+        section = HUNK_HEADER_RE.match(hunk.header).group(5)
+        if self.context_lines < 0:
+            return [[hunk.header, *hunk.lines]]
+        lines = hunk.lines
+        changed = [i for i, line in enumerate(lines) if line.startswith(("+", "-"))]
+        keep = [False] * len(lines)
+        for i in changed:
+            for j in range(
+                max(0, i - self.context_lines),
+                min(len(lines), i + self.context_lines + 1),
+            ):
+                keep[j] = True
+
+        runs = []
+        run = None
+        old_line, new_line = hunk.old_start, hunk.new_start
+        for i, line in enumerate(lines):
+            if line.startswith("\\"):
+                # "\ No newline at end of file" belongs to the line before it
+                if run is not None:
+                    run["lines"].append(line)
+                continue
+            is_added, is_removed = line.startswith("+"), line.startswith("-")
+            if keep[i]:
+                if run is None:
+                    run = {"old": old_line, "new": new_line, "lines": []}
+                    runs.append(run)
+                run["lines"].append(line)
+            else:
+                run = None
+            old_line += 0 if is_added else 1
+            new_line += 0 if is_removed else 1
+
+        hunks = []
+        for run in runs:
+            old_count = sum(1 for l in run["lines"] if not l.startswith(("+", "\\")))
+            new_count = sum(1 for l in run["lines"] if not l.startswith(("-", "\\")))
+            # An empty side points at the line before the change, as git does
+            old_start = max(run["old"] - 1, 0) if old_count == 0 else run["old"]
+            new_start = max(run["new"] - 1, 0) if new_count == 0 else run["new"]
+            header = f"@@ -{old_start},{old_count} +{new_start},{new_count} @@{section}"
+            hunks.append([header, *run["lines"]])
+        return hunks
+
+    @staticmethod
+    def is_whitespace_only(hunk_lines: List[str]) -> bool:
+        """True if the removed and added lines only differ in trailing whitespace
+        or blank lines.
+
+        Lines are compared one by one with their indentation and inner spacing,
+        which can matter (Python, YAML, string literals).
+        """
+        removed = [
+            line[1:].rstrip()
+            for line in hunk_lines
+            if line.startswith("-") and line[1:].strip()
+        ]
+        added = [
+            line[1:].rstrip()
+            for line in hunk_lines
+            if line.startswith("+") and line[1:].strip()
+        ]
+        return removed == added
@@ -0,0 +1,118 @@
+import re
+from array import array
+from bisect import bisect_right
+from typing import Dict, List, Optional
+from app.services.diff_parser import HUNK_HEADER_RE, FileDiff
+
+SUGGESTION_FENCE_RE = re.compile(r"^(\s*)```suggestion\b", re.MULTILINE)
+
+
+class FileLineIndex:
+    """Sorted, non-overlapping ranges of commentable new-file lines of one file."""
+
+    def __init__(self):
+        self.starts = array("l")
+        self.ends = array("l")
+
+    def add(self, start: int, end: int):
+        """Append a range; ranges must arrive in ascending order."""
+        if self.ends and start <= self.ends[-1] + 1:
+            self.ends[-1] = max(self.ends[-1], end)
+            return
+        self.starts.append(start)
+        self.ends.append(end)
+
+    def contains(self, line: int) -> bool:
+        i = bisect_right(self.starts, line) - 1
+        return i >= 0 and line <= self.ends[i]
+
+    def overlaps(self, start: int, end: int) -> bool:
+        i = bisect_right(self.starts, end) - 1
+        return i >= 0 and start <= self.ends[i]
+
+    def nearest(self, line: int) -> Optional[int]:
+        """The commentable line closest to `line`, or None if the file has none."""
+        i = bisect_right(self.starts, line) - 1
+        if i >= 0 and line <= self.ends[i]:
+            return line
+        candidates = []
+        if i >= 0:
+            candidates.append(self.ends[i])
+        if i + 1 < len(self.starts):
+            candidates.append(self.starts[i + 1])
+        return min(candidates, key=lambda c: abs(c - line), default=None)
+
+
+class DiffIndex:
+    """Which lines of a diff can carry a RIGHT-side review comment.
+
+    GitHub only accepts comments on lines inside a hunk: added or context lines
+    of the new file. Each file is stored as interval arrays with O(log n) lookup.
+    """
+
+    def __init__(self, files: List[FileDiff]):
+        self.files: Dict[str, FileLineIndex] = {}
+        for file in files:
+            if file.path is None or file.is_deleted or file.is_binary:
+                continue
+            index = self.files.setdefault(file.path, FileLineIndex())
+            for hunk in sorted(file.hunks, key=lambda h: h.new_start):
+                if hunk.new_count > 0:
+                    index.add(hunk.new_start, hunk.new_start + hunk.new_count - 1)
+
+    def contains(self, path: str, line: int) -> bool:
+        index = self.files.get(path)
+        return index is not None and index.contains(line)
+
+    def overlaps(self, path: str, start: int, end: int) -> bool:
+        """Whether any line in `start`..`end` (inclusive) is inside a hunk."""
+        index = self.files.get(path)
+        return index is not None and index.overlaps(start, end)
+
+    def snap(self, path: str, line: int, max_distance: int) -> Optional[int]:
+        """`line` if commentable, else the nearest commentable line within reach."""
+        index = self.files.get(path)
+        if index is None:
+            return None
+        nearest = index.nearest(line)
+        if nearest is None or abs(nearest - line) > max_distance:
+            return None
+        return nearest
+
+
+def unanchor_suggestion(body: str, line: int) -> str:
+    """Turn suggestion blocks into plain code blocks once moved off their line.
+
+    A ```suggestion block replaces the line it is attached to, so applying it
+    on a snapped line would rewrite the wrong code.
+    """
+    body = SUGGESTION_FENCE_RE.sub(r"\1```", body)
+    return f"_Suggested for line {line}, which is outside the diff._\n\n{body}"
+
+
+def annotate_diff(diff_text: str) -> str:
+    """Prefix every hunk line with its new-file line number.
+
+    Removed lines get a blank gutter since they cannot be commented on, so the
+    model can copy valid positions instead of counting lines itself.
+    """
+    annotated = []
+    new_line = None
+    for line in diff_text.splitlines():
+        if line.startswith("diff --git "):
+            new_line = None
+            annotated.append(line)
+            continue
+        if line.startswith("@@"):
+            match = HUNK_HEADER_RE.match(line)
+            new_line = int(match.group(3)) if match else None
+            annotated.append(line)
+            continue
+        if new_line is None:
+            annotated.append(line)
+        elif line.startswith(("+", " ")) or line == "":
+            annotated.append(f"{new_line:>6} {line}")
+            new_line += 1
+        else:
+            annotated.append(f"{'':>6} {line}")
+    return "\n".join(annotated)
@@ -0,0 +1,302 @@
+import re
+from typing import List, Optional
+from app.core.config import config
+
+HUNK_HEADER_RE = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@(.*)$")
+
+
+class Hunk:
+    """One `@@` section of a file diff.
+
+    The body lines are kept joined in one string and only split on demand.
+    """
+
+    __slots__ = (
+        "header",
+        "old_start",
+        "old_count",
+        "new_start",
+        "new_count",
+        "body",
+        "line_count",
+    )
+
+    def __init__(
+        self,
+        header: str,
+        old_start: int,
+        old_count: int,
+        new_start: int,
+        new_count: int,
+    ):
+        self.header = header
+        self.old_start = old_start
+        self.old_count = old_count
+        self.new_start = new_start
+        self.new_count = new_count
+        self.body = ""
+        self.line_count = 0
+
+    @classmethod
+    def from_header(cls, line: str) -> Optional["Hunk"]:
+        """A hunk for an `@@` header line, or None if `line` is not one."""
+        match = HUNK_HEADER_RE.match(line)
+        if not match:
+            return None
+        old_start, old_count, new_start, new_count, _ = match.groups()
+        return cls(
+            line,
+            int(old_start),
+            int(old_count) if old_count is not None else 1,
+            int(new_start),
+            int(new_count) if new_count is not None else 1,
+        )
+
+    @classmethod
+    def from_lines(cls, lines: List[str]) -> "Hunk":
+        """A hunk from its header line followed by its body lines."""
+        hunk = cls.from_header(lines[0])
+        hunk.set_lines(lines[1:])
+        return hunk
+
+    def set_lines(self, lines: List[str]):
+        self.body = "\n".join(lines)
+        self.line_count = len(lines)
+
+    @property
+    def lines(self) -> List[str]:
+        return self.body.split("\n") if self.line_count else []
+
+    @property
+    def text(self) -> str:
+        return f"{self.header}\n{self.body}" if self.line_count else self.header
+
+
+class FileDiff:
+    """All hunks of a single file in a unified diff.
+
+    Added and removed lines are counted while parsing, so they stay known for
+    files whose hunks were dropped for being too large.
+    """
+
+    __slots__ = (
+        "header_lines",
+        "hunks",
+        "old_path",
+        "path",
+        "is_binary",
+        "is_new",
+        "is_deleted",
+        "similarity",
+        "too_large",
+        "additions",
+        "deletions",
+    )
+
+    def __init__(self, header_lines: List[str]):
+        self.header_lines = header_lines
+        self.hunks: List[Hunk] = []
+        self.old_path: Optional[str] = None
+        self.path: Optional[str] = None
+        self.is_binary = False
+        self.is_new = False
+        self.is_deleted = False
+        self.similarity: Optional[int] = None
+        self.too_large = False
+        self.additions = 0
+        self.deletions = 0
+
+    @property
+    def header(self) -> str:
+        return "\n".join(self.header_lines)
+
+    @property
+    def text(self) -> str:
+        return "\n".join([self.header, *(hunk.text for hunk in self.hunks)])
+
+
+class ParsedDiff:
+    """The files of a diff, how many bytes were read and whether it was cut off."""
+
+    __slots__ = ("files", "bytes", "truncated", "_text")
+
+    def __init__(self, files: List[FileDiff], bytes: int = 0, truncated: bool = False):
+        self.files = files
+        self.bytes = bytes
+        self.truncated = truncated
+        self._text: Optional[str] = None
+
+    @property
+    def text(self) -> str:
+        """The diff rendered for a prompt; built once, on first use."""
+        if self._text is None:
+            parts = [file.text for file in self.files]
+            if self.truncated:
+                parts.append(
+                    f"# diff truncated after {self.bytes} bytes, later files omitted"
+                )
+            self._text = "\n".join(parts)
+        return self._text
+
+
+def _parse_git_header(line: str):
+    """Extract (old_path, new_path) from a `diff --git a/x b/y` line."""
+    rest = line[len("diff --git ") :]
+    if rest.startswith("a/") and " b/" in rest:
+        old, new = rest[2:].split(" b/", 1)
+        return old, new
+    return None, None
+
+
+def _strip_prefix(path: str) -> Optional[str]:
+    path = path.split("\t", 1)[0]
+    if path == "/dev/null":
+        return None
+    if path[:2] in ("a/", "b/"):
+        return path[2:]
+    return path
+
+
+class DiffParser:
+    """Parses a unified (git) diff incrementally, as its bytes arrive.
+
+    Only the current line and the current hunk's lines are held outside the
+    records. Reading stops after `max_bytes`; the file being read at that
+    point is dropped. Files whose diff exceeds `max_file_bytes` keep their
+    header and line counts but no hunks.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = config.DIFF_MAX_BYTES,
+        max_file_bytes: int = config.DIFF_MAX_FILE_BYTES,
+    ):
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self.files: List[FileDiff] = []
+        self.bytes = 0
+        self.truncated = False
+        self._partial = bytearray()
+        self._current: Optional[FileDiff] = None
+        self._current_bytes = 0
+        self._hunk: Optional[Hunk] = None
+        self._hunk_lines: List[str] = []
+
+    def feed(self, data: bytes) -> bool:
+        """Parse the next piece of the diff; False once the byte cap is reached."""
+        if self.truncated:
+            return False
+        if self.max_bytes and self.bytes + len(data) > self.max_bytes:
+            data = data[: self.max_bytes - self.bytes]
+            self.truncated = True
+        self.bytes += len(data)
+        self._partial += data
+        start = 0
+        while True:
+            # UTF-8 never uses the newline byte inside a multi-byte character
+            end = self._partial.find(b"\n", start)
+            if end < 0:
+                break
+            self.feed_line(self._partial[start:end].decode("utf-8", "replace"))
+            start = end + 1
+        del self._partial[:start]
+        return not self.truncated
+
+    def close(self) -> ParsedDiff:
+        if self.truncated:
+            self._current = None
+        elif self._partial:
+            self.feed_line(self._partial.decode("utf-8", "replace"))
+        self._partial = bytearray()
+        self._finish_file()
+        return ParsedDiff(self.files, self.bytes, self.truncated)
+
+    def feed_line(self, line: str):
+        if line.endswith("\r"):
+            line = line[:-1]
+        if line.startswith("diff --git "):
+            self._finish_file()
+            self._current = FileDiff([line])
+            self._current.old_path, self._current.path = _parse_git_header(line)
+            self._current_bytes = 0
+            return
+        current = self._current
+        if current is None:
+            return
+        self._current_bytes += len(line) + 1
+
+        if self._hunk is None and not current.too_large:
+            hunk = Hunk.from_header(line)
+            if hunk is None:
+                self._header_line(current, line)
+                return
+            self._hunk = hunk
+            current.hunks.append(hunk)
+            return
+
+        if line.startswith("@@ "):
+            hunk = Hunk.from_header(line)
+            if hunk is not None:
+                self._finish_hunk()
+                if not current.too_large:
+                    self._hunk = hunk
+                    current.hunks.append(hunk)
+                return
+        if line.startswith("+"):
+            current.additions += 1
+        elif line.startswith("-"):
+            current.deletions += 1
+        if current.too_large:
+            return
+        if self.max_file_bytes and self._current_bytes > self.max_file_bytes:
+            current.too_large = True
+            current.hunks = []
+            self._hunk, self._hunk_lines = None, []
+            return
+        self._hunk_lines.append(line)
+
+    @staticmethod
+    def _header_line(current: FileDiff, line: str):
+        current.header_lines.append(line)
+        if line.startswith("--- "):
+            current.old_path = _strip_prefix(line[4:])
+        elif line.startswith("+++ "):
+            current.path = _strip_prefix(line[4:])
+        elif line.startswith("new file mode"):
+            current.is_new = True
+        elif line.startswith("deleted file mode"):
+            current.is_deleted = True
+        elif line.startswith("rename from "):
+            current.old_path = line[len("rename from ") :]
+        elif line.startswith("rename to "):
+            current.path = line[len("rename to ") :]
+        elif line.startswith("similarity index "):
+            current.similarity = int(line.rstrip("%").split()[-1])
+        elif line.startswith("Binary files ") or line == "GIT binary patch":
+            current.is_binary = True
+
+    def _finish_hunk(self):
+        if self._hunk is not None:
+            self._hunk.set_lines(self._hunk_lines)
+        self._hunk, self._hunk_lines = None, []
+
+    def _finish_file(self):
+        self._finish_hunk()
+        current, self._current = self._current, None
+        if current is None:
+            return
+        if current.path is None:
+            current.path = current.old_path
+        if current.too_large:
+            current.header_lines.append(
+                f"# diff too large omitted (+{current.additions} -{current.deletions} lines)"
+            )
+        self.files.append(current)
+
+
+def parse_diff(diff_text: str) -> List[FileDiff]:
+    """Parse a unified (git) diff into per-file and per-hunk units."""
+    parser = DiffParser(max_bytes=0, max_file_bytes=0)
+    for line in diff_text.splitlines():
+        parser.feed_line(line)
+    return parser.close().files
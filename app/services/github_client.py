@@ -1,16 +1,55 @@
-import logging
+import time
 import httpx
 from fastapi import HTTPException
-from github import Github, GithubIntegration
-from app.services.installation_token import installationToken
+from typing import List, Optional, Tuple
+from app.services.diff_parser import DiffParser, ParsedDiff
+from app.services.http_cache import create_http_cache
+from app.services.http_client import github_http
+from app.services.metrics import endpoint_template, github_requests, instrument
+from app.services.rate_limiter import (
+    Priority,
+    RateLimited,
+    TokenBucket,
+    rate_limiter,
+)
+from app.services.token_manager import token_manager
 from app.core.config import config
+from app.core.log import get_logger
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(name)s - [GitHubAPIClient] - %(message)s",
-)
-logger = logging.getLogger("GitHubAPIClient")
+logger = get_logger("GitHubAPIClient")
+
+DIFF_MEDIA_TYPE = "application/vnd.github.v3.diff"
+
+
+def observe_github_rate_limit(bucket: TokenBucket, response: httpx.Response):
+    """Sync an installation bucket with GitHub's `X-RateLimit-*` headers."""
+    remaining = response.headers.get("x-ratelimit-remaining")
+    if remaining is None:
+        return
+    limit = response.headers.get("x-ratelimit-limit")
+    if limit and int(limit) != bucket.capacity:
+        # e.g. Enterprise Cloud installations get a higher hourly limit
+        bucket.capacity = int(limit)
+        bucket.rate = int(limit) / 3600
+    reset = response.headers.get("x-ratelimit-reset")
+    reset_after = max(0.0, int(reset) - time.time()) if reset else None
+    bucket.observe(int(remaining), reset_after)
+
+
+def github_throttle(response: httpx.Response) -> Tuple[bool, Optional[float]]:
+    """Whether GitHub rate limited the request, and how long it asked us to wait."""
+    if response.status_code not in (403, 429):
+        return False, None
+    retry_after = response.headers.get("retry-after")
+    if retry_after is not None:
+        return True, float(retry_after)
+    if response.headers.get("x-ratelimit-remaining") == "0":
+        reset = response.headers.get("x-ratelimit-reset")
+        return True, max(0.0, int(reset) - time.time()) if reset else None
+    if response.status_code == 429 or "rate limit" in response.text.lower():
+        # GitHub asks to wait at least a minute when no header says otherwise
+        return True, 60.0
+    return False, None
 
 
 class GitHubAPIClient:
@@ -18,159 +57,511 @@ class GitHubAPIClient:
 
     def __init__(self):
         """Initialize GitHub API client"""
+        self.cache = create_http_cache()
         try:
             if config.GH_APP_AUTH_METHOD == "APP":
-                self.auth_headers = installationToken.get_installation_token_main()
+                # Installation tokens are minted lazily and cached per installation
+                self.auth_headers = None
             else:
                 self.auth_headers = {"Authorization": f"Bearer {config.GH_PAT}"}
             logger.info(
-                f"GitHub API client initialized using ${config.GH_APP_AUTH_METHOD} method"
+                "GitHub API client initialized using %s method",
+                config.GH_APP_AUTH_METHOD,
             )
         except Exception as e:
-            logger.exception(f"Failed to initialize GitHub API client: {str(e)}")
+            logger.exception("Failed to initialize GitHub API client: %s", e)
             raise HTTPException(
                 status_code=500, detail="Failed to initialize GitHub API client"
             )
 
-    @staticmethod
-    async def get_github_client_using_pat():
-        return Github(config.GH_PAT)
-
-    @staticmethod
-    async def get_github_client_using_app():
+    async def get_auth_headers(self, installation_id: Optional[int] = None) -> dict:
         """
-        Authenticate as a GitHub App and retrieve an installation client.
+        Get the Authorization header based on the authentication method.
         """
+        if config.GH_APP_AUTH_METHOD != "APP":
+            return self.auth_headers
         try:
-            jwt_token = installationToken.generate_jwt()
-            installation_id = installationToken.get_installation_id(jwt_token)
-            integration = GithubIntegration(
-                installationToken.APP_ID,
-                installationToken.PRIVATE_KEY.replace("\\n", "\n"),
-            )
-            access_token = integration.get_access_token(installation_id).token
-            return Github(access_token)
+            access_token = await token_manager.get_installation_token(installation_id)
+            return {"Authorization": f"Bearer {access_token}"}
         except Exception as e:
-            logger.error(f"Failed to authenticate GitHub App: {str(e)}")
+            logger.error("Failed to authenticate GitHub App: %s", e)
             raise HTTPException(status_code=500, detail="GitHub authentication failed")
 
-    async def get_github_client(self):
+    @staticmethod
+    def _buckets(method: str, key) -> list:
+        """The rate-limit buckets a request to an installation draws from."""
+        buckets = [
+            (
+                rate_limiter.bucket(
+                    f"github:{key}",
+                    config.GH_RATE_LIMIT_PER_HOUR,
+                    config.GH_RATE_LIMIT_PER_HOUR / 3600,
+                ),
+                1,
+            )
+        ]
+        if method != "GET":
+            buckets.append(
+                (
+                    rate_limiter.bucket(
+                        f"github-write:{key}",
+                        config.GH_WRITE_BURST,
+                        config.GH_WRITES_PER_MINUTE / 60,
+                    ),
+                    1,
+                )
+            )
+        return buckets
+
+    @staticmethod
+    def _token_rejected(
+        response: httpx.Response, installation_id: Optional[int]
+    ) -> bool:
+        """Drop the installation token if GitHub answered 401, so a retry mints anew.
+
+        Tokens can be revoked before they expire, e.g. when the app's
+        permissions change. PATs are not retried.
         """
-        Get the GitHub client based on the authentication method.
+        if response.status_code != 401 or config.GH_APP_AUTH_METHOD != "APP":
+            return False
+        logger.warning(
+            "GitHub rejected the token for installation %s; minting a new one",
+            installation_id,
+        )
+        token_manager.invalidate(installation_id)
+        return True
+
+    @staticmethod
+    def _raise_for_status(response: httpx.Response):
+        """Raise on an error status, as `RateLimited` if GitHub throttled us."""
+        try:
+            response.raise_for_status()
+        except httpx.HTTPStatusError as e:
+            throttled, retry_after = github_throttle(response)
+            if throttled:
+                raise RateLimited(e, retry_after)
+            raise
+
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        installation_id: Optional[int] = None,
+        headers: Optional[dict] = None,
+        priority: Optional[int] = None,
+        **kwargs,
+    ) -> httpx.Response:
+        """Send a request through the shared connection pool and raise on errors.
+
+        Requests are paced by the installation's rate-limit buckets. Writes
+        default to high priority, since they publish work that is already done.
+        Reads are conditional on the cached ETag / Last-Modified, and a 304 is
+        answered from the cache.
         """
-        if config.GH_APP_AUTH_METHOD == "APP":
-            return await self.get_github_client_using_app()
-        else:
-            return await self.get_github_client_using_pat()
+        key = installation_id or "default"
+        buckets = self._buckets(method, key)
+        if priority is None:
+            priority = Priority.NORMAL if method == "GET" else Priority.HIGH
+
+        headers = dict(headers or {})
+        cache_key = cached = None
+        if method == "GET" and self.cache.enabled:
+            cache_key = self.cache.make_key(
+                str(key), path, kwargs.get("params"), headers.get("Accept", "")
+            )
+            cached = await self.cache.get(cache_key)
+            if cached is not None:
+                headers.update(self.cache.validators(cached))
+
+        endpoint = endpoint_template(path)
 
-    async def get_repo(self, repo_full_name: str):
+        async def send(retry_unauthorized: bool = True) -> httpx.Response:
+            auth_headers = await self.get_auth_headers(installation_id)
+            response = await github_http.client.request(
+                method, path, headers={**auth_headers, **headers}, **kwargs
+            )
+            github_requests.inc(method, endpoint, str(response.status_code))
+            observe_github_rate_limit(buckets[0][0], response)
+            if retry_unauthorized and self._token_rejected(response, installation_id):
+                return await send(retry_unauthorized=False)
+            if cached is not None and response.status_code == 304:
+                return self.cache.serve(cached, response)
+            self._raise_for_status(response)
+            if cache_key is not None:
+                await self.cache.set(cache_key, response)
+            return response
+
+        return await rate_limiter.submit(send, buckets, priority)
+
+    async def _get_diff(
+        self, path: str, installation_id: Optional[int] = None
+    ) -> ParsedDiff:
+        """Stream a diff into a `DiffParser` instead of buffering the whole body.
+
+        The download stops early once the parser's byte cap is reached. Diffs
+        bypass the HTTP cache, which would have to keep the full text.
+        """
+        buckets = self._buckets("GET", installation_id or "default")
+        endpoint = endpoint_template(path)
+
+        async def send(retry_unauthorized: bool = True) -> ParsedDiff:
+            auth_headers = await self.get_auth_headers(installation_id)
+            # A fresh parser per attempt, so a retried download starts over
+            parser = DiffParser()
+            async with github_http.client.stream(
+                "GET", path, headers={**auth_headers, "Accept": DIFF_MEDIA_TYPE}
+            ) as response:
+                github_requests.inc("GET", endpoint, str(response.status_code))
+                observe_github_rate_limit(buckets[0][0], response)
+                if response.is_error:
+                    await response.aread()
+                    if retry_unauthorized and self._token_rejected(
+                        response, installation_id
+                    ):
+                        return await send(retry_unauthorized=False)
+                    self._raise_for_status(response)
+                async for chunk in response.aiter_bytes():
+                    if not parser.feed(chunk):
+                        break
+            return parser.close()
+
+        return await rate_limiter.submit(send, buckets, Priority.NORMAL)
+
+    @instrument("github_get_repo")
+    async def get_repo(
+        self, repo_full_name: str, installation_id: Optional[int] = None
+    ) -> dict:
         """Fetch repository details."""
         try:
-            github = await self.get_github_client()
-            repo = github.get_repo(repo_full_name)
-            logger.info(f"Fetched repository details: {repo_full_name}")
-            return repo
+            response = await self._request(
+                "GET", f"/repos/{repo_full_name}", installation_id
+            )
+            logger.info("Fetched repository details: %s", repo_full_name)
+            return response.json()
         except Exception as e:
-            logger.error(f"Error fetching repository {repo_full_name}: {str(e)}")
+            logger.error("Error fetching repository %s: %s", repo_full_name, e)
             raise HTTPException(status_code=404, detail="Repository not found")
 
-    async def get_pr_details(self, repo_full_name: str, pr_number: int):
+    @instrument("github_get_pr_details")
+    async def get_pr_details(
+        self, repo_full_name: str, pr_number: int, installation_id: Optional[int] = None
+    ) -> dict:
         """Fetch Pull Request details."""
         try:
-            github = await self.get_github_client()
-            repo = github.get_repo(repo_full_name)
-            pr = repo.get_pull(pr_number)
-            logger.info(f"Fetched PR #{pr_number} from {repo_full_name}")
-            return pr
+            response = await self._request(
+                "GET", f"/repos/{repo_full_name}/pulls/{pr_number}", installation_id
+            )
+            logger.info("Fetched PR #%s from %s", pr_number, repo_full_name)
+            return response.json()
         except Exception as e:
             logger.error(
-                f"Error fetching PR #{pr_number} from {repo_full_name}: {str(e)}"
+                "Error fetching PR #%s from %s: %s", pr_number, repo_full_name, e
             )
             raise HTTPException(status_code=404, detail="Pull request not found")
 
-    async def get_pr_diff(self, repo_full_name: str, pr_number: int):
-        """Fetch the diff of a pull request."""
-        url = f"https://api.github.com/repos/{repo_full_name}/pulls/{pr_number}"
-        headers = {**self.auth_headers, "Accept": "application/vnd.github.v3.diff"}
-
+    @instrument("github_get_pr_diff")
+    async def get_pr_diff(
+        self, repo_full_name: str, pr_number: int, installation_id: Optional[int] = None
+    ) -> ParsedDiff:
+        """Fetch and parse the diff of a pull request."""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(url, headers=headers)
-                response.raise_for_status()
-                logger.info(f"Fetched diff for PR #{pr_number} from {repo_full_name}")
-                return response.text
+            diff = await self._get_diff(
+                f"/repos/{repo_full_name}/pulls/{pr_number}", installation_id
+            )
+            logger.info(
+                "Fetched diff for PR #%s from %s (%s bytes%s)",
+                pr_number,
+                repo_full_name,
+                diff.bytes,
+                ", truncated" if diff.truncated else "",
+            )
+            return diff
         except httpx.HTTPStatusError as e:
             logger.error(
-                f"HTTP error while fetching PR diff: {e.response.status_code} - {e.response.text}"
+                "HTTP error while fetching PR diff: %s - %s",
+                e.response.status_code,
+                e.response.text,
             )
             raise HTTPException(
                 status_code=e.response.status_code, detail="Failed to fetch PR diff"
             )
         except Exception as e:
-            logger.error(f"Unexpected error fetching PR diff: {str(e)}")
+            logger.error("Unexpected error fetching PR diff: %s", e)
             raise HTTPException(status_code=500, detail="Error fetching PR diff")
 
+    @instrument("github_get_compare_diff")
+    async def get_compare_diff(
+        self,
+        repo_full_name: str,
+        base: str,
+        head: str,
+        installation_id: Optional[int] = None,
+    ) -> ParsedDiff:
+        """Fetch and parse the diff between two commits."""
+        try:
+            diff = await self._get_diff(
+                f"/repos/{repo_full_name}/compare/{base}...{head}", installation_id
+            )
+            logger.info(
+                "Fetched compare diff %s...%s from %s (%s bytes%s)",
+                base[:7],
+                head[:7],
+                repo_full_name,
+                diff.bytes,
+                ", truncated" if diff.truncated else "",
+            )
+            return diff
+        except httpx.HTTPStatusError as e:
+            logger.error(
+                "HTTP error while fetching compare diff: %s - %s",
+                e.response.status_code,
+                e.response.text,
+            )
+            raise HTTPException(
+                status_code=e.response.status_code,
+                detail="Failed to fetch compare diff",
+            )
+        except Exception as e:
+            logger.error("Unexpected error fetching compare diff: %s", e)
+            raise HTTPException(status_code=500, detail="Error fetching compare diff")
+
+    @instrument("github_get_file_content")
+    async def get_file_content(
+        self,
+        repo_full_name: str,
+        path: str,
+        ref: Optional[str] = None,
+        installation_id: Optional[int] = None,
+    ) -> Optional[str]:
+        """Fetch a file's raw content at `ref`; None if it does not exist."""
+        try:
+            response = await self._request(
+                "GET",
+                f"/repos/{repo_full_name}/contents/{path}",
+                installation_id,
+                headers={"Accept": "application/vnd.github.raw"},
+                params={"ref": ref} if ref else None,
+            )
+            return response.text
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
+                return None
+            logger.error(
+                "HTTP error while fetching %s: %s - %s",
+                path,
+                e.response.status_code,
+                e.response.text,
+            )
+            raise HTTPException(
+                status_code=e.response.status_code, detail="Failed to fetch file"
+            )
+        except Exception as e:
+            logger.error("Unexpected error fetching %s: %s", path, e)
+            raise HTTPException(status_code=500, detail="Error fetching file")
+
+    @instrument("github_update_pr_description")
     async def update_pr_description(
-        self, repo_full_name: str, pr_number: int, description: str
+        self,
+        repo_full_name: str,
+        pr_number: int,
+        description: str,
+        installation_id: Optional[int] = None,
     ):
         """Update the pull request description."""
         try:
-            github = await self.get_github_client()
-            repo = github.get_repo(repo_full_name)
-            pr = repo.get_pull(pr_number)
-            pr.edit(body=description)
-            logger.info(f"Updated PR #{pr_number} description in {repo_full_name}")
-            return {"message": "PR description updated", "url": pr.html_url}
+            response = await self._request(
+                "PATCH",
+                f"/repos/{repo_full_name}/pulls/{pr_number}",
+                installation_id,
+                json={"body": description},
+            )
+            logger.info("Updated PR #%s description in %s", pr_number, repo_full_name)
+            return {
+                "message": "PR description updated",
+                "url": response.json()["html_url"],
+            }
         except Exception as e:
-            logger.error(f"Error updating PR description: {str(e)}")
+            logger.error("Error updating PR description: %s", e)
             raise HTTPException(
                 status_code=400, detail="Failed to update PR description"
             )
 
-    async def add_pr_comment(self, repo_full_name: str, pr_number: int, comment: str):
+    @instrument("github_add_pr_comment")
+    async def add_pr_comment(
+        self,
+        repo_full_name: str,
+        pr_number: int,
+        comment: str,
+        installation_id: Optional[int] = None,
+    ):
         """Add a review comment to the PR."""
         try:
-            github = await self.get_github_client()
-            repo = github.get_repo(repo_full_name)
-            issue = repo.get_issue(pr_number)
-            issue.create_comment(comment)
-            logger.info(f"Added comment to PR #{pr_number} in {repo_full_name}")
-            return {"message": "Comment added", "url": issue.html_url}
+            response = await self._request(
+                "POST",
+                f"/repos/{repo_full_name}/issues/{pr_number}/comments",
+                installation_id,
+                json={"body": comment},
+            )
+            logger.info("Added comment to PR #%s in %s", pr_number, repo_full_name)
+            comment = response.json()
+            return {
+                "message": "Comment added",
+                "id": comment["id"],
+                "url": comment["html_url"],
+            }
         except Exception as e:
-            logger.error(f"Error adding PR comment: {str(e)}")
+            logger.error("Error adding PR comment: %s", e)
             raise HTTPException(status_code=400, detail="Failed to add comment to PR")
 
-    async def add_inline_suggestion(
+    @instrument("github_update_pr_comment")
+    async def update_pr_comment(
         self,
         repo_full_name: str,
-        pr_number: int,
-        file_path: str,
-        line: int,
-        suggestion: str,
+        comment_id: int,
+        comment: str,
+        installation_id: Optional[int] = None,
     ):
-        """Add an inline suggestion to a PR."""
+        """Edit an existing PR (issue) comment."""
         try:
-            github = await self.get_github_client()
-            repo = github.get_repo(repo_full_name)
-            pr = repo.get_pull(pr_number)
-            commit = pr.get_commits().reversed[0]
-            pr.create_review_comment(
-                body=suggestion,
-                commit=commit,
-                path=file_path,
-                start_side="RIGHT",
-                line=line,
-                side="RIGHT",
+            response = await self._request(
+                "PATCH",
+                f"/repos/{repo_full_name}/issues/comments/{comment_id}",
+                installation_id,
+                json={"body": comment},
             )
-            logger.info(
-                f"Added inline suggestion to {file_path}:{line} in PR #{pr_number}"
+            logger.info("Updated comment %s in %s", comment_id, repo_full_name)
+            return {
+                "message": "Comment updated",
+                "id": comment_id,
+                "url": response.json()["html_url"],
+            }
+        except httpx.HTTPStatusError as e:
+            logger.error(
+                "HTTP error while updating comment %s: %s",
+                comment_id,
+                e.response.status_code,
+            )
+            raise HTTPException(
+                status_code=e.response.status_code, detail="Failed to update comment"
             )
-            return {"message": "Inline suggestion added", "url": pr.html_url}
         except Exception as e:
-            logger.error(f"Error adding inline suggestion: {str(e)}")
+            logger.error("Error updating PR comment: %s", e)
+            raise HTTPException(status_code=400, detail="Failed to update comment")
+
+    @instrument("github_list_pr_comments")
+    async def list_pr_comments(
+        self,
+        repo_full_name: str,
+        pr_number: int,
+        installation_id: Optional[int] = None,
+        page: int = 1,
+        per_page: int = 100,
+    ) -> List[dict]:
+        """Fetch one page of the PR's (issue) comments, oldest first."""
+        try:
+            response = await self._request(
+                "GET",
+                f"/repos/{repo_full_name}/issues/{pr_number}/comments",
+                installation_id,
+                params={"page": page, "per_page": per_page},
+            )
+            return response.json()
+        except Exception as e:
+            logger.error("Error listing comments of PR #%s: %s", pr_number, e)
+            raise HTTPException(status_code=400, detail="Failed to list PR comments")
+
+    @instrument("github_create_review")
+    async def create_review(
+        self,
+        repo_full_name: str,
+        pr_number: int,
+        commit_id: str,
+        comments: List[dict],
+        body: str,
+        installation_id: Optional[int] = None,
+    ) -> dict:
+        """Create one PR review with the given inline comments attached."""
+        try:
+            response = await self._request(
+                "POST",
+                f"/repos/{repo_full_name}/pulls/{pr_number}/reviews",
+                installation_id,
+                json={
+                    "commit_id": commit_id,
+                    "event": "COMMENT",
+                    "body": body,
+                    "comments": comments,
+                },
+            )
+            logger.info(
+                "Created review with %s comments on PR #%s", len(comments), pr_number
+            )
+            return response.json()
+        except httpx.HTTPStatusError as e:
+            logger.error(
+                "HTTP error while creating PR review: %s - %s",
+                e.response.status_code,
+                e.response.text,
+            )
             raise HTTPException(
-                status_code=400, detail="Failed to add inline suggestion"
+                status_code=e.response.status_code,
+                detail=f"Failed to create PR review: {e.response.text}",
             )
+        except Exception as e:
+            logger.error("Unexpected error creating PR review: %s", e)
+            raise HTTPException(status_code=500, detail="Error creating PR review")
+
+    @instrument("github_add_review_comments")
+    async def add_review_comments(
+        self,
+        repo_full_name: str,
+        pr_number: int,
+        commit_id: str,
+        comments: List[dict],
+        installation_id: Optional[int] = None,
+    ) -> dict:
+        """Post inline comments as few reviews as GitHub's limits allow.
+
+        Comments go out in reviews of at most REVIEW_MAX_COMMENTS. A review
+        GitHub rejects with 422 (usually a line outside the diff) is bisected
+        so the valid comments still land and only the bad ones are reported.
+        """
+        size = max(1, config.REVIEW_MAX_COMMENTS)
+        batches = [comments[i : i + size] for i in range(0, len(comments), size)]
+        result = {"reviews": [], "posted": 0, "failed": []}
+
+        async def post(batch: List[dict], part: str):
+            try:
+                review = await self.create_review(
+                    repo_full_name,
+                    pr_number,
+                    commit_id,
+                    batch,
+                    f"PR Buddy inline suggestions{part}",
+                    installation_id,
+                )
+                result["reviews"].append(review.get("html_url"))
+                result["posted"] += len(batch)
+            except HTTPException as e:
+                if e.status_code == 422 and len(batch) > 1:
+                    middle = len(batch) // 2
+                    await post(batch[:middle], part)
+                    await post(batch[middle:], part)
+                    return
+                for comment in batch:
+                    result["failed"].append(
+                        {
+                            "path": comment["path"],
+                            "line": comment["line"],
+                            "error": e.detail,
+                        }
+                    )
+
+        # Sequential on purpose: GitHub throttles concurrent content creation
+        for n, batch in enumerate(batches, start=1):
+            part = f" ({n}/{len(batches)})" if len(batches) > 1 else ""
+            await post(batch, part)
+        return result
 
 
 # Instantiate the client
@@ -0,0 +1,110 @@
+import hashlib
+from typing import Optional
+import httpx
+from app.core.config import config
+from app.core.log import get_logger
+from app.services.cache_store import create_store
+
+logger = get_logger("HTTPCache")
+
+
+class HTTPCache:
+    """ETag / Last-Modified cache for conditional GETs.
+
+    Cached bodies are revalidated on every read; GitHub answers unchanged
+    resources with a `304 Not Modified` that does not count against the
+    primary rate limit, so each hit is one request of quota saved.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+        self.saved_bytes = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.store is not None
+
+    @staticmethod
+    def make_key(scope: str, url: str, params=None, accept: str = "") -> str:
+        """Key a read by credentials scope, URL, query and representation."""
+        digest = hashlib.sha256()
+        for part in (scope, url, str(sorted((params or {}).items())), accept):
+            digest.update(part.encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    async def get(self, key: str) -> Optional[dict]:
+        if not self.enabled:
+            return None
+        return await self.store.get(key)
+
+    @staticmethod
+    def validators(entry: dict) -> dict:
+        """Request headers that make the read conditional on the cached version."""
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    async def set(self, key: str, response: httpx.Response):
+        """Remember a successful read if GitHub sent validators for it."""
+        if not self.enabled or response.status_code != 200:
+            return
+        etag = response.headers.get("etag")
+        last_modified = response.headers.get("last-modified")
+        if not etag and not last_modified:
+            return
+        self.misses += 1
+        await self.store.set(
+            key,
+            {
+                "etag": etag,
+                "last_modified": last_modified,
+                "content_type": response.headers.get("content-type", ""),
+                "body": response.text,
+            },
+        )
+
+    def serve(self, entry: dict, not_modified: httpx.Response) -> httpx.Response:
+        """Turn a 304 into the cached 200 response."""
+        self.hits += 1
+        body = entry["body"].encode()
+        self.saved_bytes += len(body)
+        headers = {
+            key: value
+            for key, value in (
+                ("content-type", entry["content_type"]),
+                ("etag", entry["etag"]),
+                ("last-modified", entry["last_modified"]),
+            )
+            if value
+        }
+        return httpx.Response(
+            200, headers=headers, content=body, request=not_modified.request
+        )
+
+    async def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            # 304s are free, so every hit is one request of rate limit saved
+            "saved_requests": self.hits,
+            "saved_bytes": self.saved_bytes,
+            "entries": await self.store.size() if self.enabled else 0,
+        }
+
+
+def create_http_cache() -> HTTPCache:
+    return HTTPCache(
+        create_store(
+            config.GH_CACHE_BACKEND,
+            "github_http_cache",
+            config.GH_CACHE_MAX_ENTRIES,
+            config.GH_CACHE_TTL_SECONDS,
+        )
+    )
@@ -0,0 +1,72 @@
+from typing import Optional
+import httpx
+from app.core.config import config
+from app.core.log import get_logger
+
+logger = get_logger("HTTPClient")
+
+
+def http2_available() -> bool:
+    """HTTP/2 needs the optional `h2` package."""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class SharedAsyncClient:
+    """A long-lived `httpx.AsyncClient` with keep-alive pooling, shared by all callers.
+
+    The client is opened on `start()` (or lazily on first use) and closed on
+    `aclose()`, both driven by the FastAPI lifespan.
+    """
+
+    def __init__(self, name: str, base_url: str = "", headers: Optional[dict] = None):
+        self.name = name
+        self.base_url = base_url
+        self.headers = headers or {}
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def start(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            http2 = config.HTTP2_ENABLED and http2_available()
+            if config.HTTP2_ENABLED and not http2:
+                logger.warning(
+                    "'h2' is not installed, %s client falls back to HTTP/1.1", self.name
+                )
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=self.headers,
+                http2=http2,
+                timeout=config.HTTP_TIMEOUT_SECONDS,
+                limits=httpx.Limits(
+                    max_connections=config.HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=config.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=config.HTTP_KEEPALIVE_EXPIRY_SECONDS,
+                ),
+            )
+            logger.info("Opened shared %s HTTP client (http2=%s)", self.name, http2)
+        return self._client
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        return self.start()
+
+    async def aclose(self):
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+            logger.info("Closed shared %s HTTP client", self.name)
+        self._client = None
+
+
+# Shared connection pools
+github_http = SharedAsyncClient(
+    "GitHub",
+    base_url=config.GH_API_URL,
+    headers={
+        "Accept": "application/vnd.github+json",
+        "X-GitHub-Api-Version": "2022-11-28",
+    },
+)
+openai_http = SharedAsyncClient("OpenAI")
@@ -1,10 +1,13 @@
 import jwt
 import time
-import httpx
+from datetime import datetime
 from app.core.config import config
+from app.services.http_client import github_http
 
 
 class InstallationToken:
+    JWT_TTL_SECONDS = 10 * 60
+
     def __init__(self):
         # self.PRIVATE_KEY_PATH = config.GITHUB_APP_PRIVATE_KEY_PATH
         self.APP_ID = config.GH_APP_ID
@@ -16,42 +19,52 @@ class InstallationToken:
         now = int(time.time())
         payload = {
             "iat": now,  # Issued at
-            "exp": now + (10 * 60),  # Expiry (10 minutes)
+            "exp": now + self.JWT_TTL_SECONDS,  # Expiry (10 minutes)
             "iss": self.APP_ID,  # GitHub App ID
         }
         encoded_jwt = jwt.encode(payload, self.PRIVATE_KEY, algorithm="RS256")
         return encoded_jwt
 
     @staticmethod
-    def get_installation_id(jwt_token):
+    async def get_installation_id(jwt_token):
         headers = {
             "Authorization": f"Bearer {jwt_token}",
             "Accept": "application/vnd.github+json",
         }
-        response = httpx.get(
-            "https://api.github.com/app/installations", headers=headers
-        )
+        response = await github_http.client.get("/app/installations", headers=headers)
         response.raise_for_status()
         installations = response.json()
         return installations[0]["id"]  # Assuming first installation
 
     @staticmethod
-    def get_installation_token(installation_id, jwt_token):
+    async def get_installation_token(installation_id, jwt_token):
         headers = {
             "Authorization": f"Bearer {jwt_token}",
             "Accept": "application/vnd.github+json",
         }
-        url = (
-            f"https://api.github.com/app/installations/{installation_id}/access_tokens"
-        )
-        response = httpx.post(url, headers=headers)
+        url = f"/app/installations/{installation_id}/access_tokens"
+        response = await github_http.client.post(url, headers=headers)
         response.raise_for_status()
-        return {"token": response.json()["token"]}
+        data = response.json()
+        return {
+            "token": data["token"],
+            "expires_at": InstallationToken.parse_expires_at(data.get("expires_at")),
+        }
 
-    def get_installation_token_main(self):
+    @staticmethod
+    def parse_expires_at(expires_at):
+        """Convert GitHub's ISO-8601 `expires_at` into a unix timestamp."""
+        if not expires_at:
+            # Installation tokens are documented to live for one hour
+            return time.time() + 60 * 60
+        return datetime.fromisoformat(expires_at.replace("Z", "+00:00")).timestamp()
+
+    async def get_installation_token_main(self):
         jwt_token = self.generate_jwt()
-        installation_id = self.get_installation_id(jwt_token)
-        installation_token = self.get_installation_token(installation_id, jwt_token)
+        installation_id = await self.get_installation_id(jwt_token)
+        installation_token = await self.get_installation_token(
+            installation_id, jwt_token
+        )
         return installation_token
 
 
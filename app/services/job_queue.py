@@ -0,0 +1,896 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Dict, List, Optional
+from app.core.config import config
+from app.core.log import get_logger, get_trace_id, reset_trace_id, set_trace_id
+from app.services.job_scheduler import FairScheduler, JobSchedule
+from app.services.metrics import job_duration
+
+logger = get_logger("JobQueue")
+
+
+class JobType:
+    """Kinds of background work the queue knows how to run."""
+
+    PULL_REQUEST = "pull_request"
+
+
+class JobStatus:
+    """Lifecycle states of a job."""
+
+    SCHEDULED = "scheduled"
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    SUPERSEDED = "superseded"
+    DEAD_LETTERED = "dead_lettered"
+
+
+PENDING_STATUSES = (JobStatus.SCHEDULED, JobStatus.QUEUED, JobStatus.RUNNING)
+FINISHED_STATUSES = (
+    JobStatus.SUCCEEDED,
+    JobStatus.FAILED,
+    JobStatus.SUPERSEDED,
+    JobStatus.DEAD_LETTERED,
+)
+
+
+# Every job column but the payload, for lookups that do not run the job
+SUMMARY_COLUMNS = (
+    "id, type, coalesce_key, version, status, attempts, result, error, "
+    "superseded_by, created_at, started_at, finished_at, installation, repo, cost, "
+    "trace_id"
+)
+
+
+class QueueFullError(Exception):
+    """Raised when the queue cannot accept more jobs."""
+
+
+class Job:
+    """A unit of background work created from a webhook delivery.
+
+    The job's log lines carry `trace_id`, by default the trace of the request
+    that created it.
+    """
+
+    def __init__(
+        self,
+        job_type: str,
+        payload: dict,
+        coalesce_key: Optional[str] = None,
+        version: Optional[str] = None,
+        schedule: Optional[JobSchedule] = None,
+        trace_id: Optional[str] = None,
+    ):
+        self.id = uuid.uuid4().hex
+        self.trace_id = trace_id or get_trace_id() or self.id
+        self.type = job_type
+        self.payload = payload
+        self.coalesce_key = coalesce_key
+        self.version = version
+        self.schedule = schedule or JobSchedule()
+        self.status = JobStatus.QUEUED
+        self.attempts = 0
+        self.result = None
+        self.error = None
+        self.superseded_by = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._task: Optional[asyncio.Task] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # Set when a durable job's lease was lost to a newer job or another worker
+        self._lost = False
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def to_dict(self) -> dict:
+        """Public view of the job, without the raw webhook payload."""
+        return {
+            "id": self.id,
+            "trace_id": self.trace_id,
+            "type": self.type,
+            "status": self.status,
+            "attempts": self.attempts,
+            "schedule": self.schedule.to_dict(),
+            "result": self.result,
+            "error": self.error,
+            "superseded_by": self.superseded_by,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+JobHandler = Callable[[dict], Awaitable[dict]]
+
+
+class JobQueue:
+    """In-process queue drained by a fixed pool of async workers.
+
+    Jobs sharing a `coalesce_key` (e.g. one PR) are coalesced: a job with a
+    newer `version` supersedes the pending one and cancels the running one, and
+    an optional `delay` debounces bursts into a single run after a quiet window.
+    Free workers take the job chosen by the `FairScheduler`.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = config.WORKER_CONCURRENCY,
+        maxsize: int = config.JOB_QUEUE_MAXSIZE,
+        history_size: int = config.JOB_HISTORY_SIZE,
+        scheduler: Optional[FairScheduler] = None,
+    ):
+        self.concurrency = max(1, concurrency)
+        self.maxsize = maxsize
+        self.history_size = history_size
+        self.scheduler = scheduler or FairScheduler()
+        self.handlers: Dict[str, JobHandler] = {}
+        self._ready: List[Job] = []
+        self._running: Dict[str, Job] = {}
+        # Set whenever a job becomes ready or a running one finishes
+        self._wakeup: Optional[asyncio.Event] = None
+        self._workers = []
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        # Latest unfinished job per coalesce key
+        self._latest: Dict[str, Job] = {}
+
+    def register(self, job_type: str, handler: JobHandler):
+        """Register the coroutine that processes jobs of the given type."""
+        self.handlers[job_type] = handler
+
+    async def start(self):
+        """Spawn the worker pool. Must be called from the running event loop."""
+        if self._workers:
+            return
+        self._wakeup = asyncio.Event()
+        self._workers = [
+            asyncio.create_task(self._worker(n), name=f"job-worker-{n}")
+            for n in range(self.concurrency)
+        ]
+        logger.info("Job queue started with %s workers", self.concurrency)
+
+    async def stop(self, timeout: float = config.JOB_SHUTDOWN_TIMEOUT_SECONDS):
+        """Let queued jobs drain for up to `timeout` seconds, then cancel workers."""
+        if not self._workers:
+            return
+        # Debounced jobs are released right away instead of being dropped
+        for job in list(self._latest.values()):
+            if job.status == JobStatus.SCHEDULED:
+                job._timer.cancel()
+                self._release(job)
+        deadline = time.monotonic() + timeout
+        while self._ready or self._running:
+            if time.monotonic() >= deadline:
+                logger.warning(
+                    "Job queue did not drain within %ss, %s jobs left",
+                    timeout,
+                    len(self._ready) + len(self._running),
+                )
+                break
+            await asyncio.sleep(0.1)
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        logger.info("Job queue stopped")
+
+    async def enqueue(
+        self,
+        job_type: str,
+        payload: dict,
+        coalesce_key: Optional[str] = None,
+        version: Optional[str] = None,
+        delay: float = 0,
+        schedule: Optional[JobSchedule] = None,
+    ) -> Job:
+        """Queue a job and return it immediately.
+
+        With a `coalesce_key`, a job for the same key and version that is still
+        pending or running is returned instead of creating a duplicate; one for
+        an older version is superseded. A positive `delay` holds the job back
+        until no newer job for the key has arrived for that many seconds.
+        `schedule` tells the scheduler who the job is for and what it costs.
+        """
+        if job_type not in self.handlers:
+            raise ValueError(f"No handler registered for job type '{job_type}'")
+        if self._wakeup is None:
+            raise RuntimeError("Job queue is not running")
+
+        previous = self._latest.get(coalesce_key) if coalesce_key else None
+        if previous is not None and previous.version == version:
+            logger.info(
+                "Job %s already covers %s@%s", previous.id, coalesce_key, version
+            )
+            return previous
+
+        job = Job(job_type, payload, coalesce_key, version, schedule)
+        # A superseded job gives up its place in the queue
+        depth = len(self._ready) - (previous in self._ready)
+        if delay > 0:
+            job.status = JobStatus.SCHEDULED
+            job._timer = asyncio.get_running_loop().call_later(
+                delay, self._release, job
+            )
+        elif self.maxsize and depth >= self.maxsize:
+            raise QueueFullError("Job queue is full")
+        else:
+            self._ready.append(job)
+            self._wakeup.set()
+
+        if previous is not None:
+            self._supersede(previous, job)
+        if coalesce_key:
+            self._latest[coalesce_key] = job
+        self._remember(job)
+        logger.info(
+            "Enqueued job %s (%s), depth=%s", job.id, job_type, len(self._ready)
+        )
+        return job
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    async def latest(self, coalesce_key: str) -> Optional[Job]:
+        """The unfinished job currently holding the coalesce key, if any."""
+        return self._latest.get(coalesce_key)
+
+    async def dead_letters(self, limit: int = 100) -> List[Job]:
+        """In-process jobs are not retried, so none are ever dead-lettered."""
+        return []
+
+    async def retry(self, job_id: str) -> Optional[Job]:
+        """Only the durable queue can retry jobs."""
+        return None
+
+    async def depth(self) -> int:
+        """Jobs that are ready to run and waiting for a worker."""
+        return len(self._ready)
+
+    def _release(self, job: Job):
+        """Move a debounced job into the queue once its quiet window has passed."""
+        if job.status != JobStatus.SCHEDULED:
+            return
+        job.status = JobStatus.QUEUED
+        if not self.maxsize or len(self._ready) < self.maxsize:
+            self._ready.append(job)
+            self._wakeup.set()
+        else:
+            job.status = JobStatus.FAILED
+            job.error = "Job queue is full"
+            job.finished_at = time.time()
+            self._forget(job)
+            logger.error("Dropping debounced job %s: queue is full", job.id)
+
+    def _supersede(self, job: Job, newer: Job):
+        """Mark a job as replaced by a newer one and stop any work it is doing."""
+        if job.is_finished:
+            return
+        was_running = job.status == JobStatus.RUNNING
+        job.status = JobStatus.SUPERSEDED
+        job.superseded_by = newer.id
+        job.finished_at = time.time()
+        if job._timer is not None:
+            job._timer.cancel()
+        if job in self._ready:
+            self._ready.remove(job)
+        if job._task is not None:
+            # Cancellation propagates into the in-flight LLM and GitHub calls
+            job._task.cancel()
+        logger.info(
+            "Job %s superseded by %s%s",
+            job.id,
+            newer.id,
+            " (cancelled in flight)" if was_running else "",
+        )
+
+    def _forget(self, job: Job):
+        if job.coalesce_key and self._latest.get(job.coalesce_key) is job:
+            del self._latest[job.coalesce_key]
+
+    def _remember(self, job: Job):
+        """Track the job, evicting the oldest finished jobs beyond the history size."""
+        self._jobs[job.id] = job
+        if len(self._jobs) <= self.history_size:
+            return
+        for job_id in list(self._jobs):
+            if len(self._jobs) <= self.history_size:
+                break
+            if self._jobs[job_id].is_finished:
+                del self._jobs[job_id]
+
+    def _next(self) -> Optional[Job]:
+        job = self.scheduler.pick(
+            self._ready, (running.schedule for running in self._running.values())
+        )
+        if job is not None:
+            self._ready.remove(job)
+        return job
+
+    async def _worker(self, n: int):
+        while True:
+            job = self._next()
+            if job is None:
+                # Nothing ready, or every ready job's repo is at its cap
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            await self._run(job)
+
+    async def _run(self, job: Job):
+        # The handler's task inherits the trace, and so does everything it starts
+        trace = set_trace_id(job.trace_id)
+        job.status = JobStatus.RUNNING
+        job.attempts += 1
+        job.started_at = time.time()
+        self._running[job.id] = job
+        job._task = asyncio.create_task(self.handlers[job.type](job.payload))
+        try:
+            job.result = await job._task
+            job.status = JobStatus.SUCCEEDED
+        except asyncio.CancelledError:
+            if job.status != JobStatus.SUPERSEDED:
+                # The worker itself is being cancelled
+                raise
+        except Exception as e:
+            job.error = getattr(e, "detail", None) or str(e)
+            job.status = JobStatus.FAILED
+            logger.error("Job %s failed: %s", job.id, job.error)
+        finally:
+            job._task = None
+            job.finished_at = time.time()
+            del self._running[job.id]
+            self._wakeup.set()
+            self._forget(job)
+            job_duration.observe(job.finished_at - job.created_at, job.type, job.status)
+            logger.info(
+                "Job %s %s in %ss",
+                job.id,
+                job.status,
+                round(job.finished_at - job.started_at, 2),
+            )
+            reset_trace_id(trace)
+
+
+class SQLiteJobQueue:
+    """Job queue persisted in SQLite, shared by every process on the host.
+
+    A webhook is committed to the job table before it is acknowledged, so a
+    restart or crash never loses it. Workers in any process claim jobs with a
+    lease and renew it while the job runs. If a worker dies, its job becomes
+    claimable again once the lease expires. Failed jobs are retried with
+    exponential backoff, up to `max_attempts` runs in total, and then
+    dead-lettered. Coalescing works as in `JobQueue`, across processes: a
+    running job that gets superseded notices on its next lease renewal and is
+    cancelled.
+
+    With `concurrency` 0 the process only enqueues, e.g. a web process whose
+    jobs are run by separate worker processes.
+    """
+
+    # Prune finished jobs beyond the history size every N finishes
+    PRUNE_EVERY = 100
+
+    def __init__(
+        self,
+        path: str = config.SQLITE_PATH,
+        concurrency: int = config.WORKER_CONCURRENCY,
+        maxsize: int = config.JOB_QUEUE_MAXSIZE,
+        history_size: int = config.JOB_HISTORY_SIZE,
+        lease: float = config.JOB_LEASE_SECONDS,
+        max_attempts: int = config.JOB_MAX_ATTEMPTS,
+        retry_backoff: float = config.JOB_RETRY_BACKOFF_SECONDS,
+        poll_interval: float = config.JOB_POLL_INTERVAL_SECONDS,
+        scheduler: Optional[FairScheduler] = None,
+    ):
+        self.concurrency = max(0, concurrency)
+        self.maxsize = maxsize
+        self.history_size = history_size
+        self.lease = lease
+        self.max_attempts = max(1, max_attempts)
+        self.retry_backoff = retry_backoff
+        self.poll_interval = poll_interval
+        self.scheduler = scheduler or FairScheduler()
+        self.handlers: Dict[str, JobHandler] = {}
+        # Identifies this process's leases
+        self.owner = uuid.uuid4().hex
+        self._workers = []
+        self._running: Dict[str, Job] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        self._finishes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, timeout=30, check_same_thread=False, isolation_level=None
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, type TEXT NOT NULL, payload TEXT NOT NULL, "
+            "coalesce_key TEXT, version TEXT, status TEXT NOT NULL, "
+            "attempts INTEGER NOT NULL DEFAULT 0, available_at REAL NOT NULL, "
+            "lease_owner TEXT, lease_expires_at REAL, result TEXT, error TEXT, "
+            "superseded_by TEXT, created_at REAL NOT NULL, started_at REAL, "
+            "finished_at REAL, installation TEXT, repo TEXT, "
+            "cost REAL NOT NULL DEFAULT 0, trace_id TEXT)"
+        )
+        # Tables created by earlier versions lack these columns
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column, definition in (
+            ("installation", "TEXT"),
+            ("repo", "TEXT"),
+            ("cost", "REAL NOT NULL DEFAULT 0"),
+            ("trace_id", "TEXT"),
+        ):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {definition}")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, available_at)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS jobs_coalesce ON jobs (coalesce_key, status)"
+        )
+
+    def register(self, job_type: str, handler: JobHandler):
+        """Register the coroutine that processes jobs of the given type."""
+        self.handlers[job_type] = handler
+
+    async def start(self):
+        """Spawn the worker pool. Must be called from the running event loop."""
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        if self._workers or not self.concurrency:
+            return
+        self._workers = [
+            asyncio.create_task(self._worker(n), name=f"job-worker-{n}")
+            for n in range(self.concurrency)
+        ]
+        logger.info(
+            "Durable job queue started with %s workers (owner %s)",
+            self.concurrency,
+            self.owner,
+        )
+
+    async def stop(self, timeout: float = config.JOB_SHUTDOWN_TIMEOUT_SECONDS):
+        """Stop claiming jobs and let running ones finish for up to `timeout` seconds.
+
+        Jobs still running after that are cancelled and handed back to the
+        queue without using up an attempt. Queued jobs stay in the table for
+        the next worker.
+        """
+        if not self._workers:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        _, pending = await asyncio.wait(self._workers, timeout=timeout)
+        if pending:
+            logger.warning(
+                "%s jobs did not finish within %ss, handing them back to the queue",
+                len(self._running),
+                timeout,
+            )
+            for worker in pending:
+                worker.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        self._workers = []
+        logger.info("Durable job queue stopped")
+
+    async def enqueue(
+        self,
+        job_type: str,
+        payload: dict,
+        coalesce_key: Optional[str] = None,
+        version: Optional[str] = None,
+        delay: float = 0,
+        schedule: Optional[JobSchedule] = None,
+    ) -> Job:
+        """Persist a job and return it; same contract as `JobQueue.enqueue`."""
+        if job_type not in self.handlers:
+            raise ValueError(f"No handler registered for job type '{job_type}'")
+
+        job = Job(job_type, payload, coalesce_key, version, schedule)
+        if delay > 0:
+            job.status = JobStatus.SCHEDULED
+        # The insert may wait for another process's write lock
+        previous = await asyncio.to_thread(self._insert, job, delay)
+        if previous is not None and previous.version == version:
+            return previous
+        running = self._running.get(previous.id) if previous is not None else None
+        if running is not None:
+            # Running here: no need to wait for the next lease renewal
+            running._lost = True
+            running._task.cancel()
+        if self._wakeup is not None and not delay:
+            self._wakeup.set()
+        logger.info("Enqueued job %s (%s) in the job store", job.id, job_type)
+        return job
+
+    def _insert(self, job: Job, delay: float) -> Optional[Job]:
+        """Store the job and supersede the key's pending one, in one transaction.
+
+        Returns the pending job for the key; if it is for the same version,
+        nothing was stored. Coalescing comes before the size check, so a
+        duplicate is answered and an update replaces its own queue slot even
+        when the queue is full.
+        """
+        key = job.coalesce_key
+        with self._transaction():
+            previous = self._latest(key) if key else None
+            if previous is not None and previous.version == job.version:
+                logger.info(
+                    "Job %s already covers %s@%s", previous.id, key, job.version
+                )
+                return previous
+            if self.maxsize:
+                (depth,) = self._conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)",
+                    (JobStatus.SCHEDULED, JobStatus.QUEUED),
+                ).fetchone()
+                if previous is not None and previous.status != JobStatus.RUNNING:
+                    depth -= 1
+                if depth >= self.maxsize:
+                    raise QueueFullError("Job queue is full")
+            self._conn.execute(
+                "INSERT INTO jobs (id, type, payload, coalesce_key, version, "
+                "status, available_at, created_at, installation, repo, cost, "
+                "trace_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    job.id,
+                    job.type,
+                    json.dumps(job.payload),
+                    key,
+                    job.version,
+                    job.status,
+                    job.created_at + max(0.0, delay),
+                    job.created_at,
+                    job.schedule.installation,
+                    job.schedule.repo,
+                    job.schedule.cost,
+                    job.trace_id,
+                ),
+            )
+            if previous is not None:
+                # A running job is cancelled by its worker on the next renewal
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, superseded_by = ?, finished_at = ?, "
+                    "lease_owner = NULL WHERE id = ?",
+                    (JobStatus.SUPERSEDED, job.id, job.created_at, previous.id),
+                )
+                logger.info("Job %s superseded by %s", previous.id, job.id)
+        return previous
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        """The job without its payload, which status lookups do not need."""
+        return await asyncio.to_thread(self._get, job_id)
+
+    async def latest(self, coalesce_key: str) -> Optional[Job]:
+        """The unfinished job currently holding the coalesce key, if any."""
+        return await asyncio.to_thread(self._get_latest, coalesce_key)
+
+    async def dead_letters(self, limit: int = 100) -> List[Job]:
+        """The most recently dead-lettered jobs."""
+        return await asyncio.to_thread(self._dead_letters, limit)
+
+    async def retry(self, job_id: str) -> Optional[Job]:
+        """Queue a failed or dead-lettered job again with a fresh attempt count."""
+        if not await asyncio.to_thread(self._retry, job_id):
+            return None
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return await self.get(job_id)
+
+    async def depth(self) -> int:
+        """Jobs that are ready to run and waiting for a worker."""
+        return await asyncio.to_thread(self._depth)
+
+    # The blocking SQLite side of the methods above; they run in a thread
+
+    def _get_latest(self, coalesce_key: str) -> Optional[Job]:
+        with self._lock:
+            return self._latest(coalesce_key)
+
+    def _get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {SUMMARY_COLUMNS} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return self._job(row) if row else None
+
+    def _dead_letters(self, limit: int) -> List[Job]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs WHERE status = ? ORDER BY finished_at DESC "
+                "LIMIT ?",
+                (JobStatus.DEAD_LETTERED, limit),
+            ).fetchall()
+        return [self._job(row) for row in rows]
+
+    def _retry(self, job_id: str) -> bool:
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, attempts = 0, available_at = ?, "
+                "error = NULL, finished_at = NULL WHERE id = ? AND status IN (?, ?)",
+                (
+                    JobStatus.QUEUED,
+                    time.time(),
+                    job_id,
+                    JobStatus.FAILED,
+                    JobStatus.DEAD_LETTERED,
+                ),
+            )
+        return cursor.rowcount == 1
+
+    def _depth(self) -> int:
+        with self._lock:
+            (depth,) = self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN (?, ?) AND available_at <= ?",
+                (JobStatus.SCHEDULED, JobStatus.QUEUED, time.time()),
+            ).fetchone()
+        return depth
+
+    @contextmanager
+    def _transaction(self):
+        """`BEGIN IMMEDIATE` under the connection lock, so claims and enqueues
+        are atomic across processes."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _latest(self, coalesce_key: str) -> Optional[Job]:
+        row = self._conn.execute(
+            "SELECT * FROM jobs WHERE coalesce_key = ? AND status IN (?, ?, ?) "
+            "ORDER BY created_at DESC LIMIT 1",
+            (coalesce_key, *PENDING_STATUSES),
+        ).fetchone()
+        return self._job(row) if row else None
+
+    def _job(self, row: sqlite3.Row) -> Job:
+        payload = row["payload"] if "payload" in row.keys() else None
+        job = Job(
+            row["type"],
+            json.loads(payload) if payload else None,
+            schedule=JobSchedule(row["installation"], row["repo"], row["cost"]),
+            trace_id=row["trace_id"] or row["id"],
+        )
+        job.id = row["id"]
+        job.coalesce_key = row["coalesce_key"]
+        job.version = row["version"]
+        job.status = row["status"]
+        job.attempts = row["attempts"]
+        job.result = json.loads(row["result"]) if row["result"] else None
+        job.error = row["error"]
+        job.superseded_by = row["superseded_by"]
+        job.created_at = row["created_at"]
+        job.started_at = row["started_at"]
+        job.finished_at = row["finished_at"]
+        return job
+
+    def _claim(self) -> Optional[Job]:
+        """Lease a job whose worker stopped renewing, else the scheduler's pick."""
+        while True:
+            now = time.time()
+            with self._transaction():
+                row = self._conn.execute(
+                    "SELECT * FROM jobs WHERE status = ? AND lease_expires_at <= ? "
+                    "LIMIT 1",
+                    (JobStatus.RUNNING, now),
+                ).fetchone()
+                if row is not None:
+                    logger.warning(
+                        "Job %s lease expired on attempt %s", row["id"], row["attempts"]
+                    )
+                    if row["attempts"] >= self.max_attempts:
+                        self._conn.execute(
+                            "UPDATE jobs SET status = ?, error = ?, finished_at = ?, "
+                            "lease_owner = NULL WHERE id = ?",
+                            (
+                                JobStatus.DEAD_LETTERED,
+                                "Worker lease expired",
+                                now,
+                                row["id"],
+                            ),
+                        )
+                        logger.error("Job %s dead-lettered", row["id"])
+                        continue
+                else:
+                    # Running jobs of every process count towards fairness and caps
+                    ready = [
+                        self._job(ready_row)
+                        for ready_row in self._conn.execute(
+                            f"SELECT {SUMMARY_COLUMNS} FROM jobs "
+                            "WHERE status IN (?, ?) AND available_at <= ?",
+                            (JobStatus.SCHEDULED, JobStatus.QUEUED, now),
+                        )
+                    ]
+                    running = [
+                        JobSchedule(*running_row)
+                        for running_row in self._conn.execute(
+                            "SELECT installation, repo, cost FROM jobs WHERE status = ?",
+                            (JobStatus.RUNNING,),
+                        )
+                    ]
+                    picked = self.scheduler.pick(ready, running)
+                    if picked is None:
+                        return None
+                    row = self._conn.execute(
+                        "SELECT * FROM jobs WHERE id = ?", (picked.id,)
+                    ).fetchone()
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts + 1, "
+                    "lease_owner = ?, lease_expires_at = ?, started_at = ? WHERE id = ?",
+                    (JobStatus.RUNNING, self.owner, now + self.lease, now, row["id"]),
+                )
+            job = self._job(row)
+            job.status = JobStatus.RUNNING
+            job.attempts += 1
+            job.started_at = now
+            return job
+
+    def _update_owned(self, job: Job, sql: str, params: tuple) -> bool:
+        """Run an UPDATE on a job only while this process still holds its lease."""
+        with self._lock:
+            cursor = self._conn.execute(
+                f"UPDATE jobs SET {sql} WHERE id = ? AND lease_owner = ? AND status = ?",
+                (*params, job.id, self.owner, JobStatus.RUNNING),
+            )
+        return cursor.rowcount == 1
+
+    async def _heartbeat(self, job: Job):
+        """Renew the lease; cancel the job once it is superseded or taken over."""
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                renewed = await asyncio.to_thread(
+                    self._update_owned,
+                    job,
+                    "lease_expires_at = ?",
+                    (time.time() + self.lease,),
+                )
+            except sqlite3.Error as e:
+                logger.error("Could not renew the lease of job %s: %s", job.id, e)
+                continue
+            if not renewed:
+                job._lost = True
+                job._task.cancel()
+                return
+
+    async def _worker(self, n: int):
+        while not self._stopping:
+            self._wakeup.clear()
+            job = await asyncio.to_thread(self._claim)
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _run(self, job: Job):
+        trace = set_trace_id(job.trace_id)
+        self._running[job.id] = job
+        job._task = asyncio.create_task(self.handlers[job.type](job.payload))
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            result = await job._task
+            job.status = JobStatus.SUCCEEDED
+            job.result = result
+            job.finished_at = time.time()
+            await asyncio.to_thread(
+                self._update_owned,
+                job,
+                "status = ?, result = ?, finished_at = ?, lease_owner = NULL",
+                (job.status, json.dumps(result, default=str), job.finished_at),
+            )
+        except asyncio.CancelledError:
+            if not job._lost:
+                # The worker is being stopped: hand the job to another worker
+                await asyncio.to_thread(
+                    self._update_owned,
+                    job,
+                    "status = ?, attempts = attempts - 1, lease_owner = NULL",
+                    (JobStatus.QUEUED,),
+                )
+                logger.warning("Job %s handed back to the queue", job.id)
+                raise
+            job.status = JobStatus.SUPERSEDED
+            job.finished_at = time.time()
+            logger.info("Job %s lost its lease, cancelled in flight", job.id)
+        except Exception as e:
+            job.error = getattr(e, "detail", None) or str(e)
+            job.finished_at = time.time()
+            await asyncio.to_thread(
+                self._fail, job, getattr(e, "status_code", 500) < 500
+            )
+        finally:
+            heartbeat.cancel()
+            job._task = None
+            self._running.pop(job.id, None)
+            # A repo at its concurrency cap may have a free slot now
+            self._wakeup.set()
+            if job.is_finished:
+                job_duration.observe(
+                    job.finished_at - job.created_at, job.type, job.status
+                )
+                logger.info(
+                    "Job %s %s in %ss",
+                    job.id,
+                    job.status,
+                    round(job.finished_at - job.started_at, 2),
+                )
+                await self._maybe_prune()
+            reset_trace_id(trace)
+
+    def _fail(self, job: Job, permanent: bool = False):
+        """Schedule a retry with exponential backoff, or dead-letter the job."""
+        if job.attempts >= self.max_attempts or permanent:
+            job.status = JobStatus.FAILED if permanent else JobStatus.DEAD_LETTERED
+            self._update_owned(
+                job,
+                "status = ?, error = ?, finished_at = ?, lease_owner = NULL",
+                (job.status, job.error, job.finished_at),
+            )
+            logger.error("Job %s %s: %s", job.id, job.status, job.error)
+            return
+        backoff = self.retry_backoff * 2 ** (job.attempts - 1)
+        job.status = JobStatus.QUEUED
+        self._update_owned(
+            job,
+            "status = ?, error = ?, available_at = ?, lease_owner = NULL",
+            (job.status, job.error, time.time() + backoff),
+        )
+        logger.warning(
+            "Job %s failed on attempt %s, retrying in %ss: %s",
+            job.id,
+            job.attempts,
+            backoff,
+            job.error,
+        )
+
+    async def _maybe_prune(self):
+        """Drop the oldest finished jobs beyond the history size; dead letters stay."""
+        self._finishes += 1
+        if not self._finishes % self.PRUNE_EVERY:
+            await asyncio.to_thread(self._prune)
+
+    def _prune(self):
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM jobs WHERE id IN (SELECT id FROM jobs "
+                "WHERE status IN (?, ?, ?) ORDER BY finished_at DESC "
+                "LIMIT -1 OFFSET ?)",
+                (
+                    JobStatus.SUCCEEDED,
+                    JobStatus.FAILED,
+                    JobStatus.SUPERSEDED,
+                    self.history_size,
+                ),
+            )
+
+
+def create_job_queue():
+    """Build the configured job queue: in-process, or durable in SQLite."""
+    if config.JOB_STORE_BACKEND == "sqlite":
+        logger.info("Using the SQLite job store at %s", config.SQLITE_PATH)
+        return SQLiteJobQueue()
+    return JobQueue()
+
+
+# Instantiate the job queue
+job_queue = create_job_queue()
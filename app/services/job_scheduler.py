@@ -0,0 +1,120 @@
+import time
+from typing import Dict, Iterable, Optional, Sequence
+from app.core.config import config
+
+# A changed file costs about as much review time as this many changed lines
+FILE_COST_LINES = 20
+
+
+class SchedulerPolicy:
+    FAIR = "fair"
+    FIFO = "fifo"
+
+
+class JobSchedule:
+    """Who a job is for and how expensive it is expected to be."""
+
+    def __init__(
+        self,
+        installation: Optional[str] = None,
+        repo: Optional[str] = None,
+        cost: float = 0,
+    ):
+        self.installation = installation
+        self.repo = repo
+        self.cost = cost
+
+    @classmethod
+    def from_pr_payload(cls, payload: dict) -> "JobSchedule":
+        """Cost a PR event by its size, with `synchronize` ranked below `opened`."""
+        pr = payload.get("pull_request", {})
+        cost = (
+            (pr.get("additions") or 0)
+            + (pr.get("deletions") or 0)
+            + FILE_COST_LINES * (pr.get("changed_files") or 0)
+        )
+        if payload.get("action") == "synchronize":
+            cost += config.SCHEDULER_SYNCHRONIZE_PENALTY_LINES
+        installation = payload.get("installation", {}).get("id")
+        return cls(
+            str(installation) if installation is not None else None,
+            payload.get("repository", {}).get("full_name"),
+            cost,
+        )
+
+    def to_dict(self) -> dict:
+        return {"installation": self.installation, "repo": self.repo, "cost": self.cost}
+
+
+def parse_repo_limits(value: str) -> Dict[str, int]:
+    """Parse "owner/repo=2,owner/other=1" into a dict."""
+    limits = {}
+    for item in value.split(","):
+        repo, _, limit = item.partition("=")
+        if repo.strip() and limit.strip():
+            limits[repo.strip()] = int(limit)
+    return limits
+
+
+class FairScheduler:
+    """Chooses which ready job a free worker runs next.
+
+    With the "fair" policy the job comes from the installation with the fewest
+    running jobs, then from the repo with the fewest, so one busy repo cannot
+    hold every worker while others wait. Among those, the cheapest job wins.
+    Cost is the PR's changed lines and files, minus a credit for every second
+    waited so large PRs are not starved. "fifo" keeps arrival order. Under
+    either policy, jobs of a repo that is at its concurrency cap are skipped.
+    """
+
+    def __init__(
+        self,
+        policy: str = config.SCHEDULER_POLICY,
+        aging: float = config.SCHEDULER_AGING_LINES_PER_SECOND,
+        default_repo_limit: int = config.REPO_MAX_CONCURRENCY,
+        repo_limits: Optional[Dict[str, int]] = None,
+    ):
+        self.policy = policy
+        self.aging = aging
+        self.default_repo_limit = default_repo_limit
+        self.repo_limits = (
+            parse_repo_limits(config.REPO_CONCURRENCY_LIMITS)
+            if repo_limits is None
+            else repo_limits
+        )
+
+    def repo_limit(self, repo: Optional[str]) -> int:
+        """Running jobs allowed for the repo; 0 means no cap."""
+        return self.repo_limits.get(repo, self.default_repo_limit) if repo else 0
+
+    def pick(self, ready: Sequence, running: Iterable[JobSchedule]):
+        """The job to run next out of `ready`, or None if every one is capped.
+
+        Jobs are anything with `schedule` and `created_at` attributes.
+        """
+        installations: Dict[Optional[str], int] = {}
+        repos: Dict[Optional[str], int] = {}
+        for schedule in running:
+            installations[schedule.installation] = (
+                installations.get(schedule.installation, 0) + 1
+            )
+            repos[schedule.repo] = repos.get(schedule.repo, 0) + 1
+
+        now = time.time()
+        best, best_key = None, None
+        for job in ready:
+            schedule = job.schedule
+            limit = self.repo_limit(schedule.repo)
+            if limit and repos.get(schedule.repo, 0) >= limit:
+                continue
+            if self.policy == SchedulerPolicy.FIFO:
+                key = (job.created_at,)
+            else:
+                key = (
+                    installations.get(schedule.installation, 0),
+                    repos.get(schedule.repo, 0),
+                    schedule.cost - self.aging * (now - job.created_at),
+                )
+            if best_key is None or key < best_key:
+                best, best_key = job, key
+        return best
@@ -0,0 +1,104 @@
+import hashlib
+from typing import Any, Optional
+from app.core.config import config
+from app.core.log import get_logger
+from app.services.cache_store import create_store
+
+logger = get_logger("LLMCache")
+
+
+def prompt_version(*templates: str) -> str:
+    """Short content hash of the prompt templates, so editing a prompt busts the cache."""
+    digest = hashlib.sha256()
+    for template in templates:
+        digest.update(template.encode())
+    return digest.hexdigest()[:12]
+
+
+def normalize_diff(diff: str) -> str:
+    """Reduce a diff to the content that determines a line-agnostic LLM answer.
+
+    Hunk line offsets, context lines and `index` hashes are dropped, so the same
+    change rebased, cherry-picked or force-pushed produces the same text.
+    """
+    kept = []
+    for line in diff.splitlines():
+        if line.startswith("@@"):
+            kept.append("@@")
+        elif line.startswith((" ", "index ")) or line == "":
+            continue
+        else:
+            kept.append(line.rstrip())
+    return "\n".join(kept)
+
+
+class LLMCache:
+    """Content-addressed cache of LLM results with hit, miss and saved-token counters."""
+
+    def __init__(self, store):
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+        self.saved_tokens = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.store is not None
+
+    @staticmethod
+    def make_key(version: str, content: str, normalize: bool = True) -> str:
+        """Key a request by prompt version and (normalized) diff content.
+
+        Use `normalize=False` when the answer depends on line positions, e.g.
+        inline suggestions. The client scopes the key to the model it routes to.
+        """
+        if normalize:
+            content = normalize_diff(content)
+        digest = hashlib.sha256()
+        for part in (version, str(normalize), content):
+            digest.update(part.encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    @staticmethod
+    def scope(key: Optional[str], model: str, max_tokens: int) -> Optional[str]:
+        """Narrow a content key to one model and output limit."""
+        if key is None:
+            return None
+        return hashlib.sha256(f"{key}\0{model}\0{max_tokens}".encode()).hexdigest()
+
+    async def get(self, key: Optional[str]) -> Optional[Any]:
+        if not self.enabled or key is None:
+            return None
+        entry = await self.store.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.saved_tokens += entry.get("tokens", 0)
+        return entry["value"]
+
+    async def set(self, key: Optional[str], value: Any, tokens: int):
+        if not self.enabled or key is None:
+            return
+        await self.store.set(key, {"value": value, "tokens": tokens})
+
+    async def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "saved_tokens": self.saved_tokens,
+            "entries": await self.store.size() if self.enabled else 0,
+        }
+
+
+def create_llm_cache() -> LLMCache:
+    return LLMCache(
+        create_store(
+            config.LLM_CACHE_BACKEND,
+            "llm_cache",
+            config.LLM_CACHE_MAX_ENTRIES,
+            config.LLM_CACHE_TTL_SECONDS,
+        )
+    )
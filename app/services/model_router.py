@@ -0,0 +1,119 @@
+from collections import deque
+from typing import List, Optional
+from app.core.config import config
+from app.core.log import get_logger
+
+logger = get_logger("ModelRouter")
+
+
+class RouteStats:
+    """Decisions, outcomes and a rolling latency window for one route."""
+
+    def __init__(self, window: int = config.ROUTE_LATENCY_WINDOW):
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.latencies = deque(maxlen=window)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def to_dict(self) -> dict:
+        p50, p95 = self.percentile(0.5), self.percentile(0.95)
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "p50_latency": round(p50, 2) if p50 is not None else None,
+            "p95_latency": round(p95, 2) if p95 is not None else None,
+        }
+
+
+class Route:
+    """A model and its limits, used for prompts up to `max_input_tokens`."""
+
+    def __init__(
+        self,
+        name: str,
+        model: str,
+        max_input_tokens: Optional[int],
+        max_tokens: int,
+        structured_max_tokens: int,
+        timeout: float,
+        hedge: bool = config.HEDGE_ENABLED,
+    ):
+        self.name = name
+        self.model = model
+        self.max_input_tokens = max_input_tokens
+        self.max_tokens = max_tokens
+        self.structured_max_tokens = structured_max_tokens
+        self.timeout = timeout
+        self.hedge = hedge
+        self.stats = RouteStats()
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds after which a duplicate request is sent, once p95 is known."""
+        if not self.hedge or len(self.stats.latencies) < config.HEDGE_MIN_SAMPLES:
+            return None
+        return self.stats.percentile(config.HEDGE_PERCENTILE)
+
+    def to_dict(self) -> dict:
+        return {
+            "model": self.model,
+            "max_input_tokens": self.max_input_tokens,
+            "max_tokens": self.max_tokens,
+            "structured_max_tokens": self.structured_max_tokens,
+            "timeout": self.timeout,
+            "hedge": self.hedge,
+            **self.stats.to_dict(),
+        }
+
+
+class ModelRouter:
+    """Picks the first route whose input limit fits the prompt; the last one takes the rest."""
+
+    def __init__(self, routes: List[Route]):
+        self.routes = routes
+
+    def select(self, input_tokens: int) -> Route:
+        for route in self.routes:
+            if route.max_input_tokens is None or input_tokens <= route.max_input_tokens:
+                return route
+        return self.routes[-1]
+
+    def stats(self) -> dict:
+        return {route.name: route.to_dict() for route in self.routes}
+
+
+def create_model_router() -> ModelRouter:
+    """Small prompts go to OPENAI_SMALL_MODEL (when set), everything else to OPENAI_MODEL."""
+    routes = []
+    if config.OPENAI_SMALL_MODEL:
+        routes.append(
+            Route(
+                "small",
+                config.OPENAI_SMALL_MODEL,
+                config.ROUTE_SMALL_MAX_INPUT_TOKENS,
+                config.ROUTE_SMALL_MAX_TOKENS,
+                config.ROUTE_SMALL_STRUCTURED_MAX_TOKENS,
+                config.ROUTE_SMALL_TIMEOUT_SECONDS,
+            )
+        )
+    routes.append(
+        Route(
+            "large",
+            config.OPENAI_MODEL,
+            None,
+            config.OPENAI_MAX_TOKENS,
+            config.OPENAI_STRUCTURED_MAX_TOKENS,
+            config.ROUTE_LARGE_TIMEOUT_SECONDS,
+        )
+    )
+    return ModelRouter(routes)
@@ -1,57 +1,344 @@
-import logging
+import asyncio
 import time
-from openai import OpenAI
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, Optional, Type
+from pydantic import BaseModel
 from app.core.config import config
+from app.core.log import get_logger, log_payload
+from app.services.http_client import openai_http
+from app.services.metrics import instrument, openai_tokens
+from app.services.llm_cache import create_llm_cache
+from app.services.model_router import Route, create_model_router
+from app.services.rate_limiter import (
+    Priority,
+    RateLimited,
+    TransientError,
+    parse_duration,
+    rate_limiter,
+)
+from app.services.tokens import count_tokens
 from fastapi import HTTPException
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(name)s - [OpenAIClient] - %(message)s",
-)
-logger = logging.getLogger("OpenAIClient")
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+logger = get_logger("OpenAIClient")
+
+
+class UsageStats:
+    """Token and latency totals for one generation mode."""
+
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.cached_prompt_tokens = 0
+        self.completion_tokens = 0
+        self.latency = 0.0
+
+    def record(self, usage, latency: float):
+        self.calls += 1
+        self.latency += latency
+        if usage is None:
+            return
+        self.prompt_tokens += usage.prompt_tokens or 0
+        self.completion_tokens += usage.completion_tokens or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        self.cached_prompt_tokens += getattr(details, "cached_tokens", 0) or 0
+
+    def to_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "cached_prompt_tokens": self.cached_prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_latency": round(self.latency, 2),
+            "avg_latency": round(self.latency / self.calls, 2) if self.calls else 0,
+        }
 
 
 class OpenAIClient:
     """Handles OpenAI API calls for PR summaries and reviews."""
 
     def __init__(self):
-        """Initialize OpenAI client with API key."""
+        """The underlying AsyncOpenAI client is created on `start()`."""
+        self._client: Optional["AsyncOpenAI"] = None
+        self._warm_up: Optional[asyncio.Future] = None
+        self.usage: Dict[str, UsageStats] = {}
+        self.cache = create_llm_cache()
+        self.router = create_model_router()
+
+    def start(self) -> "AsyncOpenAI":
+        """Create the AsyncOpenAI client on top of the shared connection pool.
+
+        The SDK is imported here rather than at module load, since it makes up
+        a large part of the app's import time.
+        """
+        if self._client is None:
+            try:
+                from openai import AsyncOpenAI
+
+                self._client = AsyncOpenAI(
+                    api_key=config.OPENAI_API_KEY,
+                    base_url=config.OPENAI_BASE_URL or None,
+                    http_client=openai_http.start(),
+                    # Retries (429s, 5xx, timeouts, dropped connections) are
+                    # paced by the shared rate limiter instead
+                    max_retries=0,
+                )
+                logger.info("OpenAI client initialized successfully.")
+            except Exception as e:
+                logger.exception("Failed to initialize OpenAI client: %s", e)
+                raise HTTPException(
+                    status_code=500, detail="Failed to initialize OpenAI client"
+                )
+        return self._client
+
+    async def warm_up(self):
+        """Create the client in a thread, along with the resources it builds lazily.
+
+        Importing the SDK and building `beta.chat.completions` takes over a
+        second. Requests made meanwhile wait here rather than blocking the event
+        loop on the same imports.
+        """
+        if self._warm_up is None:
+            self._warm_up = asyncio.ensure_future(asyncio.to_thread(self._load))
         try:
-            self.client = OpenAI(api_key=config.OPENAI_API_KEY)
-            logger.info("OpenAI client initialized successfully.")
-        except Exception as e:
-            logger.exception(f"Failed to initialize OpenAI client: {str(e)}")
-            raise HTTPException(
-                status_code=500, detail="Failed to initialize OpenAI client"
+            await asyncio.shield(self._warm_up)
+        except HTTPException:
+            self._warm_up = None
+            raise
+
+    def _load(self):
+        client = self.start()
+        client.chat.completions.with_raw_response
+        client.beta.chat.completions.with_raw_response
+
+    @property
+    def client(self) -> "AsyncOpenAI":
+        return self.start()
+
+    async def aclose(self):
+        self._client = None
+        self._warm_up = None
+        await openai_http.aclose()
+
+    def record_usage(self, mode: str, model: str, usage, latency: float):
+        self.usage.setdefault(mode, UsageStats()).record(usage, latency)
+        if usage is not None:
+            details = getattr(usage, "prompt_tokens_details", None)
+            openai_tokens.inc(model, "prompt", amount=usage.prompt_tokens or 0)
+            openai_tokens.inc(
+                model,
+                "cached_prompt",
+                amount=getattr(details, "cached_tokens", 0) or 0,
             )
+            openai_tokens.inc(model, "completion", amount=usage.completion_tokens or 0)
 
-    def generate_text(self, prompt: str) -> str:
-        """Generate text using OpenAI API."""
+    @staticmethod
+    def _total_tokens(response) -> int:
+        usage = getattr(response, "usage", None)
+        return getattr(usage, "total_tokens", 0) or 0
+
+    def usage_stats(self) -> dict:
+        return {mode: stats.to_dict() for mode, stats in self.usage.items()}
+
+    @instrument("openai_request")
+    async def _submit(
+        self,
+        create: Callable[[], Awaitable],
+        route: Route,
+        input_tokens: int,
+        max_tokens: int,
+        priority: int = Priority.NORMAL,
+        track_latency: bool = True,
+    ):
+        """Send a `with_raw_response` request under the model's rate limits.
+
+        The request waits for one slot of the requests-per-minute bucket and
+        for its estimated size (prompt plus max output) in the tokens-per-minute
+        bucket. Both buckets are then synced from the `x-ratelimit-*` headers.
+        """
+        import openai
+
+        requests = rate_limiter.bucket(
+            f"openai-requests:{route.model}",
+            config.OPENAI_REQUESTS_PER_MINUTE,
+            config.OPENAI_REQUESTS_PER_MINUTE / 60,
+        )
+        tokens = rate_limiter.bucket(
+            f"openai-tokens:{route.model}",
+            config.OPENAI_TOKENS_PER_MINUTE,
+            config.OPENAI_TOKENS_PER_MINUTE / 60,
+        )
+
+        def observe(headers):
+            for bucket, kind in ((requests, "requests"), (tokens, "tokens")):
+                remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+                if remaining is not None:
+                    bucket.observe(
+                        float(remaining),
+                        parse_duration(headers.get(f"x-ratelimit-reset-{kind}")),
+                    )
+
+        async def send():
+            started = time.monotonic()
+            try:
+                raw = await create()
+            except openai.RateLimitError as e:
+                observe(e.response.headers)
+                if e.code == "insufficient_quota":
+                    # Out of credits; waiting will not help
+                    raise
+                retry_after_ms = e.response.headers.get("retry-after-ms")
+                retry_after = (
+                    float(retry_after_ms) / 1000
+                    if retry_after_ms
+                    else parse_duration(e.response.headers.get("retry-after"))
+                )
+                raise RateLimited(e, retry_after)
+            except openai.APIStatusError as e:
+                # The statuses the SDK itself would retry
+                if e.status_code in (408, 409) or e.status_code >= 500:
+                    raise TransientError(e)
+                raise
+            except openai.APIConnectionError as e:
+                # Includes APITimeoutError
+                raise TransientError(e)
+            # Only time spent on the wire counts towards the hedging threshold
+            if track_latency:
+                route.stats.latencies.append(time.monotonic() - started)
+            observe(raw.headers)
+            return raw.parse()
+
+        return await rate_limiter.submit(
+            send, [(requests, 1), (tokens, input_tokens + max_tokens)], priority
+        )
+
+    async def _routed(
+        self,
+        route: Route,
+        create: Callable[[], Awaitable],
+        input_tokens: int,
+        max_tokens: int,
+        priority: int = Priority.NORMAL,
+    ):
+        """Run a request on `route`, hedging it once it outlives the route's p95.
+
+        The duplicate request races the original and the first successful
+        answer wins; the other one is cancelled.
+        """
+        await self.warm_up()
+        import openai
+
+        stats = route.stats
+        stats.calls += 1
+
+        def attempt():
+            return asyncio.ensure_future(
+                self._submit(create, route, input_tokens, max_tokens, priority)
+            )
+
+        tasks = []
+        try:
+            tasks.append(attempt())
+            delay = route.hedge_delay()
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done:
+                    stats.hedged += 1
+                    logger.info(
+                        "Hedging %s request after %ss", route.model, round(delay, 2)
+                    )
+                    tasks.append(attempt())
+            pending, error = set(tasks), None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        if task is not tasks[0]:
+                            stats.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        except openai.APITimeoutError:
+            stats.timeouts += 1
+            raise
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def generate_text(
+        self,
+        prompt: str,
+        mode: str = "separate",
+        max_tokens: Optional[int] = None,
+        cache_key: Optional[str] = None,
+        priority: int = Priority.NORMAL,
+    ) -> str:
+        """Generate text using OpenAI API.
+
+        The model, timeout and default output limit come from the route chosen
+        for the prompt's size.
+        """
         if not prompt:
             logger.warning("Empty prompt provided to OpenAI API.")
             return "Error: Empty prompt provided."
 
+        input_tokens = count_tokens(prompt)
+        route = self.router.select(input_tokens)
+        max_tokens = max_tokens or route.max_tokens
+        cache_key = self.cache.scope(cache_key, route.model, max_tokens)
+        cached = await self.cache.get(cache_key)
+        if cached is not None:
+            logger.info("OpenAI response served from cache")
+            return cached
+
         try:
-            logger.info(f"Sending request to OpenAI: {prompt}")
+            logger.info(
+                "Sending request to OpenAI (%s route, %s chars)",
+                route.name,
+                len(prompt),
+            )
+            log_payload(logger, "OpenAI prompt", prompt=prompt)
             start_time = time.time()
 
-            response = self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.5,
-                max_tokens=1024,
-                top_p=1,
-                frequency_penalty=0,
-                presence_penalty=0,
+            messages = [{"role": "user", "content": prompt}]
+            response = await self._routed(
+                route,
+                lambda: self.client.chat.completions.with_raw_response.create(
+                    model=route.model,
+                    messages=messages,
+                    temperature=0.5,
+                    max_tokens=max_tokens,
+                    top_p=1,
+                    frequency_penalty=0,
+                    presence_penalty=0,
+                    timeout=route.timeout,
+                ),
+                input_tokens,
+                max_tokens,
+                priority=priority,
             )
 
             execution_time = round(time.time() - start_time, 2)
+            self.record_usage(mode, route.model, response.usage, execution_time)
 
             if response and response.choices:
                 generated_text = response.choices[0].message.content
                 logger.info(
-                    f"OpenAI response received in {execution_time}s: {generated_text}"
+                    "OpenAI response received in %ss (%s chars)",
+                    execution_time,
+                    len(generated_text or ""),
+                )
+                log_payload(logger, "OpenAI completion", completion=generated_text)
+                await self.cache.set(
+                    cache_key, generated_text, self._total_tokens(response)
                 )
                 return generated_text
             else:
@@ -59,7 +346,199 @@ class OpenAIClient:
                 raise HTTPException(status_code=500, detail="OpenAI response is empty.")
 
         except Exception as e:
-            logger.exception(f"OpenAI API call failed: {str(e)}")
+            logger.exception("OpenAI API call failed: %s", e)
+            raise HTTPException(
+                status_code=500, detail="Failed to generate AI response"
+            )
+
+    async def stream_text(
+        self,
+        prompt: str,
+        on_text: Callable[[str], None],
+        mode: str = "separate",
+        max_tokens: Optional[int] = None,
+        cache_key: Optional[str] = None,
+        priority: int = Priority.NORMAL,
+    ) -> str:
+        """Like `generate_text`, but hands each streamed delta to `on_text`.
+
+        Streams are never hedged. A cached result is returned without calling
+        `on_text`.
+        """
+        await self.warm_up()
+        import openai
+
+        if not prompt:
+            logger.warning("Empty prompt provided to OpenAI API.")
+            return "Error: Empty prompt provided."
+
+        input_tokens = count_tokens(prompt)
+        route = self.router.select(input_tokens)
+        max_tokens = max_tokens or route.max_tokens
+        cache_key = self.cache.scope(cache_key, route.model, max_tokens)
+        cached = await self.cache.get(cache_key)
+        if cached is not None:
+            logger.info("OpenAI response served from cache")
+            return cached
+
+        route.stats.calls += 1
+        try:
+            logger.info(
+                "Streaming request to OpenAI (%s route, %s chars)",
+                route.name,
+                len(prompt),
+            )
+            log_payload(logger, "OpenAI prompt", prompt=prompt)
+            start_time = time.time()
+
+            messages = [{"role": "user", "content": prompt}]
+            stream = await self._submit(
+                lambda: self.client.chat.completions.with_raw_response.create(
+                    model=route.model,
+                    messages=messages,
+                    temperature=0.5,
+                    max_tokens=max_tokens,
+                    top_p=1,
+                    frequency_penalty=0,
+                    presence_penalty=0,
+                    stream=True,
+                    stream_options={"include_usage": True},
+                    timeout=route.timeout,
+                ),
+                route,
+                input_tokens,
+                max_tokens,
+                priority=priority,
+                # Headers arrive long before the answer; timed below instead
+                track_latency=False,
+            )
+            parts, usage = [], None
+            # Closing releases the connection when the call is cancelled or
+            # `on_text` raises mid-stream
+            async with stream:
+                async for chunk in stream:
+                    if chunk.usage is not None:
+                        usage = chunk.usage
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        parts.append(chunk.choices[0].delta.content)
+                        on_text(parts[-1])
+
+            execution_time = round(time.time() - start_time, 2)
+            route.stats.latencies.append(execution_time)
+            self.record_usage(mode, route.model, usage, execution_time)
+
+            generated_text = "".join(parts)
+            if not generated_text:
+                logger.warning("OpenAI response is empty.")
+                raise HTTPException(status_code=500, detail="OpenAI response is empty.")
+            logger.info(
+                "OpenAI stream finished in %ss (%s chars)",
+                execution_time,
+                len(generated_text),
+            )
+            log_payload(logger, "OpenAI completion", completion=generated_text)
+            await self.cache.set(
+                cache_key, generated_text, getattr(usage, "total_tokens", 0) or 0
+            )
+            return generated_text
+
+        except Exception as e:
+            if isinstance(e, openai.APITimeoutError):
+                route.stats.timeouts += 1
+            else:
+                route.stats.errors += 1
+            logger.exception("OpenAI streaming call failed: %s", e)
+            raise HTTPException(
+                status_code=500, detail="Failed to generate AI response"
+            )
+
+    async def generate_structured(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        response_model: Type[BaseModel],
+        mode: str = "combined",
+        max_tokens: Optional[int] = None,
+        cache_key: Optional[str] = None,
+        priority: int = Priority.NORMAL,
+    ) -> BaseModel:
+        """Generate a schema-validated JSON response.
+
+        The static `system_prompt` goes first so repeated calls share a cacheable
+        prefix. Uses structured outputs, or JSON mode plus local validation when
+        OPENAI_STRUCTURED_OUTPUT is "json_object". Routed by prompt size like
+        `generate_text`.
+        """
+        input_tokens = count_tokens(system_prompt) + count_tokens(user_prompt)
+        route = self.router.select(input_tokens)
+        max_tokens = max_tokens or route.structured_max_tokens
+        cache_key = self.cache.scope(cache_key, route.model, max_tokens)
+        cached = await self.cache.get(cache_key)
+        if cached is not None:
+            logger.info("OpenAI structured response served from cache")
+            return response_model.model_validate(cached)
+
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt},
+        ]
+        try:
+            logger.info(
+                "Sending structured request to OpenAI (%s route, %s chars)",
+                route.name,
+                len(user_prompt),
+            )
+            log_payload(logger, "OpenAI prompt", prompt=user_prompt)
+            start_time = time.time()
+
+            if config.OPENAI_STRUCTURED_OUTPUT == "json_object":
+                response = await self._routed(
+                    route,
+                    lambda: self.client.chat.completions.with_raw_response.create(
+                        model=route.model,
+                        messages=messages,
+                        temperature=0.5,
+                        max_tokens=max_tokens,
+                        response_format={"type": "json_object"},
+                        timeout=route.timeout,
+                    ),
+                    input_tokens,
+                    max_tokens,
+                    priority=priority,
+                )
+                message = response.choices[0].message
+                parsed = response_model.model_validate_json(message.content)
+            else:
+                response = await self._routed(
+                    route,
+                    lambda: self.client.beta.chat.completions.with_raw_response.parse(
+                        model=route.model,
+                        messages=messages,
+                        temperature=0.5,
+                        max_tokens=max_tokens,
+                        response_format=response_model,
+                        timeout=route.timeout,
+                    ),
+                    input_tokens,
+                    max_tokens,
+                    priority=priority,
+                )
+                message = response.choices[0].message
+                if message.refusal:
+                    raise ValueError(f"Model refused the request: {message.refusal}")
+                parsed = message.parsed
+
+            execution_time = round(time.time() - start_time, 2)
+            self.record_usage(mode, route.model, response.usage, execution_time)
+            logger.info("OpenAI structured response received in %ss", execution_time)
+            log_payload(logger, "OpenAI structured completion", completion=parsed)
+            await self.cache.set(
+                cache_key, parsed.model_dump(), self._total_tokens(response)
+            )
+            return parsed
+
+        except Exception as e:
+            logger.exception("OpenAI structured API call failed: %s", e)
             raise HTTPException(
                 status_code=500, detail="Failed to generate AI response"
             )
@@ -0,0 +1,357 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Optional
+from fastapi import HTTPException
+from app.core.config import config
+from app.core.log import get_logger
+from app.services.diff_filter import restrict_to
+from app.services.diff_index import DiffIndex
+from app.services.diff_parser import ParsedDiff
+from app.services.metrics import diff_bytes, peak_rss_bytes
+from app.services.tokens import count_tokens
+
+logger = get_logger("ReviewPipeline")
+
+
+class PullRequestContext:
+    """The identifying fields of a PR event that every stage needs."""
+
+    def __init__(
+        self,
+        repo_full_name: str,
+        pr_number: int,
+        installation_id: Optional[int] = None,
+        action: Optional[str] = None,
+        head_sha: Optional[str] = None,
+        before_sha: Optional[str] = None,
+    ):
+        self.repo_full_name = repo_full_name
+        self.pr_number = pr_number
+        self.installation_id = installation_id
+        self.action = action
+        self.head_sha = head_sha
+        # Previous head of the branch, only sent with `synchronize` events
+        self.before_sha = before_sha
+
+    @classmethod
+    def from_payload(cls, payload: dict) -> "PullRequestContext":
+        return cls(
+            repo_full_name=payload.get("repository", {}).get("full_name"),
+            pr_number=payload.get("pull_request", {}).get("number"),
+            installation_id=payload.get("installation", {}).get("id"),
+            action=payload.get("action"),
+            head_sha=payload.get("pull_request", {}).get("head", {}).get("sha"),
+            before_sha=payload.get("before"),
+        )
+
+    @property
+    def is_valid(self) -> bool:
+        """Whether the payload names both the repository and the PR."""
+        return bool(self.repo_full_name and self.pr_number)
+
+
+class StageStatus:
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    TIMED_OUT = "timed_out"
+
+
+class StageResult:
+    """Outcome of one pipeline stage."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.status = None
+        self.result = None
+        self.error = None
+        self.duration = None
+
+    def to_dict(self) -> dict:
+        return {
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "duration": self.duration,
+        }
+
+
+class ReviewPipeline:
+    """Fetches a PR diff once and fans the generation stages out concurrently.
+
+    Each stage generates its artifact and posts it as soon as it is ready, under
+    its own timeout. All stages share a global deadline, and a failing stage
+    never discards the results of the others.
+    """
+
+    def __init__(
+        self,
+        handler,
+        stage_timeout: float = config.PIPELINE_STAGE_TIMEOUT_SECONDS,
+        deadline: float = config.PIPELINE_DEADLINE_SECONDS,
+        mode: str = config.GENERATION_MODE,
+    ):
+        self.handler = handler
+        self.stage_timeout = stage_timeout
+        self.deadline = deadline
+        self.mode = mode
+
+    async def run(self, ctx: PullRequestContext) -> dict:
+        started = time.monotonic()
+        fetch_timeout = min(self.stage_timeout, self.deadline)
+        state = await self.handler.get_incremental_state(ctx)
+        rss_before = peak_rss_bytes()
+        mode = None
+        pr_diff_fetch = asyncio.wait_for(
+            self.handler.get_pr_diff(
+                ctx.repo_full_name, ctx.pr_number, ctx.installation_id
+            ),
+            timeout=fetch_timeout,
+        )
+        if state is None:
+            pr_diff = await pr_diff_fetch
+            compare_diff = None
+        else:
+            # The PR's own diff tells its changes apart from merged base commits
+            pr_diff, compare_diff = await asyncio.gather(
+                pr_diff_fetch,
+                asyncio.wait_for(
+                    self.handler.get_compare_diff(ctx), timeout=fetch_timeout
+                ),
+                return_exceptions=True,
+            )
+            if isinstance(pr_diff, BaseException):
+                raise pr_diff
+            if isinstance(compare_diff, BaseException):
+                # e.g. the previous head was garbage collected; fall back to a full review
+                logger.warning("Incremental review unavailable: %s", compare_diff)
+                compare_diff = None
+        # Suggestions may go on any line of the PR's own diff, including files
+        # and context that filtering or an incremental review leave out
+        diff_index = DiffIndex(pr_diff.files)
+        if compare_diff is not None:
+            pr_diff = restrict_to(compare_diff, pr_diff)
+            mode = "incremental"
+        diff_bytes.observe(pr_diff.bytes, str(pr_diff.truncated).lower())
+        if pr_diff.truncated:
+            logger.warning(
+                "Diff of PR #%s truncated after %s bytes", ctx.pr_number, pr_diff.bytes
+            )
+
+        filter_report = None
+        if config.DIFF_FILTER_ENABLED:
+            pr_diff, filter_report = await asyncio.wait_for(
+                self.handler.filter_diff(ctx, pr_diff), timeout=fetch_timeout
+            )
+
+        diff_tokens = count_tokens(pr_diff.text)
+        mode = mode or self.select_mode(
+            diff_tokens, await self.handler.has_review_state(ctx)
+        )
+        logger.info(
+            "Reviewing PR #%s (%s tokens) in %s mode", ctx.pr_number, diff_tokens, mode
+        )
+
+        # Shared tasks spawned by stages; they must not outlive the pipeline
+        background = []
+        stages = self.build_stages(ctx, pr_diff, mode, background, state, diff_index)
+        try:
+            results = await self.run_stages(
+                stages, self.deadline - (time.monotonic() - started)
+            )
+        finally:
+            for task in background:
+                task.cancel()
+
+        total = round(time.monotonic() - started, 2)
+        rss_after = peak_rss_bytes()
+        logger.info("Pipeline for PR #%s finished in %ss", ctx.pr_number, total)
+        if all(r.status != StageStatus.SUCCEEDED for r in results.values()):
+            raise HTTPException(status_code=500, detail="All review stages failed")
+        return {
+            "mode": mode,
+            "diff_tokens": diff_tokens,
+            "diff_filter": filter_report.to_dict() if filter_report else None,
+            "duration": total,
+            "memory": {
+                "diff_bytes": pr_diff.bytes,
+                "diff_truncated": pr_diff.truncated,
+                "peak_rss_bytes": rss_after,
+                # Only non-zero when this PR pushed the process to a new peak
+                "peak_rss_growth_bytes": rss_after - rss_before,
+            },
+            "stages": {name: r.to_dict() for name, r in results.items()},
+        }
+
+    def select_mode(self, diff_tokens: int, tracked: bool = False) -> str:
+        """Diffs too large for a single prompt are always reviewed in chunks.
+
+        A `tracked` PR already has per-file notes from an earlier chunked
+        review. Only the chunked path keeps them current, so it stays on that
+        path for incremental re-reviews even once its diff would fit.
+        """
+        if diff_tokens > config.DIRECT_REVIEW_MAX_TOKENS or tracked:
+            return "chunked"
+        return self.mode
+
+    def build_stages(
+        self,
+        ctx: PullRequestContext,
+        pr_diff: ParsedDiff,
+        mode: str,
+        background: list,
+        state=None,
+        diff_index: Optional[DiffIndex] = None,
+    ) -> Dict[str, Callable[[], Awaitable]]:
+        """Map stage names to coroutine factories that generate and post an artifact.
+
+        The chunked and incremental paths work on the parsed files; the other
+        modes put the diff's text, rendered once, into their prompts.
+        """
+        handler = self.handler
+        # Checks suggestion positions before they are posted; `run` passes one
+        # built from the unfiltered diff
+        if diff_index is None:
+            diff_index = DiffIndex(pr_diff.files)
+        if mode == "incremental":
+            return self.build_shared_stages(
+                ctx,
+                lambda: handler.generate_incremental_review(ctx, pr_diff, state),
+                background,
+                diff_index,
+            )
+        if mode == "combined":
+            return self.build_shared_stages(
+                ctx,
+                lambda: handler.generate_combined_review(pr_diff.text),
+                background,
+                diff_index,
+            )
+        if mode == "chunked":
+            return self.build_shared_stages(
+                ctx,
+                lambda: handler.generate_chunked_review(pr_diff, ctx),
+                background,
+                diff_index,
+            )
+
+        async def summary():
+            text = await handler.generate_pr_summary(pr_diff.text)
+            return await handler.update_pr_description(
+                ctx.repo_full_name, ctx.pr_number, text, ctx.installation_id
+            )
+
+        async def review():
+            if config.STREAM_REVIEW:
+                text = await handler.stream_pr_review(ctx, pr_diff.text)
+            else:
+                text = await handler.generate_pr_review(pr_diff.text)
+            return await handler.add_pr_review(
+                ctx.repo_full_name, ctx.pr_number, text, ctx.installation_id
+            )
+
+        async def inline_suggestions():
+            suggestions = await handler.generate_inline_suggestions(pr_diff.text)
+            return await handler.add_inline_suggestions(
+                ctx.repo_full_name,
+                ctx.pr_number,
+                suggestions,
+                ctx.installation_id,
+                ctx.head_sha,
+                diff_index,
+            )
+
+        return {
+            "summary": summary,
+            "review": review,
+            "inline_suggestions": inline_suggestions,
+        }
+
+    def build_shared_stages(
+        self,
+        ctx: PullRequestContext,
+        generate: Callable[[], Awaitable],
+        background: list,
+        diff_index: Optional[DiffIndex] = None,
+    ) -> Dict[str, Callable[[], Awaitable]]:
+        """One generation producing a CombinedReview feeds all three posting stages."""
+        handler = self.handler
+        generation = None
+
+        def generated():
+            nonlocal generation
+            if generation is None:
+                generation = asyncio.ensure_future(generate())
+                background.append(generation)
+            # Shield so a stage timing out does not cancel the shared generation
+            return asyncio.shield(generation)
+
+        async def summary():
+            combined = await generated()
+            return await handler.update_pr_description(
+                ctx.repo_full_name, ctx.pr_number, combined.summary, ctx.installation_id
+            )
+
+        async def review():
+            combined = await generated()
+            return await handler.add_pr_review(
+                ctx.repo_full_name, ctx.pr_number, combined.review, ctx.installation_id
+            )
+
+        async def inline_suggestions():
+            combined = await generated()
+            return await handler.add_inline_suggestions(
+                ctx.repo_full_name,
+                ctx.pr_number,
+                [s.model_dump() for s in combined.inline_suggestions],
+                ctx.installation_id,
+                ctx.head_sha,
+                diff_index,
+            )
+
+        return {
+            "summary": summary,
+            "review": review,
+            "inline_suggestions": inline_suggestions,
+        }
+
+    async def run_stages(
+        self, stages: Dict[str, Callable[[], Awaitable]], remaining: float
+    ) -> Dict[str, StageResult]:
+        """Run stages concurrently; stragglers past the deadline are cancelled."""
+        results = {name: StageResult(name) for name in stages}
+        tasks = {
+            asyncio.create_task(self._run_stage(results[name], factory)): name
+            for name, factory in stages.items()
+        }
+        try:
+            _, pending = await asyncio.wait(tasks, timeout=max(remaining, 0))
+        except asyncio.CancelledError:
+            # The job was superseded: stop every stage's in-flight calls too
+            for task in tasks:
+                task.cancel()
+            raise
+        for task in pending:
+            task.cancel()
+            result = results[tasks[task]]
+            result.status = StageStatus.TIMED_OUT
+            result.error = "Pipeline deadline exceeded"
+            logger.error("Stage '%s' cancelled at the pipeline deadline", result.name)
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        return results
+
+    async def _run_stage(self, result: StageResult, factory: Callable[[], Awaitable]):
+        started = time.monotonic()
+        try:
+            result.result = await asyncio.wait_for(factory(), self.stage_timeout)
+            result.status = StageStatus.SUCCEEDED
+        except asyncio.TimeoutError:
+            result.status = StageStatus.TIMED_OUT
+            result.error = f"Stage timed out after {self.stage_timeout}s"
+            logger.error("Stage '%s' timed out", result.name)
+        except Exception as e:
+            result.status = StageStatus.FAILED
+            result.error = getattr(e, "detail", None) or str(e)
+            logger.error("Stage '%s' failed: %s", result.name, result.error)
+        finally:
+            result.duration = round(time.monotonic() - started, 2)
@@ -0,0 +1,73 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Optional
+from app.core.config import config
+from app.core.log import get_logger
+
+logger = get_logger("ProgressiveComment")
+
+# Headings of the sections in PR_REVIEW_PROMPT
+SECTION_HEADING = "\n#### "
+IN_PROGRESS_NOTE = "\n\n_⏳ Review in progress…_"
+
+
+class ProgressiveComment:
+    """Publishes streamed Markdown one finished section at a time.
+
+    A section is finished once the next heading starts. Edits are throttled to
+    one per `interval` seconds and never overlap; text that arrives meanwhile
+    goes out with the next edit, so the edit count stays bounded whatever the
+    stream's chunk size.
+    """
+
+    def __init__(
+        self,
+        publish: Callable[[str], Awaitable],
+        interval: float = config.STREAM_UPDATE_INTERVAL_SECONDS,
+    ):
+        self.publish = publish
+        self.interval = interval
+        self.text = ""
+        self.published_chars = 0
+        self.last_publish = float("-inf")
+        self.updates = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def finished(self) -> str:
+        """The streamed text up to the heading of the section still being written."""
+        end = self.text.rfind(SECTION_HEADING)
+        return self.text[:end].rstrip() if end > 0 else ""
+
+    def feed(self, delta: str):
+        """Add streamed text; starts an edit in the background when one is due."""
+        self.text += delta
+        if self._task is not None and not self._task.done():
+            return
+        if time.monotonic() - self.last_publish < self.interval:
+            return
+        finished = self.finished()
+        # Nothing worth an edit until the first section under the title is done
+        if SECTION_HEADING not in finished or len(finished) <= self.published_chars:
+            return
+        self.published_chars = len(finished)
+        self.last_publish = time.monotonic()
+        self._task = asyncio.ensure_future(self._publish(finished + IN_PROGRESS_NOTE))
+
+    async def _publish(self, body: str):
+        try:
+            await self.publish(body)
+            self.updates += 1
+        except Exception as e:
+            # The final write still goes through; a missed partial edit is harmless
+            logger.warning("Progressive comment update failed: %s", e)
+
+    async def close(self, note: Optional[str] = None):
+        """Wait for the edit in flight; with `note`, leave it under the finished text.
+
+        The note is written even if no section was published yet, since it
+        replaces whatever the comment said before the stream started.
+        """
+        if self._task is not None:
+            await self._task
+        if note:
+            await self._publish(f"{self.finished()}\n\n{note}".lstrip())
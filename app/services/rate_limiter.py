@@ -0,0 +1,263 @@
+import asyncio
+import heapq
+import itertools
+import random
+import re
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+from app.core.config import config
+from app.core.log import get_logger
+
+logger = get_logger("RateLimiter")
+
+T = TypeVar("T")
+
+DURATION_PART_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Parse OpenAI-style reset durations such as "6m0s", "1.5s" or "20ms"."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = DURATION_PART_RE.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * DURATION_UNITS[unit] for amount, unit in parts)
+
+
+class Priority:
+    """Lower values are served first when callers queue for the same bucket."""
+
+    HIGH = 0
+    NORMAL = 1
+    LOW = 2
+
+
+class RateLimited(Exception):
+    """Raised by a send function when the upstream API throttled the request.
+
+    `error` is the original exception, re-raised once retries are exhausted.
+    """
+
+    def __init__(self, error: Exception, retry_after: Optional[float] = None):
+        super().__init__(str(error))
+        self.error = error
+        self.retry_after = retry_after
+
+
+class TransientError(RateLimited):
+    """Raised by a send function for a failure worth retrying that is not a
+    throttle: a dropped connection, a timeout or a 5xx.
+
+    Retried with the same backoff, but the buckets stay open to other callers.
+    """
+
+
+class TokenBucket:
+    """Token bucket whose waiters are served in priority order.
+
+    Tokens refill continuously at `rate` per second up to `capacity`. Response
+    headers can lower the level (`observe`), and a throttled response blocks
+    the bucket until the server's reset time (`block`).
+    """
+
+    def __init__(self, name: str, capacity: float, rate: float):
+        self.name = name
+        self.capacity = max(1.0, capacity)
+        self.rate = rate
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self._waiters: List[tuple] = []
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.Handle] = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+
+    def _delay(self, amount: float) -> float:
+        """Seconds until `amount` tokens are available."""
+        self._refill()
+        now = time.monotonic()
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.tokens >= amount:
+            return 0.0
+        if self.rate <= 0:
+            return 1.0
+        return (amount - self.tokens) / self.rate
+
+    async def acquire(self, amount: float = 1, priority: int = Priority.NORMAL):
+        """Wait for `amount` tokens; requests above capacity wait for a full bucket."""
+        amount = min(amount, self.capacity)
+        if not self._waiters and self._delay(amount) == 0:
+            self.tokens -= amount
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), amount, future))
+        self._schedule()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just as the caller was cancelled; hand the tokens back
+                self.release(amount)
+            raise
+
+    def release(self, amount: float):
+        """Return tokens that were acquired but not spent, e.g. an over-estimate."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+        self._schedule()
+
+    def observe(self, remaining: float, reset_after: Optional[float] = None):
+        """Align with the server's view of the remaining quota."""
+        self._refill()
+        self.tokens = min(self.capacity, max(0.0, remaining))
+        if remaining <= 0 and reset_after:
+            self.block(reset_after)
+
+    def block(self, seconds: float):
+        """Serve nobody for `seconds`, e.g. after a 429 with Retry-After."""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self._reschedule()
+
+    def _schedule(self):
+        if self._timer is None and self._waiters:
+            self._timer = asyncio.get_running_loop().call_soon(self._dispatch)
+
+    def _reschedule(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._schedule()
+
+    def _dispatch(self):
+        self._timer = None
+        while self._waiters:
+            _, _, amount, future = self._waiters[0]
+            if future.done():
+                # The caller was cancelled while waiting
+                heapq.heappop(self._waiters)
+                continue
+            delay = self._delay(amount)
+            if delay > 0:
+                self._timer = asyncio.get_running_loop().call_later(
+                    delay, self._dispatch
+                )
+                return
+            heapq.heappop(self._waiters)
+            self.tokens -= amount
+            future.set_result(None)
+
+    def stats(self) -> dict:
+        self._refill()
+        return {
+            "tokens": round(self.tokens, 2),
+            "capacity": self.capacity,
+            "rate_per_second": round(self.rate, 4),
+            "waiting": sum(1 for w in self._waiters if not w[3].done()),
+            "blocked_for": round(max(0.0, self.blocked_until - time.monotonic()), 2),
+        }
+
+
+class RateLimitScheduler:
+    """Gate for every outbound GitHub and OpenAI call.
+
+    Callers take tokens from one or more buckets (per installation, per model)
+    before sending; requests the upstream throttles anyway are retried with
+    jittered exponential backoff that honors `Retry-After`, instead of failing.
+    Transient failures are retried with the same backoff.
+    """
+
+    def __init__(
+        self,
+        max_retries: int = config.RATE_LIMIT_MAX_RETRIES,
+        backoff_base: float = config.RATE_LIMIT_BACKOFF_BASE_SECONDS,
+        backoff_max: float = config.RATE_LIMIT_BACKOFF_MAX_SECONDS,
+    ):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.throttled = 0
+        self.retries = 0
+
+    def bucket(self, key: str, capacity: float, rate: float) -> TokenBucket:
+        """Get or create the bucket for `key`."""
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = TokenBucket(key, capacity, rate)
+        return bucket
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Full-jitter exponential backoff, never shorter than the server asked for."""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+        if retry_after is not None:
+            delay = retry_after + delay / 2
+        return delay
+
+    async def submit(
+        self,
+        send: Callable[[], Awaitable[T]],
+        buckets: List[Tuple[TokenBucket, float]],
+        priority: int = Priority.NORMAL,
+    ) -> T:
+        """Run `send` once every bucket has capacity, retrying when throttled."""
+        attempt = 0
+        while True:
+            for bucket, amount in buckets:
+                await bucket.acquire(amount, priority)
+            try:
+                return await send()
+            except RateLimited as e:
+                transient = isinstance(e, TransientError)
+                if not transient:
+                    self.throttled += 1
+                if attempt >= self.max_retries:
+                    logger.error(
+                        "Giving up after %s retries (%s)",
+                        attempt,
+                        type(e.error).__name__,
+                    )
+                    raise e.error
+                delay = self.backoff(attempt, e.retry_after)
+                attempt += 1
+                self.retries += 1
+                logger.warning(
+                    "%s (%s); retry %s/%s in %ss",
+                    "Transient error" if transient else "Rate limited",
+                    type(e.error).__name__,
+                    attempt,
+                    self.max_retries,
+                    round(delay, 2),
+                )
+                if transient:
+                    await asyncio.sleep(delay)
+                else:
+                    for bucket, _ in buckets:
+                        bucket.block(delay)
+
+    def stats(self, prefix: str = "") -> dict:
+        return {
+            "throttled": self.throttled,
+            "retries": self.retries,
+            "buckets": {
+                key: bucket.stats()
+                for key, bucket in self.buckets.items()
+                if key.startswith(prefix)
+            },
+        }
+
+
+# Instantiate the shared scheduler
+rate_limiter = RateLimitScheduler()
@@ -0,0 +1,61 @@
+import time
+from typing import Dict, Optional
+from app.core.config import config
+from app.services.cache_store import create_store
+
+
+class ReviewState:
+    """What was last reviewed for a PR: the head SHA and the per-file notes."""
+
+    def __init__(
+        self,
+        head_sha: str,
+        files: Dict[str, dict],
+        reviewed_at: Optional[float] = None,
+    ):
+        self.head_sha = head_sha
+        self.files = files
+        self.reviewed_at = reviewed_at or time.time()
+
+    def to_dict(self) -> dict:
+        return {
+            "head_sha": self.head_sha,
+            "files": self.files,
+            "reviewed_at": self.reviewed_at,
+        }
+
+
+class ReviewStateStore:
+    """Bounded map of (repo, PR) to its last ReviewState.
+
+    With the "sqlite" backend the states are shared by every process, so the
+    next push to a PR can be reviewed incrementally by any worker.
+    """
+
+    def __init__(
+        self,
+        backend: str = config.REVIEW_STATE_BACKEND,
+        max_prs: int = config.REVIEW_STATE_MAX_PRS,
+    ):
+        self.store = create_store(backend, "review_states", max_prs)
+
+    @staticmethod
+    def key(repo_full_name: str, pr_number: int) -> str:
+        return f"{repo_full_name}#{pr_number}"
+
+    async def get(self, repo_full_name: str, pr_number: int) -> Optional[ReviewState]:
+        if self.store is None:
+            return None
+        data = await self.store.get(self.key(repo_full_name, pr_number))
+        if data is None:
+            return None
+        return ReviewState(data["head_sha"], data["files"], data["reviewed_at"])
+
+    async def save(
+        self, repo_full_name: str, pr_number: int, head_sha: str, files: Dict[str, dict]
+    ):
+        if self.store is None:
+            return
+        await self.store.set(
+            self.key(repo_full_name, pr_number), ReviewState(head_sha, files).to_dict()
+        )
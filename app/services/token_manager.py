@@ -0,0 +1,167 @@
+import asyncio
+import time
+from typing import Dict, Optional
+from app.core.config import config
+from app.core.log import get_logger
+from app.services.metrics import instrument
+from app.services.installation_token import installationToken, InstallationToken
+
+logger = get_logger("TokenManager")
+
+
+class CachedToken:
+    """An access token together with its absolute expiry time."""
+
+    def __init__(self, token: str, expires_at: float):
+        self.token = token
+        self.expires_at = expires_at
+
+    def is_fresh(self, margin: float) -> bool:
+        return time.time() < self.expires_at - margin
+
+
+class TokenManager:
+    """Caches the GitHub App JWT and per-installation access tokens.
+
+    Tokens are refreshed `margin` seconds before they expire, and concurrent
+    refreshes for the same installation share a single request.
+    """
+
+    def __init__(
+        self,
+        installation_token: InstallationToken = installationToken,
+        jwt_refresh_margin: int = config.GH_JWT_REFRESH_MARGIN_SECONDS,
+        token_refresh_margin: int = config.GH_TOKEN_REFRESH_MARGIN_SECONDS,
+        refresh_ahead: int = config.GH_TOKEN_REFRESH_AHEAD_SECONDS,
+    ):
+        self.installation_token = installation_token
+        self.jwt_refresh_margin = jwt_refresh_margin
+        self.token_refresh_margin = token_refresh_margin
+        self._jwt: Optional[CachedToken] = None
+        self._tokens: Dict[int, CachedToken] = {}
+        self._refreshes: Dict[int, asyncio.Task] = {}
+        self._default_installation_id: Optional[int] = None
+        self.refresh_ahead = refresh_ahead
+        self._refresher: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+        self.background_refreshes = 0
+
+    def get_jwt(self) -> str:
+        """Return the app JWT, signing a new one only when the cached one is stale."""
+        if self._jwt is None or not self._jwt.is_fresh(self.jwt_refresh_margin):
+            self._jwt = CachedToken(
+                self.installation_token.generate_jwt(),
+                time.time() + self.installation_token.JWT_TTL_SECONDS,
+            )
+            logger.info("Generated new GitHub App JWT")
+        return self._jwt.token
+
+    async def get_installation_id(self) -> int:
+        """Fallback for calls without a webhook payload: the app's first installation."""
+        if self._default_installation_id is None:
+            self._default_installation_id = (
+                await self.installation_token.get_installation_id(self.get_jwt())
+            )
+        return self._default_installation_id
+
+    async def get_installation_token(
+        self, installation_id: Optional[int] = None
+    ) -> str:
+        """Return a valid access token for the installation, minting one on a miss."""
+        if installation_id is None:
+            installation_id = await self.get_installation_id()
+
+        cached = self._tokens.get(installation_id)
+        if cached and cached.is_fresh(self.token_refresh_margin):
+            self.hits += 1
+            return cached.token
+
+        self.misses += 1
+        # Shield so one cancelled caller does not abort the refresh for the others
+        cached = await asyncio.shield(self._shared_refresh(installation_id))
+        return cached.token
+
+    def _shared_refresh(self, installation_id: int) -> asyncio.Task:
+        """The in-flight refresh for the installation, starting one if needed."""
+        refresh = self._refreshes.get(installation_id)
+        if refresh is None:
+            refresh = asyncio.create_task(self._refresh(installation_id))
+            self._refreshes[installation_id] = refresh
+            refresh.add_done_callback(
+                lambda _: self._refreshes.pop(installation_id, None)
+            )
+        return refresh
+
+    @instrument("token_mint")
+    async def _refresh(self, installation_id: int) -> CachedToken:
+        data = await self.installation_token.get_installation_token(
+            installation_id, self.get_jwt()
+        )
+        cached = CachedToken(data["token"], data["expires_at"])
+        self._tokens[installation_id] = cached
+        logger.info("Minted access token for installation %s", installation_id)
+        return cached
+
+    async def start(self):
+        """Keep cached installation tokens fresh from a background task.
+
+        Only installations that have been used are refreshed, so starting the
+        refresher does no network I/O.
+        """
+        if config.GH_APP_AUTH_METHOD != "APP" or self._refresher is not None:
+            return
+        self._refresher = asyncio.create_task(
+            self._refresh_loop(), name="token-refresher"
+        )
+
+    async def stop(self):
+        if self._refresher is None:
+            return
+        self._refresher.cancel()
+        await asyncio.gather(self._refresher, return_exceptions=True)
+        self._refresher = None
+
+    def _next_refresh_in(self) -> float:
+        """Seconds until the first cached token enters its refresh-ahead window."""
+        lead = self.token_refresh_margin + self.refresh_ahead
+        due = [cached.expires_at - lead for cached in self._tokens.values()]
+        # Wake up regularly anyway to pick up tokens minted in the meantime; the
+        # floor also spaces out retries after a failed mint
+        return min(max(min(due, default=float("inf")) - time.time(), 30), 60)
+
+    async def _refresh_loop(self):
+        lead = self.token_refresh_margin + self.refresh_ahead
+        while True:
+            await asyncio.sleep(self._next_refresh_in())
+            for installation_id, cached in list(self._tokens.items()):
+                if cached.is_fresh(lead):
+                    continue
+                try:
+                    await self._shared_refresh(installation_id)
+                    self.background_refreshes += 1
+                except Exception as e:
+                    # Callers still refresh on demand once the margin is reached
+                    logger.warning(
+                        "Background refresh for installation %s failed: %s",
+                        installation_id,
+                        e,
+                    )
+
+    def invalidate(self, installation_id: Optional[int] = None):
+        """Drop a cached token, e.g. after GitHub rejected it with a 401."""
+        if installation_id is None:
+            installation_id = self._default_installation_id
+        self._tokens.pop(installation_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "background_refreshes": self.background_refreshes,
+            "cached_installations": len(self._tokens),
+        }
+
+
+# Instantiate the token manager
+token_manager = TokenManager()
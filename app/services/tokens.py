@@ -0,0 +1,35 @@
+from functools import lru_cache
+from app.core.config import config
+from app.core.log import get_logger
+
+logger = get_logger("Tokens")
+
+# Rough characters-per-token ratio for code when tiktoken is unavailable
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=8)
+def _get_encoding(model: str):
+    """Return a tiktoken encoding for the model, or None if tiktoken is unusable."""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # tiktoken downloads its BPE files on first use, which fails offline
+        logger.warning("tiktoken unavailable, estimating token counts: %s", e)
+        return None
+
+
+def count_tokens(text: str, model: str = config.OPENAI_MODEL) -> int:
+    """Count tokens locally, without calling the API."""
+    if not text:
+        return 0
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return len(text) // CHARS_PER_TOKEN + 1
+    return len(encoding.encode(text, disallowed_special=()))
@@ -1,21 +1,61 @@
-import logging
 import hmac
 import hashlib
 import json
+import asyncio
+from typing import List, Optional, Tuple
 from fastapi import HTTPException
 from app.core.config import config
+from app.core.log import get_logger, log_payload
 from app.services.github_client import github_client
 from app.services.openai_client import openai_client
 from app.core.pr_summary_prompt import PR_SUMMARY_PROMPT
 from app.core.pr_review_prompt import PR_REVIEW_PROMPT
 from app.core.pr_inline_fix_prompt import PR_INLINE_FIX_PROMPT
+from app.core.pr_combined_prompt import (
+    PR_COMBINED_SYSTEM_PROMPT,
+    PR_COMBINED_USER_PROMPT,
+)
+from app.core.pr_chunk_prompt import (
+    PR_CHUNK_SYSTEM_PROMPT,
+    PR_CHUNK_USER_PROMPT,
+    PR_REDUCE_SYSTEM_PROMPT,
+    PR_REDUCE_USER_PROMPT,
+)
+from app.core.schemas import CombinedReview, ChunkReview, ReducedReview
+from app.services.diff_parser import FileDiff, ParsedDiff
+from app.services.diff_index import DiffIndex, annotate_diff, unanchor_suggestion
+from app.services.diff_chunker import DiffChunker
+from app.services.diff_filter import DiffFilter, FilterReport
+from app.services.review_state import ReviewState, ReviewStateStore
+from app.services.llm_cache import prompt_version
+from app.services.cache_store import create_store
+from app.services.bot_comments import ContentKind, add_marker, find_marker
+from app.services.progressive_comment import ProgressiveComment
+from app.services.job_queue import job_queue, JobType
+from app.services.delivery_dedup import delivery_dedup
+from app.services.metrics import instrument
+from app.services.pipeline import ReviewPipeline, PullRequestContext
+from app.services.rate_limiter import Priority
 
-# Configure logging
-logging.basicConfig(
-    format="%(asctime)s - %(levelname)s - %(name)s - [WebhookHandler] - %(message)s",
-    level=logging.INFO,
+logger = get_logger("WebhookHandler")
+
+SUPPORTED_PR_ACTIONS = ("opened", "synchronize")
+# GitHub rejects review comment bodies longer than this
+MAX_COMMENT_CHARS = 65536
+REVIEW_PLACEHOLDER = "⏳ PR Buddy is reviewing this pull request…"
+REVIEW_FAILED_NOTE = (
+    "_⚠️ The review could not be completed; it will be retried on the next push._"
 )
-logger = logging.getLogger("WebhookHandler")
+
+# Cache namespaces: editing a prompt invalidates the results generated with it
+SUMMARY_PROMPT_VERSION = prompt_version(PR_SUMMARY_PROMPT)
+REVIEW_PROMPT_VERSION = prompt_version(PR_REVIEW_PROMPT)
+INLINE_FIX_PROMPT_VERSION = prompt_version(PR_INLINE_FIX_PROMPT)
+COMBINED_PROMPT_VERSION = prompt_version(
+    PR_COMBINED_SYSTEM_PROMPT, PR_COMBINED_USER_PROMPT
+)
+CHUNK_PROMPT_VERSION = prompt_version(PR_CHUNK_SYSTEM_PROMPT, PR_CHUNK_USER_PROMPT)
+REDUCE_PROMPT_VERSION = prompt_version(PR_REDUCE_SYSTEM_PROMPT, PR_REDUCE_USER_PROMPT)
 
 
 class WebhookHandler:
@@ -24,9 +64,19 @@ class WebhookHandler:
     def __init__(self):
         try:
             self.webhook_secret = config.GH_WEBHOOK_SECRET
+            self.pipeline = ReviewPipeline(self)
+            self.chunker = DiffChunker()
+            self.diff_filter = DiffFilter()
+            self.review_states = ReviewStateStore()
+            # Hash and comment ID of what was last published per PR
+            self.published = create_store(
+                config.PUBLISHED_STATE_BACKEND,
+                "published_content",
+                config.PUBLISHED_STATE_MAX_ENTRIES,
+            )
             logger.info("Webhook handler initialized successfully.")
         except Exception as e:
-            logger.exception(f"Failed to initialize webhook handler: {str(e)}")
+            logger.exception("Failed to initialize webhook handler: %s", e)
             raise HTTPException(
                 status_code=500, detail="Failed to initialize webhook handler"
             )
@@ -50,149 +100,637 @@ class WebhookHandler:
             return is_valid
         except Exception as e:
             logger.exception(
-                f"Exception occurred during webhook signature verification: {str(e)}"
+                "Exception occurred during webhook signature verification: %s", e
             )
             return False
 
-    async def get_pr_diff(self, repo_full_name: str, pr_number: int) -> str:
+    @instrument("diff_fetch")
+    async def get_pr_diff(
+        self, repo_full_name: str, pr_number: int, installation_id: Optional[int] = None
+    ) -> ParsedDiff:
         """Fetches the diff of a pull request."""
-        logger.info(f"Fetching PR diff for PR #{pr_number}")
-        pr_diff = await github_client.get_pr_diff(repo_full_name, pr_number)
-        logger.info(f"Fetched PR diff for PR #{pr_number}")
+        logger.info("Fetching PR diff for PR #%s", pr_number)
+        pr_diff = await github_client.get_pr_diff(
+            repo_full_name, pr_number, installation_id
+        )
+        logger.info("Fetched PR diff for PR #%s", pr_number)
         return pr_diff
 
+    @instrument("compare_diff_fetch")
+    async def get_compare_diff(self, ctx: PullRequestContext) -> ParsedDiff:
+        """Fetches the diff between the previously reviewed head and the new one."""
+        logger.info(
+            "Fetching compare diff %s...%s for PR #%s",
+            ctx.before_sha[:7],
+            ctx.head_sha[:7],
+            ctx.pr_number,
+        )
+        return await github_client.get_compare_diff(
+            ctx.repo_full_name, ctx.before_sha, ctx.head_sha, ctx.installation_id
+        )
+
+    @instrument("diff_filter")
+    async def filter_diff(
+        self, ctx: PullRequestContext, pr_diff: ParsedDiff
+    ) -> Tuple[ParsedDiff, FilterReport]:
+        """Removes generated, vendored, binary and whitespace-only changes."""
+        gitattributes = None
+        if config.DIFF_FILTER_GITATTRIBUTES:
+            try:
+                gitattributes = await github_client.get_file_content(
+                    ctx.repo_full_name,
+                    ".gitattributes",
+                    ctx.head_sha,
+                    ctx.installation_id,
+                )
+            except Exception as e:
+                logger.warning("Could not read .gitattributes: %s", e)
+        filtered, report = self.diff_filter.apply(pr_diff, gitattributes)
+        logger.info("Filtered diff of PR #%s: %s", ctx.pr_number, report.to_dict())
+        return filtered, report
+
+    @instrument("llm_summary")
     async def generate_pr_summary(self, pr_diff: str) -> str:
         """Generates a summary of the PR changes."""
         logger.info("Generating PR summary")
-        summary = openai_client.generate_text(PR_SUMMARY_PROMPT.format(pr_diff=pr_diff))
-        logger.info(f"Generated PR summary: {summary}")
+        summary = await openai_client.generate_text(
+            PR_SUMMARY_PROMPT.format(pr_diff=pr_diff),
+            cache_key=openai_client.cache.make_key(SUMMARY_PROMPT_VERSION, pr_diff),
+        )
+        logger.info("Generated PR summary (%s chars)", len(summary))
+        log_payload(logger, "PR summary", summary=summary)
         return summary
 
+    @instrument("llm_review")
     async def generate_pr_review(self, pr_diff: str) -> str:
         """Generates a review of the PR changes."""
         logger.info("Generating PR review")
-        review = openai_client.generate_text(PR_REVIEW_PROMPT.format(pr_diff=pr_diff))
-        logger.info(f"Generated PR review: {review}")
+        review = await openai_client.generate_text(
+            PR_REVIEW_PROMPT.format(pr_diff=pr_diff),
+            cache_key=openai_client.cache.make_key(REVIEW_PROMPT_VERSION, pr_diff),
+        )
+        logger.info("Generated PR review (%s chars)", len(review))
+        log_payload(logger, "PR review", review=review)
         return review
 
+    @instrument("llm_review_stream")
+    async def stream_pr_review(self, ctx: PullRequestContext, pr_diff: str) -> str:
+        """Generates the review while publishing its finished sections.
+
+        The review comment is created (or reused) up front, then edited as the
+        sections of the review stream in. The caller publishes the final text.
+        """
+        logger.info("Streaming PR review")
+        kind = ContentKind.REVIEW
+        comment_id = await self.open_review_comment(
+            ctx.repo_full_name, ctx.pr_number, ctx.installation_id
+        )
+
+        async def publish(text: str):
+            body, digest = add_marker(kind, text)
+            await github_client.update_pr_comment(
+                ctx.repo_full_name, comment_id, body, ctx.installation_id
+            )
+            await self._remember_published(
+                ctx.repo_full_name,
+                ctx.pr_number,
+                kind,
+                {"comment_id": comment_id, "hash": digest},
+            )
+
+        progress = ProgressiveComment(publish)
+        review = None
+        try:
+            review = await openai_client.stream_text(
+                PR_REVIEW_PROMPT.format(pr_diff=pr_diff),
+                progress.feed,
+                cache_key=openai_client.cache.make_key(REVIEW_PROMPT_VERSION, pr_diff),
+            )
+        finally:
+            # Also on cancellation (stage timeout, a newer push), so neither the
+            # placeholder nor the in-progress note is left behind
+            await asyncio.shield(
+                progress.close(None if review is not None else REVIEW_FAILED_NOTE)
+            )
+        logger.info(
+            "Streamed PR review (%s chars) with %s partial updates",
+            len(review),
+            progress.updates,
+        )
+        log_payload(logger, "PR review", review=review)
+        return review
+
+    @instrument("llm_inline_suggestions")
     async def generate_inline_suggestions(self, pr_diff: str) -> list:
         """Generates inline suggestions for the PR changes."""
         logger.info("Generating inline suggestions")
-        inline_suggestions = openai_client.generate_text(
-            PR_INLINE_FIX_PROMPT.format(pr_diff=pr_diff)
+        # Suggestions carry line numbers, so the key keeps the hunk offsets
+        inline_suggestions = await openai_client.generate_text(
+            PR_INLINE_FIX_PROMPT.format(pr_diff=annotate_diff(pr_diff)),
+            cache_key=openai_client.cache.make_key(
+                INLINE_FIX_PROMPT_VERSION,
+                pr_diff,
+                normalize=False,
+            ),
         )
-        logger.info(f"Generated inline suggestions: {inline_suggestions}")
+        logger.info("Generated inline suggestions (%s chars)", len(inline_suggestions))
+        log_payload(logger, "Inline suggestions", suggestions=inline_suggestions)
 
         # Remove Markdown formatting
         cleaned_json = inline_suggestions.strip("```json").strip("```").strip()
-        logger.debug(f"Cleaned JSON: {cleaned_json}")
+        logger.debug("Cleaned JSON: %s", cleaned_json)
 
         # Convert to Python list of dictionaries
         suggestions = json.loads(cleaned_json)
         return suggestions
 
+    @instrument("llm_combined")
+    async def generate_combined_review(self, pr_diff: str) -> CombinedReview:
+        """Generates the summary, review and inline suggestions in one request."""
+        logger.info("Generating combined PR summary, review and inline suggestions")
+        combined = await openai_client.generate_structured(
+            PR_COMBINED_SYSTEM_PROMPT,
+            PR_COMBINED_USER_PROMPT.format(pr_diff=annotate_diff(pr_diff)),
+            CombinedReview,
+            cache_key=openai_client.cache.make_key(
+                COMBINED_PROMPT_VERSION,
+                pr_diff,
+                normalize=False,
+            ),
+        )
+        logger.info(
+            "Generated combined review with %s inline suggestions",
+            len(combined.inline_suggestions),
+        )
+        return combined
+
+    async def generate_chunked_review(
+        self, pr_diff: ParsedDiff, ctx: Optional[PullRequestContext] = None
+    ) -> CombinedReview:
+        """Reviews a diff map-reduce style.
+
+        The diff is packed into context-sized batches that are reviewed
+        concurrently (map), then the per-file notes are merged into one summary
+        and review (reduce). With `ctx` the notes are remembered for
+        incremental re-reviews.
+        """
+        chunk_reviews, plan = await self.map_diff(pr_diff.files)
+        notes = self.collect_file_notes(chunk_reviews)
+        reduced = await self.reduce_file_notes(notes, plan.dropped)
+        if ctx is not None and ctx.head_sha and config.INCREMENTAL_REVIEW:
+            await self.review_states.save(
+                ctx.repo_full_name, ctx.pr_number, ctx.head_sha, notes
+            )
+        return CombinedReview(
+            summary=reduced.summary,
+            review=reduced.review,
+            inline_suggestions=[
+                s for chunk in chunk_reviews for s in chunk.inline_suggestions
+            ],
+        )
+
+    async def has_review_state(self, ctx: PullRequestContext) -> bool:
+        """Whether per-file notes are kept for the PR from an earlier chunked review."""
+        if not config.INCREMENTAL_REVIEW:
+            return False
+        return (
+            await self.review_states.get(ctx.repo_full_name, ctx.pr_number) is not None
+        )
+
+    async def get_incremental_state(
+        self, ctx: PullRequestContext
+    ) -> Optional[ReviewState]:
+        """Returns the previous review if this push can be reviewed incrementally.
+
+        That is only the case when the last reviewed head is the commit the
+        branch moved from; force-pushes and unknown PRs get a full review.
+        """
+        if not config.INCREMENTAL_REVIEW or ctx.action != "synchronize":
+            return None
+        state = await self.review_states.get(ctx.repo_full_name, ctx.pr_number)
+        if state is None or not ctx.before_sha or state.head_sha != ctx.before_sha:
+            return None
+        return state
+
+    async def generate_incremental_review(
+        self, ctx: PullRequestContext, compare_diff: ParsedDiff, state: ReviewState
+    ) -> CombinedReview:
+        """Re-reviews only the files touched since the last reviewed commit.
+
+        Unchanged files reuse their cached notes when the summary and review
+        are rebuilt. Inline suggestions are only generated for the new changes.
+        """
+        files = compare_diff.files
+        notes = dict(state.files)
+        for file in files:
+            if file.is_deleted or (file.old_path and file.old_path != file.path):
+                notes.pop(file.old_path, None)
+
+        chunk_reviews, plan = [], None
+        if any(not f.is_deleted for f in files):
+            chunk_reviews, plan = await self.map_diff(files)
+        for path, entry in self.collect_file_notes(chunk_reviews).items():
+            previous = notes.get(path)
+            if previous:
+                # Keep what the file did earlier in the PR; findings reflect the latest code
+                initial = previous.get("initial_summary", previous["summary"])
+                entry["initial_summary"] = initial
+                entry["summary"] = f"{initial} Latest push: {entry['summary']}"
+            notes[path] = entry
+
+        touched = {file.path for file in files}
+        logger.info(
+            "Incremental review of PR #%s: %s touched files, %s reused from %s",
+            ctx.pr_number,
+            len(touched),
+            len(set(notes) - touched),
+            state.head_sha[:7],
+        )
+        reduced = await self.reduce_file_notes(notes, plan.dropped if plan else [])
+        await self.review_states.save(
+            ctx.repo_full_name, ctx.pr_number, ctx.head_sha, notes
+        )
+        return CombinedReview(
+            summary=reduced.summary,
+            review=reduced.review,
+            inline_suggestions=[
+                s for chunk in chunk_reviews for s in chunk.inline_suggestions
+            ],
+        )
+
+    @instrument("llm_map")
+    async def map_diff(self, files: List[FileDiff]):
+        """Reviews the diff's batches concurrently; returns (chunk reviews, plan)."""
+        plan = self.chunker.plan(files)
+        logger.info("Reviewing diff in batches: %s", plan.to_dict())
+
+        semaphore = asyncio.Semaphore(config.CHUNK_CONCURRENCY)
+
+        async def review_batch(batch):
+            async with semaphore:
+                return await openai_client.generate_structured(
+                    PR_CHUNK_SYSTEM_PROMPT,
+                    PR_CHUNK_USER_PROMPT.format(pr_diff=annotate_diff(batch.text)),
+                    ChunkReview,
+                    mode="chunked",
+                    cache_key=openai_client.cache.make_key(
+                        CHUNK_PROMPT_VERSION,
+                        batch.text,
+                        normalize=False,
+                    ),
+                )
+
+        partials = await asyncio.gather(
+            *(review_batch(batch) for batch in plan.batches), return_exceptions=True
+        )
+        chunk_reviews = [p for p in partials if isinstance(p, ChunkReview)]
+        if partials and not chunk_reviews:
+            raise HTTPException(status_code=500, detail="All diff batches failed")
+        if len(chunk_reviews) < len(partials):
+            logger.warning(
+                "%s of %s diff batches failed",
+                len(partials) - len(chunk_reviews),
+                len(partials),
+            )
+        return chunk_reviews, plan
+
+    @staticmethod
+    def collect_file_notes(chunk_reviews: list) -> dict:
+        """Merges the map step's notes into {file_path: {"summary", "findings"}}."""
+        notes = {}
+        for chunk in chunk_reviews:
+            for file in chunk.files:
+                entry = notes.setdefault(
+                    file.file_path, {"summary": "", "findings": []}
+                )
+                entry["summary"] = f"{entry['summary']} {file.summary}".strip()
+                entry["findings"].extend(file.findings)
+        return notes
+
+    @instrument("llm_reduce")
+    async def reduce_file_notes(
+        self, notes: dict, omitted_files: list
+    ) -> ReducedReview:
+        """Merges per-file notes into the final summary and review."""
+        file_notes = "\n\n".join(
+            f"File: {path}\nSummary: {entry['summary']}\nFindings:\n"
+            + ("\n".join(f"- {finding}" for finding in entry["findings"]) or "- None")
+            for path, entry in notes.items()
+        )
+        user_prompt = PR_REDUCE_USER_PROMPT.format(
+            file_notes=file_notes,
+            omitted_files="\n".join(f"- {path}" for path in omitted_files) or "- None",
+        )
+        return await openai_client.generate_structured(
+            PR_REDUCE_SYSTEM_PROMPT,
+            user_prompt,
+            ReducedReview,
+            mode="chunked",
+            # The last step for a PR whose batches are already paid for
+            priority=Priority.HIGH,
+            cache_key=openai_client.cache.make_key(
+                REDUCE_PROMPT_VERSION,
+                user_prompt,
+                normalize=False,
+            ),
+        )
+
+    async def _published(self, repo_full_name: str, pr_number: int, kind: str) -> dict:
+        if self.published is None:
+            return {}
+        return await self.published.get(f"{repo_full_name}#{pr_number}:{kind}") or {}
+
+    async def _remember_published(
+        self, repo_full_name: str, pr_number: int, kind: str, entry: dict
+    ):
+        if self.published is not None:
+            await self.published.set(f"{repo_full_name}#{pr_number}:{kind}", entry)
+
+    @instrument("publish_description")
     async def update_pr_description(
-        self, repo_full_name: str, pr_number: int, summary: str
+        self,
+        repo_full_name: str,
+        pr_number: int,
+        summary: str,
+        installation_id: Optional[int] = None,
     ) -> dict:
-        """Updates the description of a pull request."""
-        logger.info(f"Updating PR description for PR #{pr_number}")
+        """Updates the description of a pull request, unless it already says this.
+
+        The description carries a hidden content hash; a matching hash, known
+        locally or read back from the PR, means there is nothing to write.
+        """
+        logger.info("Updating PR description for PR #%s", pr_number)
+        kind = ContentKind.DESCRIPTION
+        body, digest = add_marker(kind, summary)
+        published = await self._published(repo_full_name, pr_number, kind)
+        if published.get("hash") == digest:
+            logger.info("PR description for PR #%s is unchanged", pr_number)
+            return {"message": "PR description unchanged"}
+
+        # A conditional GET, so this is free while the PR has not changed
+        pr = await github_client.get_pr_details(
+            repo_full_name, pr_number, installation_id
+        )
+        if find_marker(kind, pr.get("body")) == digest:
+            await self._remember_published(
+                repo_full_name, pr_number, kind, {"hash": digest}
+            )
+            logger.info("PR description for PR #%s is unchanged", pr_number)
+            return {"message": "PR description unchanged"}
+
         response = await github_client.update_pr_description(
-            repo_full_name, pr_number, summary
+            repo_full_name, pr_number, body, installation_id
+        )
+        await self._remember_published(
+            repo_full_name, pr_number, kind, {"hash": digest}
         )
-        logger.info(f"Updated PR description for PR #{pr_number}")
+        logger.info("Updated PR description for PR #%s", pr_number)
         return response
 
-    async def add_pr_review(self, repo_full_name: str, pr_number: int, review: str):
-        """Add a review comment to the PR."""
-        logger.info(f"Adding review comment to PR #{pr_number} in {repo_full_name}")
-        response = await github_client.add_pr_comment(repo_full_name, pr_number, review)
-        logger.info(f"PR comment added successfully: {response}")
+    async def find_review_comment(
+        self,
+        repo_full_name: str,
+        pr_number: int,
+        installation_id: Optional[int] = None,
+    ) -> Optional[dict]:
+        """Finds the bot's review comment on the PR by its hidden marker."""
+        page = 1
+        while True:
+            comments = await github_client.list_pr_comments(
+                repo_full_name, pr_number, installation_id, page=page
+            )
+            for comment in comments:
+                if find_marker(ContentKind.REVIEW, comment.get("body")) is not None:
+                    return comment
+            if len(comments) < 100:
+                return None
+            page += 1
+
+    async def open_review_comment(
+        self,
+        repo_full_name: str,
+        pr_number: int,
+        installation_id: Optional[int] = None,
+    ) -> int:
+        """ID of the bot's review comment, posting a placeholder if there is none."""
+        kind = ContentKind.REVIEW
+        published = await self._published(repo_full_name, pr_number, kind)
+        comment_id = published.get("comment_id")
+        if comment_id is not None:
+            return comment_id
+        existing = await self.find_review_comment(
+            repo_full_name, pr_number, installation_id
+        )
+        if existing is not None:
+            comment_id, digest = existing["id"], find_marker(kind, existing["body"])
+        else:
+            body, digest = add_marker(kind, REVIEW_PLACEHOLDER)
+            response = await github_client.add_pr_comment(
+                repo_full_name, pr_number, body, installation_id
+            )
+            comment_id = response["id"]
+        await self._remember_published(
+            repo_full_name, pr_number, kind, {"comment_id": comment_id, "hash": digest}
+        )
+        return comment_id
+
+    @instrument("publish_review")
+    async def add_pr_review(
+        self,
+        repo_full_name: str,
+        pr_number: int,
+        review: str,
+        installation_id: Optional[int] = None,
+    ):
+        """Add a review comment to the PR, or edit the one from an earlier push.
+
+        The comment ID and content hash are remembered per PR, so an unchanged
+        review costs no API call at all.
+        """
+        logger.info("Adding review comment to PR #%s in %s", pr_number, repo_full_name)
+        kind = ContentKind.REVIEW
+        body, digest = add_marker(kind, review)
+        published = await self._published(repo_full_name, pr_number, kind)
+        if published.get("hash") == digest:
+            logger.info("Review comment on PR #%s is unchanged", pr_number)
+            return {"message": "Comment unchanged", "id": published["comment_id"]}
+
+        comment_id = published.get("comment_id")
+        if comment_id is None:
+            existing = await self.find_review_comment(
+                repo_full_name, pr_number, installation_id
+            )
+            if existing is not None:
+                comment_id = existing["id"]
+                if find_marker(kind, existing["body"]) == digest:
+                    await self._remember_published(
+                        repo_full_name,
+                        pr_number,
+                        kind,
+                        {"comment_id": comment_id, "hash": digest},
+                    )
+                    logger.info("Review comment on PR #%s is unchanged", pr_number)
+                    return {"message": "Comment unchanged", "id": comment_id}
+
+        response = None
+        if comment_id is not None:
+            try:
+                response = await github_client.update_pr_comment(
+                    repo_full_name, comment_id, body, installation_id
+                )
+            except HTTPException as e:
+                if e.status_code != 404:
+                    raise
+                # Someone deleted the comment; post a fresh one
+                logger.info("Review comment %s is gone, posting a new one", comment_id)
+        if response is None:
+            response = await github_client.add_pr_comment(
+                repo_full_name, pr_number, body, installation_id
+            )
+        await self._remember_published(
+            repo_full_name,
+            pr_number,
+            kind,
+            {"comment_id": response["id"], "hash": digest},
+        )
+        logger.info(
+            "Published %s comment %s on PR #%s", kind, response["id"], pr_number
+        )
         return response
 
+    @instrument("publish_inline_suggestions")
     async def add_inline_suggestions(
         self,
         repo_full_name: str,
         pr_number: int,
         inline_suggestions: list,
+        installation_id: Optional[int] = None,
+        commit_id: Optional[str] = None,
+        diff_index: Optional[DiffIndex] = None,
     ):
-        """Add inline suggestions to a PR."""
-        logger.info(f"Adding inline suggestions to PR #{pr_number} in {repo_full_name}")
-        response = {}
+        """Add inline suggestions to a PR as a single batched review.
+
+        Comments are pinned to `commit_id`, the head SHA from the webhook
+        payload, so they line up with the diff that was reviewed even if the
+        branch moves on meanwhile. With a `diff_index`, suggestions on lines
+        outside the diff are snapped to a nearby diff line or dropped before
+        anything is sent to GitHub.
+        """
+        logger.info(
+            "Adding inline suggestions to PR #%s in %s", pr_number, repo_full_name
+        )
+        comments = []
+        invalid = []
         for suggestion in inline_suggestions:
-            if not all(k in suggestion for k in ["file_path", "line", "suggestion"]):
-                logger.warning(f"Skipping invalid suggestion: {suggestion}")
+            try:
+                path = suggestion["file_path"]
+                line = int(suggestion["line"])
+                body = suggestion["suggestion"]
+            except (KeyError, TypeError, ValueError):
+                logger.warning("Skipping invalid suggestion: %s", suggestion)
+                invalid.append(
+                    {"suggestion": suggestion, "error": "Invalid suggestion"}
+                )
                 continue
 
-            logger.info(
-                f"Adding inline suggestion to {suggestion['file_path']}:{suggestion['line']}"
+            if diff_index is not None and not diff_index.contains(path, line):
+                snapped = diff_index.snap(path, line, config.INLINE_SNAP_MAX_LINES)
+                if snapped is None:
+                    logger.warning(
+                        "Dropping suggestion outside the diff: %s:%s", path, line
+                    )
+                    invalid.append(
+                        {"path": path, "line": line, "error": "Line outside the diff"}
+                    )
+                    continue
+                logger.info("Snapped suggestion %s:%s to line %s", path, line, snapped)
+                body = unanchor_suggestion(body, line)
+                line = snapped
+
+            comments.append(
+                {
+                    "path": path,
+                    "line": line,
+                    "side": "RIGHT",
+                    "body": body[:MAX_COMMENT_CHARS],
+                }
             )
-            response = await github_client.add_inline_suggestion(
-                repo_full_name,
-                pr_number,
-                suggestion["file_path"],
-                int(suggestion["line"]),
-                suggestion["suggestion"],
+
+        if not comments:
+            logger.info("No inline suggestions to add to PR #%s", pr_number)
+            return {"message": "No inline suggestions", "posted": 0, "failed": invalid}
+
+        if not commit_id:
+            pr = await github_client.get_pr_details(
+                repo_full_name, pr_number, installation_id
             )
-            logger.info(
-                f"Added inline suggestion to {suggestion['file_path']}:{suggestion['line']}"
+            commit_id = pr["head"]["sha"]
+
+        response = await github_client.add_review_comments(
+            repo_full_name, pr_number, commit_id, comments, installation_id
+        )
+        response["failed"] = invalid + response["failed"]
+        for failure in response["failed"]:
+            logger.warning("Inline suggestion not posted: %s", failure)
+        if not response["posted"]:
+            raise HTTPException(
+                status_code=400, detail="Failed to add inline suggestions"
             )
-        logger.info(f"Inline suggestions added to PR #{pr_number}")
+        response["message"] = "Inline suggestions added"
+        logger.info(
+            "Added %s/%s inline suggestions to PR #%s",
+            response["posted"],
+            len(comments),
+            pr_number,
+        )
         return response
 
+    @instrument("pipeline")
     async def handle_pr_event(self, payload: dict):
         """Processes the pull request event."""
         try:
-            pr_action = payload.get("action")
-            repo_full_name = payload.get("repository", {}).get("full_name")
-            pr_number = payload.get("pull_request", {}).get("number")
+            ctx = PullRequestContext.from_payload(payload)
 
-            if not repo_full_name or not pr_number:
+            if not ctx.is_valid:
                 logger.error("Missing required fields in payload.")
                 raise HTTPException(status_code=400, detail="Invalid payload structure")
 
             logger.info(
-                f"Received PR event: action={pr_action}, repo={repo_full_name}, PR=#{pr_number}"
+                "Received PR event: action=%s, repo=%s, PR=#%s",
+                ctx.action,
+                ctx.repo_full_name,
+                ctx.pr_number,
             )
 
-            if pr_action not in ["opened", "synchronize"]:
-                logger.info(f"Ignored PR action: {pr_action}")
-                return {"message": f"Ignored PR action: {pr_action}"}
+            if ctx.action not in SUPPORTED_PR_ACTIONS:
+                logger.info("Ignored PR action: %s", ctx.action)
+                return {"message": f"Ignored PR action: {ctx.action}"}
 
             logger.info(
-                f"Processing PR event '{pr_action}' for repository '{repo_full_name}' PR #{pr_number}"
+                "Processing PR event '%s' for repository '%s' PR #%s",
+                ctx.action,
+                ctx.repo_full_name,
+                ctx.pr_number,
             )
 
-            # pr_diff = await self.get_pr_diff(repo_full_name, pr_number)
-            # summary = await self.generate_pr_summary(pr_diff)
-            # review = await self.generate_pr_review(pr_diff)
-
-            summary = "This is a dummy summary"
-            review = "This is a dummy review"
-
-            update_pr_summary_response = await self.update_pr_description(
-                repo_full_name, pr_number, summary
-            )
-            add_pr_review_comment_response = await self.add_pr_review(
-                repo_full_name, pr_number, review
-            )
-
-            # inline_suggestions = await self.generate_inline_suggestions(pr_diff)
-            # add_inline_suggestion_response = await self.add_inline_suggestions(
-            #     repo_full_name, pr_number, inline_suggestions
-            # )
-
-            return {
-                "summary_respone": update_pr_summary_response,
-                "review_response": add_pr_review_comment_response,
-                # "inline_suggestions_response": add_inline_suggestion_response,
-            }
+            try:
+                return await self.pipeline.run(ctx)
+            except Exception:
+                # Nothing was reviewed; let a redelivery of this push try again
+                await delivery_dedup.release_work(
+                    ctx.repo_full_name, ctx.pr_number, ctx.head_sha, ctx.action
+                )
+                raise
 
         except HTTPException as e:
-            logger.error(f"HTTP Exception in handle_pr_event: {e.detail}")
+            logger.error("HTTP Exception in handle_pr_event: %s", e.detail)
             raise e
         except Exception as e:
-            logger.exception(f"Unexpected error occurred in handle_pr_event: {str(e)}")
+            logger.exception("Unexpected error occurred in handle_pr_event: %s", e)
             raise HTTPException(status_code=500, detail="Internal Server Error")
 
 
 webhook = WebhookHandler()
+
+# PR events are processed by the background workers
+job_queue.register(JobType.PULL_REQUEST, webhook.handle_pr_event)
@@ -0,0 +1,88 @@
+import asyncio
+import signal
+import sys
+from contextlib import asynccontextmanager
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from app.core.config import config
+from app.core.log import get_logger
+from app.main import app, lifespan
+
+logger = get_logger("Worker")
+
+# Endpoints that report on the process serving them; workers serve only these
+STATS_PATHS = {
+    "/health",
+    "/metrics",
+    "/github/token-stats",
+    "/github/rate-limits",
+    "/github/cache-stats",
+    "/openai/usage",
+    "/openai/cache-stats",
+    "/openai/rate-limits",
+    "/openai/routes",
+    "/webhook/dedup-stats",
+}
+
+
+@asynccontextmanager
+async def worker_lifespan(_: FastAPI):
+    """Services are started and stopped by the app's own lifespan.
+
+    On shutdown the job queue stops claiming work, lets running jobs finish
+    and hands back the ones that do not finish in time.
+    """
+    async with lifespan(app):
+        logger.info("Worker started with %s job slots", config.WORKER_CONCURRENCY)
+        yield
+        logger.info("Worker draining")
+    logger.info("Worker stopped")
+
+
+def create_stats_app() -> FastAPI:
+    """The app's health, metrics and stats endpoints, for scraping a worker.
+
+    Workers run jobs without serving webhooks, so LLM usage, cache and stage
+    metrics of the reviews are only visible on their own port.
+    """
+    stats_app = FastAPI(
+        lifespan=worker_lifespan, docs_url=None, redoc_url=None, openapi_url=None
+    )
+
+    @stats_app.middleware("http")
+    async def stats_only(request: Request, call_next):
+        if request.url.path not in STATS_PATHS:
+            return JSONResponse(status_code=404, content={"detail": "Not Found"})
+        return await call_next(request)
+
+    stats_app.mount("", app)
+    return stats_app
+
+
+async def run():
+    """Run the job workers, without the HTTP server, until SIGTERM or SIGINT."""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    async with worker_lifespan(app):
+        await stop.wait()
+
+
+if __name__ == "__main__":
+    if config.JOB_STORE_BACKEND != "sqlite" or config.WORKER_CONCURRENCY < 1:
+        sys.exit(
+            "Worker processes need JOB_STORE_BACKEND=sqlite and WORKER_CONCURRENCY >= 1"
+        )
+    if config.WORKER_METRICS_PORT:
+        # uvicorn handles SIGTERM and SIGINT, then drains through the lifespan
+        uvicorn.run(
+            create_stats_app(),
+            host=config.WORKER_METRICS_HOST,
+            port=config.WORKER_METRICS_PORT,
+            log_config=None,
+            access_log=False,
+        )
+    else:
+        asyncio.run(run())
@@ -0,0 +1,126 @@
+"""Replays signed webhook payloads against /webhook at a target rate."""
+
+import asyncio
+import copy
+import hashlib
+import hmac
+import json
+import time
+import uuid
+from typing import List, Optional
+import httpx
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summarize(values: List[float]) -> dict:
+    return {
+        "mean": round(sum(values) / len(values), 2) if values else None,
+        "p50": percentile(values, 0.5),
+        "p95": percentile(values, 0.95),
+        "p99": percentile(values, 0.99),
+    }
+
+
+def load_payloads(paths: List[str]) -> List[dict]:
+    payloads = []
+    for path in paths:
+        with open(path) as f:
+            payloads.append(json.load(f))
+    return payloads
+
+
+def build_delivery(template: dict, pr_number: int, secret: str):
+    """Re-target a recorded payload at a fresh PR and sign it like GitHub does."""
+    payload = copy.deepcopy(template)
+    head_sha = hashlib.sha1(f"{pr_number}-{uuid.uuid4()}".encode()).hexdigest()
+    payload["number"] = pr_number
+    payload["pull_request"]["number"] = pr_number
+    payload["pull_request"]["head"]["sha"] = head_sha
+    if "after" in payload:
+        payload["after"] = head_sha
+    body = json.dumps(payload).encode()
+    headers = {
+        "Content-Type": "application/json",
+        "X-GitHub-Event": "pull_request",
+        "X-GitHub-Delivery": str(uuid.uuid4()),
+    }
+    if secret:
+        digest = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+        headers["X-Hub-Signature-256"] = f"sha256={digest}"
+    return body, headers
+
+
+async def deliver(
+    client: httpx.AsyncClient,
+    template: dict,
+    pr_number: int,
+    secret: str,
+    timeout: float,
+    poll_interval: float,
+) -> dict:
+    """Send one delivery and wait for its job; times are wall clock seconds."""
+    body, headers = build_delivery(template, pr_number, secret)
+    result = {"pr": pr_number, "action": template.get("action")}
+    sent_at = time.time()
+    response = await client.post("/webhook", content=body, headers=headers)
+    result["accept_ms"] = round((time.time() - sent_at) * 1000, 2)
+    result["http_status"] = response.status_code
+    if response.status_code != 202:
+        result["status"] = "rejected"
+        return result
+
+    job_id = response.json()["job_id"]
+    deadline = sent_at + timeout
+    while time.time() < deadline:
+        await asyncio.sleep(poll_interval)
+        job = (await client.get(f"/webhook/jobs/{job_id}")).json()
+        if job.get("finished_at"):
+            result["status"] = job["status"]
+            result["end_to_end_ms"] = round((job["finished_at"] - sent_at) * 1000, 2)
+            stages = (job.get("result") or {}).get("stages") or {}
+            result["stages"] = {name: s["status"] for name, s in stages.items()}
+            result["memory"] = (job.get("result") or {}).get("memory")
+            return result
+    result["status"] = "timeout"
+    return result
+
+
+async def run_load(
+    base_url: str,
+    payloads: List[dict],
+    prs: int,
+    rate: float,
+    secret: str = "",
+    timeout: float = 300,
+    poll_interval: float = 0.25,
+    first_pr: int = 1,
+) -> List[dict]:
+    """Deliver `prs` webhooks at `rate` per second, cycling through `payloads`."""
+    limits = httpx.Limits(max_connections=max(10, int(rate * 4)))
+    async with httpx.AsyncClient(
+        base_url=base_url, timeout=timeout, limits=limits
+    ) as client:
+        tasks = []
+        started = time.monotonic()
+        for n in range(prs):
+            # Open loop: send on schedule whether or not earlier PRs finished
+            await asyncio.sleep(max(0.0, started + n / rate - time.monotonic()))
+            tasks.append(
+                asyncio.create_task(
+                    deliver(
+                        client,
+                        payloads[n % len(payloads)],
+                        first_pr + n,
+                        secret,
+                        timeout,
+                        poll_interval,
+                    )
+                )
+            )
+        return await asyncio.gather(*tasks)
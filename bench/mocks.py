@@ -0,0 +1,471 @@
+"""Local stand-ins for the GitHub REST API and the OpenAI chat completions API.
+
+Both servers add configurable latency, send realistic rate-limit headers and
+can inject errors and throttling, and both account every call (and every
+token) to the pull request it belongs to.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+import uvicorn
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Synthetic files are named after their PR, so prompts can be attributed too
+PR_PATH_RE = re.compile(r"bench/pr_(\d+)/")
+DIFF_PATH_RE = re.compile(r"^diff --git a/(\S+)", re.MULTILINE)
+PR_FILE_RE = re.compile(r"(bench/pr_\d+/\S+)")
+SUGGESTION = "```suggestion\ndef renamed(value):\n```"
+
+
+class MockSettings:
+    """Behaviour of one mock server."""
+
+    def __init__(
+        self,
+        latency_ms: float = 50,
+        jitter_ms: float = 20,
+        error_rate: float = 0.0,
+        error_status: int = 502,
+        throttle_rate: float = 0.0,
+        retry_after: float = 1.0,
+        rate_limit: int = 5000,
+        ms_per_token: float = 0.0,
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.rate_limit = rate_limit
+        # OpenAI only: extra generation time per completion token
+        self.ms_per_token = ms_per_token
+
+    async def delay(self, extra_ms: float = 0):
+        jitter = random.uniform(-self.jitter_ms, self.jitter_ms)
+        await asyncio.sleep(max(0.0, self.latency_ms + jitter + extra_ms) / 1000)
+
+    def fault(self) -> Optional[str]:
+        """Which fault to inject into this request: "throttle", "error" or None."""
+        roll = random.random()
+        if roll < self.throttle_rate:
+            return "throttle"
+        if roll < self.throttle_rate + self.error_rate:
+            return "error"
+        return None
+
+    def to_dict(self) -> dict:
+        return dict(vars(self))
+
+
+class Recorder:
+    """Counts calls, faults and tokens per PR ("shared" when not PR-specific)."""
+
+    def __init__(self):
+        self.calls = defaultdict(int)
+        self.tokens = defaultdict(int)
+        self.by_endpoint = defaultdict(int)
+        self.throttled = 0
+        self.errors = 0
+
+    def call(self, pr: str, endpoint: str):
+        self.calls[pr] += 1
+        self.by_endpoint[endpoint] += 1
+
+    def to_dict(self) -> dict:
+        return {
+            "calls": dict(self.calls),
+            "tokens": dict(self.tokens),
+            "by_endpoint": dict(self.by_endpoint),
+            "throttled": self.throttled,
+            "errors": self.errors,
+        }
+
+
+def synthetic_diff(pr_number: int, files: int, lines: int) -> str:
+    """A deterministic diff of `files` new files with `lines` lines each."""
+    parts = []
+    for f in range(files):
+        path = f"bench/pr_{pr_number}/module_{f}.py"
+        body = [f"+def function_{f}_{n}(value):" for n in range(lines)]
+        parts.append(
+            f"diff --git a/{path} b/{path}\n"
+            "new file mode 100644\n"
+            "index 0000000..1111111\n"
+            "--- /dev/null\n"
+            f"+++ b/{path}\n"
+            f"@@ -0,0 +1,{lines} @@\n" + "\n".join(body)
+        )
+    return "\n".join(parts) + "\n"
+
+
+def create_github_mock(
+    settings: MockSettings, recorder: Recorder, files: int = 5, lines: int = 40
+) -> FastAPI:
+    """GitHub REST endpoints used by GitHubAPIClient and InstallationToken."""
+    app = FastAPI()
+    state = {"remaining": settings.rate_limit, "reset": time.time() + 3600}
+    descriptions = {}
+    comments = defaultdict(list)
+    comment_prs = {}
+    ids = iter(range(1, 10**9))
+
+    def headers() -> dict:
+        if time.time() > state["reset"]:
+            state["remaining"], state["reset"] = settings.rate_limit, time.time() + 3600
+        state["remaining"] = max(0, state["remaining"] - 1)
+        return {
+            "x-ratelimit-limit": str(settings.rate_limit),
+            "x-ratelimit-remaining": str(state["remaining"]),
+            "x-ratelimit-reset": str(int(state["reset"])),
+        }
+
+    @app.middleware("http")
+    async def behave(request: Request, call_next):
+        path = request.url.path
+        if path.startswith("/_bench"):
+            return await call_next(request)
+        pr = re.search(r"/(?:pulls|issues)/(\d+)", path)
+        if pr is None and "/issues/comments/" in path:
+            comment_id = int(path.rsplit("/", 1)[1])
+            pr_key = comment_prs.get(comment_id, "shared")
+        else:
+            pr_key = pr.group(1) if pr else "shared"
+        endpoint = re.sub(r"/\d+", "/{id}", re.sub(r"^/repos/[^/]+/[^/]+", "", path))
+        recorder.call(pr_key, f"{request.method} {endpoint or '/'}")
+
+        await settings.delay()
+        fault = settings.fault()
+        if fault == "throttle":
+            recorder.throttled += 1
+            return JSONResponse(
+                {"message": "You have exceeded a secondary rate limit."},
+                status_code=403,
+                headers={"retry-after": str(settings.retry_after), **headers()},
+            )
+        if fault == "error":
+            recorder.errors += 1
+            return JSONResponse(
+                {"message": "Server Error"},
+                status_code=settings.error_status,
+                headers=headers(),
+            )
+        response = await call_next(request)
+        response.headers.update(headers())
+        return response
+
+    def conditional(request: Request, content: str, media_type: str) -> Response:
+        etag = '"' + hashlib.sha256(content.encode()).hexdigest()[:20] + '"'
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"etag": etag})
+        return Response(content, media_type=media_type, headers={"etag": etag})
+
+    @app.get("/_bench/stats")
+    async def stats():
+        return recorder.to_dict()
+
+    @app.get("/app/installations")
+    async def installations():
+        return [{"id": 1}]
+
+    @app.post("/app/installations/{installation_id}/access_tokens")
+    async def access_token(installation_id: int):
+        expires = datetime.now(timezone.utc) + timedelta(hours=1)
+        return JSONResponse(
+            {
+                "token": f"ghs_bench_{installation_id}",
+                "expires_at": expires.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            },
+            status_code=201,
+        )
+
+    @app.get("/repos/{owner}/{repo}")
+    async def get_repo(owner: str, repo: str):
+        return {"full_name": f"{owner}/{repo}", "private": False}
+
+    @app.get("/repos/{owner}/{repo}/pulls/{number}")
+    async def get_pull(request: Request, owner: str, repo: str, number: int):
+        if "diff" in request.headers.get("accept", ""):
+            return conditional(
+                request, synthetic_diff(number, files, lines), "text/plain"
+            )
+        pull = {
+            "number": number,
+            "body": descriptions.get(number, ""),
+            "head": {"sha": hashlib.sha1(str(number).encode()).hexdigest()},
+            "html_url": f"https://github.test/{owner}/{repo}/pull/{number}",
+        }
+        return conditional(request, json.dumps(pull), "application/json")
+
+    @app.patch("/repos/{owner}/{repo}/pulls/{number}")
+    async def update_pull(request: Request, owner: str, repo: str, number: int):
+        descriptions[number] = (await request.json()).get("body", "")
+        return {"number": number, "html_url": f"https://github.test/pull/{number}"}
+
+    @app.get("/repos/{owner}/{repo}/compare/{basehead}")
+    async def compare(request: Request, owner: str, repo: str, basehead: str):
+        number = int(hashlib.sha1(basehead.encode()).hexdigest(), 16) % 10**6
+        return conditional(request, synthetic_diff(number, 1, lines), "text/plain")
+
+    @app.get("/repos/{owner}/{repo}/contents/{path:path}")
+    async def contents(owner: str, repo: str, path: str):
+        return JSONResponse({"message": "Not Found"}, status_code=404)
+
+    @app.get("/repos/{owner}/{repo}/issues/{number}/comments")
+    async def list_comments(owner: str, repo: str, number: int):
+        return comments[number]
+
+    @app.post("/repos/{owner}/{repo}/issues/{number}/comments")
+    async def add_comment(request: Request, owner: str, repo: str, number: int):
+        comment = {"id": next(ids), "body": (await request.json())["body"]}
+        comment["html_url"] = f"https://github.test/comment/{comment['id']}"
+        comments[number].append(comment)
+        comment_prs[comment["id"]] = str(number)
+        return JSONResponse(comment, status_code=201)
+
+    @app.patch("/repos/{owner}/{repo}/issues/comments/{comment_id}")
+    async def update_comment(request: Request, owner: str, repo: str, comment_id: int):
+        body = (await request.json())["body"]
+        for comment in comments[int(comment_prs.get(comment_id, 0))]:
+            if comment["id"] == comment_id:
+                comment["body"] = body
+                return comment
+        return JSONResponse({"message": "Not Found"}, status_code=404)
+
+    @app.post("/repos/{owner}/{repo}/pulls/{number}/reviews")
+    async def create_review(owner: str, repo: str, number: int):
+        review_id = next(ids)
+        return {"id": review_id, "html_url": f"https://github.test/review/{review_id}"}
+
+    @app.post("/repos/{owner}/{repo}/pulls/{number}/comments")
+    async def add_review_comment(owner: str, repo: str, number: int):
+        return JSONResponse({"id": next(ids)}, status_code=201)
+
+    return app
+
+
+def example_from_schema(schema: dict, path: str, defs: Optional[dict] = None):
+    """A small value that validates against a structured-outputs schema.
+
+    Arrays get one item, and `file_path` fields point at `path`, so the app
+    gets notes and suggestions it can post (and prompts built from them can
+    still be attributed to the PR).
+    """
+    defs = defs if defs is not None else schema.get("$defs", {})
+    if "$ref" in schema:
+        return example_from_schema(defs[schema["$ref"].rsplit("/", 1)[1]], path, defs)
+    if "anyOf" in schema:
+        return example_from_schema(schema["anyOf"][0], path, defs)
+    kind = schema.get("type")
+    if kind == "object":
+        value = {
+            name: example_from_schema(prop, path, defs)
+            for name, prop in schema.get("properties", {}).items()
+        }
+        if "file_path" in value:
+            value["file_path"] = path
+        if "suggestion" in value:
+            value["suggestion"] = SUGGESTION
+        return value
+    if kind == "array":
+        return [example_from_schema(schema.get("items", {}), path, defs)]
+    if kind == "integer":
+        return 1
+    if kind == "number":
+        return 1.0
+    if kind == "boolean":
+        return False
+    return "Benchmark response: the changes look consistent."
+
+
+def completion_content(body: dict) -> str:
+    prompt = "\n".join(m.get("content") or "" for m in body.get("messages", []))
+    response_format = body.get("response_format") or {}
+    paths = DIFF_PATH_RE.findall(prompt) or PR_FILE_RE.findall(prompt)
+    path = paths[0] if paths else "README.md"
+    if response_format.get("type") == "json_schema":
+        schema = response_format["json_schema"]["schema"]
+        return json.dumps(example_from_schema(schema, path))
+    if response_format.get("type") == "json_object":
+        return "{}"
+    if '"suggestion"' in prompt:
+        return json.dumps([{"file_path": path, "line": 1, "suggestion": SUGGESTION}])
+    sections = [
+        "### Code Review",
+        "#### **General Overview**\n- Benchmark changes.",
+        "#### **Code Quality Issues**\n- None found.",
+        "#### **Bugs or Logical Errors**\n- None found.",
+        "#### **Suggestions for Improvement**\n- None.",
+    ]
+    return "\n\n".join(sections)
+
+
+def create_openai_mock(settings: MockSettings, recorder: Recorder) -> FastAPI:
+    """The chat completions endpoint, streaming and non-streaming."""
+    app = FastAPI()
+
+    def rate_headers(tokens: int) -> dict:
+        return {
+            "x-ratelimit-limit-requests": str(settings.rate_limit),
+            "x-ratelimit-remaining-requests": str(settings.rate_limit - 1),
+            "x-ratelimit-reset-requests": "1s",
+            "x-ratelimit-limit-tokens": str(settings.rate_limit * 100),
+            "x-ratelimit-remaining-tokens": str(settings.rate_limit * 100 - tokens),
+            "x-ratelimit-reset-tokens": "1s",
+        }
+
+    @app.get("/_bench/stats")
+    async def stats():
+        return recorder.to_dict()
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        prompt = "\n".join(m.get("content") or "" for m in body.get("messages", []))
+        prs = PR_PATH_RE.findall(prompt)
+        pr_key = prs[0] if prs else "shared"
+        recorder.call(pr_key, "POST /v1/chat/completions")
+
+        fault = settings.fault()
+        if fault == "throttle":
+            recorder.throttled += 1
+            await settings.delay()
+            return JSONResponse(
+                {"error": {"message": "Rate limit reached", "code": "rate_limit"}},
+                status_code=429,
+                headers={
+                    "retry-after-ms": str(int(settings.retry_after * 1000)),
+                    **rate_headers(0),
+                },
+            )
+        if fault == "error":
+            recorder.errors += 1
+            await settings.delay()
+            return JSONResponse(
+                {"error": {"message": "Server error", "code": None}},
+                status_code=settings.error_status,
+            )
+
+        content = completion_content(body)
+        usage = {
+            "prompt_tokens": len(prompt) // 4 + 1,
+            "completion_tokens": len(content) // 4 + 1,
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        recorder.tokens[pr_key] += usage["total_tokens"]
+        generation_ms = settings.ms_per_token * usage["completion_tokens"]
+        base = {
+            "id": f"chatcmpl-bench-{random.getrandbits(32)}",
+            "created": int(time.time()),
+            "model": body.get("model", "bench"),
+        }
+
+        if body.get("stream"):
+            await settings.delay()
+            pieces = [content[i : i + 40] for i in range(0, len(content), 40)]
+
+            async def events():
+                for piece in pieces:
+                    await asyncio.sleep(generation_ms / 1000 / len(pieces))
+                    chunk = {
+                        **base,
+                        "object": "chat.completion.chunk",
+                        "choices": [
+                            {
+                                "index": 0,
+                                "delta": {"content": piece},
+                                "finish_reason": None,
+                            }
+                        ],
+                    }
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                final = {
+                    **base,
+                    "object": "chat.completion.chunk",
+                    "choices": [],
+                    "usage": usage,
+                }
+                yield f"data: {json.dumps(final)}\n\n"
+                yield "data: [DONE]\n\n"
+
+            return StreamingResponse(
+                events(),
+                media_type="text/event-stream",
+                headers=rate_headers(usage["total_tokens"]),
+            )
+
+        await settings.delay(generation_ms)
+        return JSONResponse(
+            {
+                **base,
+                "object": "chat.completion",
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {
+                            "role": "assistant",
+                            "content": content,
+                            "refusal": None,
+                        },
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": usage,
+            },
+            headers=rate_headers(usage["total_tokens"]),
+        )
+
+    return app
+
+
+async def serve_mocks(
+    github_port: int,
+    openai_port: int,
+    github_settings: MockSettings,
+    openai_settings: MockSettings,
+    files: int,
+    lines: int,
+):
+    apps = [
+        (create_github_mock(github_settings, Recorder(), files, lines), github_port),
+        (create_openai_mock(openai_settings, Recorder()), openai_port),
+    ]
+    servers = [
+        uvicorn.Server(
+            uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+        )
+        for app, port in apps
+    ]
+    await asyncio.gather(*(server.serve() for server in servers))
+
+
+if __name__ == "__main__":
+    # Runs in its own process so the mocks do not share an event loop with the
+    # load generator, which would skew its timings
+    parser = argparse.ArgumentParser(description="GitHub and OpenAI stand-ins")
+    parser.add_argument("--github-port", type=int, required=True)
+    parser.add_argument("--openai-port", type=int, required=True)
+    parser.add_argument("--github-settings", default="{}", help="MockSettings JSON")
+    parser.add_argument("--openai-settings", default="{}", help="MockSettings JSON")
+    parser.add_argument("--diff-files", type=int, default=5)
+    parser.add_argument("--diff-lines", type=int, default=40)
+    args = parser.parse_args()
+    asyncio.run(
+        serve_mocks(
+            args.github_port,
+            args.openai_port,
+            MockSettings(**json.loads(args.github_settings)),
+            MockSettings(**json.loads(args.openai_settings)),
+            args.diff_files,
+            args.diff_lines,
+        )
+    )
@@ -0,0 +1,353 @@
+"""Offline benchmark of the webhook path.
+
+Starts the GitHub and OpenAI stand-ins, runs the app against them in a
+subprocess, replays signed webhooks at a target rate and writes the results
+as JSON. Run from the repository root:
+
+    python -m bench.run --prs 100 --rate 5 --baseline bench/results/previous.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Optional
+import httpx
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from bench.loadgen import load_payloads, run_load, summarize
+from bench.mocks import MockSettings
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+WEBHOOK_SECRET = "bench-secret"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def private_key_pem() -> str:
+    """A throwaway key, so the GitHub App JWT path is exercised too."""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ).decode()
+
+
+def git_version() -> Optional[str]:
+    try:
+        version = subprocess.check_output(
+            ["git", "describe", "--always", "--dirty"], cwd=ROOT_DIR, text=True
+        )
+        return version.strip()
+    except Exception:
+        return None
+
+
+def spawn(args: list, env: Optional[dict] = None, log=None) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", *args],
+        cwd=ROOT_DIR,
+        env=env,
+        stdout=log or subprocess.DEVNULL,
+        stderr=subprocess.STDOUT,
+    )
+
+
+async def wait_ready(url: str, process: subprocess.Popen, timeout: float):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(
+                    f"{process.args[2]} exited with code {process.returncode}"
+                )
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.05)
+    raise RuntimeError(f"{url} did not become ready")
+
+
+def per_pr(counts: dict, prs: list) -> dict:
+    return summarize([counts.get(str(pr), 0) for pr in prs])
+
+
+def compare(baseline: dict, results: dict, prefix: str = "") -> list:
+    """Lines describing how each numeric result moved against the baseline."""
+    lines = []
+    for key, value in results.items():
+        old = baseline.get(key) if isinstance(baseline, dict) else None
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            lines.extend(compare(old or {}, value, f"{name}."))
+        elif isinstance(value, (int, float)) and isinstance(old, (int, float)):
+            change = f" ({(value - old) / old * 100:+.1f}%)" if old else ""
+            lines.append(f"{name}: {old} -> {value}{change}")
+    return lines
+
+
+def memory(done: list) -> dict:
+    """Diff sizes and the app's peak RSS, as reported in the job results."""
+    reports = [d["memory"] for d in done if d.get("memory")]
+    return {
+        "diff_bytes": summarize([m["diff_bytes"] for m in reports]),
+        "diffs_truncated": sum(1 for m in reports if m["diff_truncated"]),
+        "peak_rss_bytes": max((m["peak_rss_bytes"] for m in reports), default=None),
+        "peak_rss_growth_bytes": summarize(
+            [m["peak_rss_growth_bytes"] for m in reports]
+        ),
+    }
+
+
+async def main(args) -> dict:
+    github_settings = MockSettings(
+        latency_ms=args.github_latency_ms,
+        jitter_ms=args.github_latency_ms / 4,
+        error_rate=args.github_error_rate,
+        throttle_rate=args.github_throttle_rate,
+        rate_limit=args.github_rate_limit,
+    )
+    openai_settings = MockSettings(
+        latency_ms=args.openai_latency_ms,
+        jitter_ms=args.openai_latency_ms / 4,
+        error_rate=args.openai_error_rate,
+        throttle_rate=args.openai_throttle_rate,
+        ms_per_token=args.openai_ms_per_token,
+    )
+    github_port, openai_port, app_port = free_port(), free_port(), free_port()
+    github_url = f"http://127.0.0.1:{github_port}"
+    openai_url = f"http://127.0.0.1:{openai_port}"
+    mocks = spawn(
+        [
+            "bench.mocks",
+            "--github-port",
+            str(github_port),
+            "--openai-port",
+            str(openai_port),
+            "--github-settings",
+            json.dumps(github_settings.to_dict()),
+            "--openai-settings",
+            json.dumps(openai_settings.to_dict()),
+            "--diff-files",
+            str(args.diff_files),
+            "--diff-lines",
+            str(args.diff_lines),
+        ]
+    )
+
+    env = {
+        **os.environ,
+        "GH_API_URL": github_url,
+        "OPENAI_BASE_URL": f"{openai_url}/v1",
+        "OPENAI_API_KEY": "bench",
+        "GH_APP_AUTH_METHOD": "APP",
+        "GH_APP_ID": "1",
+        "GH_APP_PRIVATE_KEY": private_key_pem(),
+        "GH_WEBHOOK_SECRET": WEBHOOK_SECRET,
+        "SYNC_DEBOUNCE_SECONDS": "0",
+        "HTTP2_ENABLED": "false",
+    }
+    if args.workers:
+        # Fresh job store and dedup tables for every run
+        env["SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(), "bench.sqlite3")
+    for item in args.env:
+        key, _, value = item.partition("=")
+        env[key] = value
+    log = open(args.app_log, "w") if args.app_log else None
+    base_url = f"http://127.0.0.1:{app_port}"
+    # Workers serve their own /metrics, on consecutive ports
+    metrics_port = free_port()
+    metrics_urls = [f"{base_url}/metrics"] + [
+        f"http://127.0.0.1:{metrics_port + n}/metrics" for n in range(args.workers)
+    ]
+    app = None
+    try:
+        await wait_ready(f"{github_url}/_bench/stats", mocks, args.startup_timeout)
+        await wait_ready(f"{openai_url}/_bench/stats", mocks, args.startup_timeout)
+        started = time.monotonic()
+        if args.workers:
+            command = [
+                "app.serve",
+                "--web",
+                str(args.web),
+                "--workers",
+                str(args.workers),
+                "--host",
+                "127.0.0.1",
+                "--port",
+                str(app_port),
+                "--metrics-port",
+                str(metrics_port),
+            ]
+        else:
+            command = [
+                "uvicorn",
+                "app.main:app",
+                "--port",
+                str(app_port),
+                "--log-level",
+                "warning",
+            ]
+        app = spawn(command, env, log)
+        await wait_ready(f"{base_url}/health", app, args.startup_timeout)
+        startup = time.monotonic() - started
+
+        started = time.monotonic()
+        deliveries = await run_load(
+            base_url,
+            load_payloads(args.payload),
+            args.prs,
+            args.rate,
+            WEBHOOK_SECRET,
+            args.timeout,
+        )
+        duration = time.monotonic() - started
+        async with httpx.AsyncClient() as client:
+            metrics_text = "\n".join(
+                [(await client.get(url)).text for url in metrics_urls]
+            )
+            github = (await client.get(f"{github_url}/_bench/stats")).json()
+            openai = (await client.get(f"{openai_url}/_bench/stats")).json()
+    finally:
+        for process in (app, mocks):
+            if process is not None:
+                process.terminate()
+                process.wait(timeout=30)
+        if log is not None:
+            log.close()
+
+    prs = [d["pr"] for d in deliveries]
+    done = [d for d in deliveries if d["status"] == "succeeded"]
+    statuses = {}
+    for d in deliveries:
+        statuses[d["status"]] = statuses.get(d["status"], 0) + 1
+    return {
+        "version": git_version(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "settings": {
+            "prs": args.prs,
+            "rate": args.rate,
+            "payloads": [os.path.basename(p) for p in args.payload],
+            "diff_files": args.diff_files,
+            "diff_lines": args.diff_lines,
+            "web": args.web if args.workers else None,
+            "workers": args.workers,
+            "env": args.env,
+            "github": github_settings.to_dict(),
+            "openai": openai_settings.to_dict(),
+        },
+        "startup_seconds": round(startup, 3),
+        "duration_seconds": round(duration, 3),
+        "throughput_prs_per_second": round(len(done) / duration, 3),
+        "jobs": statuses,
+        "latency_ms": {
+            "accept": summarize([d["accept_ms"] for d in deliveries]),
+            "end_to_end": summarize([d["end_to_end_ms"] for d in done]),
+        },
+        "github_calls_per_pr": per_pr(github["calls"], prs),
+        # Token mints and .gitattributes reads are not tied to one PR
+        "memory": memory(done),
+        "github_shared_calls": github["calls"].get("shared", 0),
+        "openai_calls_per_pr": per_pr(openai["calls"], prs),
+        "tokens_per_pr": per_pr(openai["tokens"], prs),
+        "openai_shared_tokens": openai["tokens"].get("shared", 0),
+        "faults": {
+            "github_throttled": github["throttled"],
+            "github_errors": github["errors"],
+            "openai_throttled": openai["throttled"],
+            "openai_errors": openai["errors"],
+        },
+        "github_calls_by_endpoint": github["by_endpoint"],
+        "deliveries": deliveries,
+        "metrics": metrics_text if args.keep_metrics else None,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--prs", type=int, default=50, help="Webhooks to deliver")
+    parser.add_argument("--rate", type=float, default=5, help="Webhooks per second")
+    parser.add_argument(
+        "--payload",
+        action="append",
+        help="Recorded webhook payload to replay (repeatable)",
+    )
+    parser.add_argument("--diff-files", type=int, default=5)
+    parser.add_argument("--diff-lines", type=int, default=40)
+    parser.add_argument("--github-latency-ms", type=float, default=50)
+    parser.add_argument("--github-error-rate", type=float, default=0.0)
+    parser.add_argument("--github-throttle-rate", type=float, default=0.0)
+    parser.add_argument("--github-rate-limit", type=int, default=5000)
+    parser.add_argument("--openai-latency-ms", type=float, default=300)
+    parser.add_argument("--openai-ms-per-token", type=float, default=2)
+    parser.add_argument("--openai-error-rate", type=float, default=0.0)
+    parser.add_argument("--openai-throttle-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--env",
+        action="append",
+        default=[],
+        help="Extra app setting as KEY=VALUE (repeatable)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Run the app with `app.serve` and this many worker processes "
+        "(default: a single uvicorn process)",
+    )
+    parser.add_argument(
+        "--web", type=int, default=1, help="Web processes, with --workers"
+    )
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--startup-timeout", type=float, default=30)
+    parser.add_argument("--output", help="Results file (default bench/results/)")
+    parser.add_argument("--baseline", help="Earlier results file to compare against")
+    parser.add_argument("--app-log", help="Write the app's output to this file")
+    parser.add_argument(
+        "--keep-metrics",
+        action="store_true",
+        help="Include the /metrics output of every app process in the results",
+    )
+    args = parser.parse_args(argv)
+    args.payload = args.payload or [
+        os.path.join(BENCH_DIR, "payloads", "pull_request_opened.json")
+    ]
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    results = asyncio.run(main(args))
+    output = args.output or os.path.join(
+        BENCH_DIR, "results", f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    summary = {
+        key: value
+        for key, value in results.items()
+        if key not in ("settings", "deliveries", "metrics", "github_calls_by_endpoint")
+    }
+    print(json.dumps(summary, indent=2))
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"\nAgainst {args.baseline} ({baseline.get('version')}):")
+        for line in compare(baseline, summary):
+            print(f"  {line}")
+    print(f"\nResults written to {output}")